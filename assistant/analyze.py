@@ -1,85 +1,403 @@
-import sqlite3
+import time
 from datetime import datetime, timedelta
-from google import genai
-from .setup_db import DB_PATH
-from .config import config
+from .map_reduce import run_map
+from .store import open_store
+from .spool import flush
+from .llm import get_client
+from .trace import span
 
 
-# Step 1: Get commits for the current week
-def get_commits_for_current_week(db_path):
+def get_week_range():
+    """Monday 00:00 to the end of today, local time"""
     today = datetime.now()
     start_of_week = today - timedelta(days=today.weekday())  # Monday
     start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
     end_of_week = today.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return start_of_week, end_of_week
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
 
-    # Convert datetime objects to Unix timestamps for SQLite comparison
-    start_timestamp = start_of_week.timestamp()
-    end_timestamp = end_of_week.timestamp()
+def parse_date(value, end=False):
+    """
+    Parse a --since/--until value: YYYY-MM-DD or an ISO datetime.
+    A bare date as the end of a range means the end of that day.
+    """
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == len("YYYY-MM-DD"):
+        parsed = parsed.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return parsed
+
+
+def build_filters(start_timestamp, end_timestamp, repos=None, author=None):
+    """
+    WHERE clause and parameters selecting commits in a time range, optionally
+    of some repos ("org/repo" or just "repo") and of one author (name or email).
+    A None bound leaves that end of the range open.
+    """
+    clauses = []
+    params = []
+    if start_timestamp is not None:
+        clauses.append("timestamp >= ?")
+        params.append(start_timestamp)
+    if end_timestamp is not None:
+        clauses.append("timestamp <= ?")
+        params.append(end_timestamp)
+    if repos:
+        # A suffix compare rather than LIKE, where _ and % in names are wildcards
+        clauses.append(
+            "("
+            + " OR ".join(
+                "repo_name = ? OR substr(repo_name, -length(?) - 1) = '/' || ?"
+                for _ in repos
+            )
+            + ")"
+        )
+        for repo in repos:
+            params.extend([repo, repo, repo])
+    if author:
+        clauses.append("(author_name = ? OR author_email = ?)")
+        params.extend([author, author])
+    return " AND ".join(clauses) or "1", params
+
+
+# Step 1: Format commits for OpenAI
+def format_commits(commits, period="this week"):
+    if not commits:
+        return f"No commits were made {period}."
 
-    print(f"Fetching commits between {start_of_week} and {end_of_week}")
+    formatted = [f"Commits made {period}:\n"]
+    for timestamp, repo_name, message, added_lines in commits:
+        repo = repo_name.split("/")[1] if "/" in repo_name else repo_name
+        formatted.append(f"- [{timestamp}] {repo}: {message}, add lines: {added_lines}")
+    return "\n".join(formatted)
 
-    cursor.execute(
-        """
-        SELECT datetime(timestamp, 'unixepoch'), repo_name, commit_message, added_lines
+
+# Step 2: Digest each day of each repo, reusing digests whose commits are unchanged
+def get_day_groups(store, start_timestamp, end_timestamp, repos=None, author=None):
+    """
+    (day, repo_name, commit_count, last_commit_id, message_chars, added_lines)
+    per local day and repo. message_chars changes when post-commit fills in
+    the message of a row, which neither the count nor the last id do.
+    """
+    where, params = build_filters(start_timestamp, end_timestamp, repos, author)
+    return store.query(
+        f"""
+        SELECT date(timestamp, 'unixepoch', 'localtime') AS day, repo_name,
+               COUNT(*), MAX(id), COALESCE(SUM(length(commit_message)), 0),
+               COALESCE(SUM(added_lines), 0)
         FROM commits
-        WHERE timestamp >= ? AND timestamp <= ?
+        WHERE {where}
+        GROUP BY day, repo_name
+        ORDER BY day, repo_name
+        """,
+        params,
+    )
+
+
+def get_day_bounds(day):
+    """First and last timestamp of a local day"""
+    day_start = datetime.strptime(day, "%Y-%m-%d")
+    day_end = day_start + timedelta(days=1) - timedelta(microseconds=1)
+    return day_start.timestamp(), day_end.timestamp()
+
+
+def is_partial_day(day, start_timestamp, end_timestamp):
+    """Whether the range starts or ends within day rather than covering it"""
+    day_start, day_end = get_day_bounds(day)
+    return (start_timestamp is not None and start_timestamp > day_start) or (
+        end_timestamp is not None and end_timestamp < day_end
+    )
+
+
+def get_commits_for_day(
+    store, day, repo_name, author=None, start_timestamp=None, end_timestamp=None
+):
+    """Commits of a repo on a local day, within the range where it cuts the day"""
+    day_start, day_end = get_day_bounds(day)
+    if start_timestamp is not None:
+        day_start = max(day_start, start_timestamp)
+    if end_timestamp is not None:
+        day_end = min(day_end, end_timestamp)
+    where, params = build_filters(day_start, day_end, author=author)
+    return store.query(
+        f"""
+        SELECT datetime(timestamp, 'unixepoch', 'localtime'), repo_name, commit_message, added_lines
+        FROM commits
+        WHERE repo_name = ? AND {where}
         ORDER BY timestamp ASC
-    """,
-        (start_timestamp, end_timestamp),
+        """,
+        [repo_name, *params],
     )
 
-    commits = cursor.fetchall()
-    conn.close()
-    return commits
+
+def build_digest_prompt(day, repo_name, commits):
+    return f"""
+    Below are the Git commits made to {repo_name} on {day}. Summarize the work done
+    in one to three short sentences, without dates or line counts:
+    {format_commits(commits, f"on {day}")}
+    """
 
 
-# Step 2: Format commits for OpenAI
-def format_commits(commits):
-    if not commits:
-        return "No commits were made this week."
+def update_digests(store, start_timestamp, end_timestamp, repos=None, author=None):
+    """
+    Make sure every (day, repo) in the range has a digest, generating only the
+    ones that are missing or whose commits changed since they were made.
+    Digests of an author's commits are kept apart from digests of all commits.
+    A day the range only partly covers is digested from the commits in the
+    range and not cached, so the cache only holds whole days.
+    Returns list of (day, repo_name, added_lines, digest)
+    """
+    author = author or ""
+    groups = get_day_groups(store, start_timestamp, end_timestamp, repos, author)
+    if not groups:
+        return []
+
+    stored = {
+        (day, repo_name): ((commit_count, last_commit_id, message_chars), digest)
+        for day, repo_name, commit_count, last_commit_id, message_chars, digest in (
+            store.query(
+                """
+                SELECT day, repo_name, commit_count, last_commit_id, message_chars,
+                       digest
+                FROM digests
+                WHERE author = ? AND day >= ? AND day <= ?
+                """,
+                (author, groups[0][0], groups[-1][0]),
+            )
+        )
+    }
+
+    partial = {
+        day
+        for day in {group[0] for group in groups}
+        if is_partial_day(day, start_timestamp, end_timestamp)
+    }
+
+    # A digest is reusable while its repo-day has the same commits and messages
+    stale = [
+        group
+        for group in groups
+        if group[0] in partial
+        or stored.get(group[:2], (None, None))[0] != tuple(group[2:5])
+    ]
+    if stale:
+        print(f"Digesting {len(stale)} new or changed repo-days...")
+        prompts = [
+            build_digest_prompt(
+                day,
+                repo_name,
+                get_commits_for_day(
+                    store, day, repo_name, author, start_timestamp, end_timestamp
+                ),
+            )
+            for day, repo_name, _, _, _, _ in stale
+        ]
+        now = time.time()
+        digests = [digest.strip() for digest in run_map(prompts)]
+        for group, digest in zip(stale, digests):
+            stored[group[:2]] = (tuple(group[2:5]), digest)
+        rows = [
+            (*group[:2], author, *group[2:], digest, now)
+            for group, digest in zip(stale, digests)
+            if group[0] not in partial
+        ]
+        store.execute_batched(
+            """
+            INSERT OR REPLACE INTO digests (
+                day, repo_name, author, commit_count, last_commit_id,
+                message_chars, added_lines, digest, created
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+
+    return [
+        (day, repo_name, added_lines, stored[(day, repo_name)][1])
+        for day, repo_name, _, _, _, added_lines in groups
+    ]
+
+
+def format_digests(digests, period="this week"):
+    if not digests:
+        return ""
 
-    formatted = ["Commits for the current week:\n"]
-    for timestamp, message, repo_name, added_lines in commits:
+    formatted = [f"Summaries of each day's commits made {period}:\n"]
+    for day, repo_name, _, digest in digests:
         repo = repo_name.split("/")[1] if "/" in repo_name else repo_name
-        formatted.append(f"- [{timestamp}] {repo}: {message}, add lines: {added_lines}")
+        formatted.append(f"- [{day}] {repo}: {digest}")
     return "\n".join(formatted)
 
 
-# Step 3: Summarize commits using Gemini
-def summarize_commits_with_gemini(commit_summary):
-    if not commit_summary:
-        return "No commits were made this week."
+# Aggregates computed in SQLite, used by `coas stats` and given to the model
+STATS_DIMENSIONS = {
+    "repo": "repo_name",
+    "author": "author_name",
+    "day": "date(timestamp, 'unixepoch', 'localtime')",
+}
+
+
+def get_stats(store, start_timestamp, end_timestamp, repos=None, author=None):
+    """
+    Commits and added/removed lines in the range, in total and per repo,
+    author and day, with each group's share of the added lines in percent.
+    Returns dict of "total" -> (commits, added, removed) and dimension ->
+    list of (key, commits, added, removed, share)
+    """
+    where, params = build_filters(start_timestamp, end_timestamp, repos, author)
+    stats = {
+        "total": store.query_one(
+            f"""
+            SELECT COUNT(*), COALESCE(SUM(added_lines), 0), COALESCE(SUM(removed_lines), 0)
+            FROM commits WHERE {where}
+            """,
+            params,
+        )
+    }
+    for dimension, column in STATS_DIMENSIONS.items():
+        order = "key" if dimension == "day" else "added DESC, key"
+        stats[dimension] = store.query(
+            f"""
+            SELECT {column} AS key, COUNT(*),
+                   COALESCE(SUM(added_lines), 0) AS added,
+                   COALESCE(SUM(removed_lines), 0),
+                   ROUND(100.0 * COALESCE(SUM(added_lines), 0)
+                         / NULLIF(SUM(SUM(added_lines)) OVER (), 0), 1)
+            FROM commits WHERE {where}
+            GROUP BY key
+            ORDER BY {order}
+            """,
+            params,
+        )
+    return stats
+
+
+def format_stats(stats):
+    commits, added, removed = stats["total"]
+    lines = [f"Total: {commits} commits, +{added} -{removed} lines"]
+    for dimension in STATS_DIMENSIONS:
+        lines.append(f"\nBy {dimension}:")
+        for key, commits, added, removed, share in stats[dimension]:
+            lines.append(
+                f"- {key}: {commits} commits, +{added} -{removed} lines, "
+                f"{share or 0}% of added lines"
+            )
+    return "\n".join(lines)
+
 
-    # Create Gemini model instance
-    api_key = config.get("gemini", "api_key")
-    client = genai.Client(api_key=api_key)
+def resolve_range(since=None, until=None):
+    """
+    Time range of --since/--until, default this week.
+    Returns tuple of (start, end, period description)
+    """
+    start_of_week, end_of_week = get_week_range()
+    start = parse_date(since) if since else start_of_week
+    end = parse_date(until, end=True) if until else end_of_week
+    period = "this week"
+    if since or until:
+        period = f"between {start:%Y-%m-%d} and {end:%Y-%m-%d}"
+    return start, end, period
+
+
+def show_stats(since=None, until=None, repos=None, author=None):
+    """Command entry point for `coas stats`: no model call, no network"""
+    from .cli_interface import CLIInterface
+
+    flush()
+    start, end, period = resolve_range(since, until)
+    stats = get_stats(open_store(), start.timestamp(), end.timestamp(), repos, author)
+    CLIInterface().display_stats(stats, period)
+
+
+# Step 3: Summarize the digests using Gemini
+def summarize_commits_with_gemini(commit_summary, period="this week", stats_summary=""):
+    if not commit_summary:
+        return f"No commits were made {period}."
 
     prompt = f"""
-    Below is the list of Git commits made this week. Summarize the work done by repo during the week:
+    Below are summaries of each day's Git commits made {period}. Summarize the work done by repo during that time:
     {commit_summary}
-    Use Chinese return format markdown as below, percentage is calculated based on the number of addedlines, remove username in repo_name:
+    These statistics are exact, use their numbers instead of estimating:
+    {stats_summary}
+    Use Chinese return format markdown as below, percentage is the repo's share of added lines from the statistics, remove username in repo_name:
     - repo_name: works [percentage]
     - repo_name: works [percentage]
     """
 
     # Generate response
-    response = client.models.generate_content(
-        model="gemini-2.0-flash-exp", contents=prompt
+    return get_client().generate(prompt)
+
+
+def build_repo_prompt(repo_name, digests, period):
+    return f"""
+    Below are summaries of each day's Git commits made to {repo_name} {period}.
+    Summarize the work done in this repo in a few short bullet points:
+    {format_digests(digests, period)}
+    """
+
+
+def summarize_per_repo(digests, period, stats_summary=""):
+    """
+    Summarize every repo concurrently, then merge the repo summaries with one
+    more call. Each prompt stays small however many repos the range covers.
+    """
+    by_repo = {}
+    for digest in digests:
+        by_repo.setdefault(digest[1], []).append(digest)
+
+    print(f"Summarizing {len(by_repo)} repos in parallel...")
+    repo_summaries = run_map(
+        [
+            build_repo_prompt(repo_name, repo_digests, period)
+            for repo_name, repo_digests in by_repo.items()
+        ]
     )
-    return response.text
+
+    merged = [f"Repo summaries for {period}:\n"]
+    for repo_name, repo_summary in zip(by_repo, repo_summaries):
+        repo = repo_name.split("/")[1] if "/" in repo_name else repo_name
+        merged.append(f"## {repo}\n{repo_summary.strip()}")
+    return summarize_commits_with_gemini("\n\n".join(merged), period, stats_summary)
 
 
 # Step 4: Main script
-def summarize_week_commit():
-    commits = get_commits_for_current_week(DB_PATH)
+def summarize_commits(since=None, until=None, repos=None, author=None, per_repo=False):
+    """
+    Summarize the commits between since and until (default: this week),
+    optionally only of some repos or one author. With per_repo, each repo is
+    summarized on its own, concurrently, before the results are merged.
+    """
+    # Ingest anything the hooks spooled since the last flush
+    with span("flush"):
+        flush()
+
+    start, end, period = resolve_range(since, until)
+    print(f"Fetching commits between {start} and {end}")
 
-    # Format the commits
-    commit_summary = format_commits(commits)
-    print("Formatted Commits:\n", commit_summary)
+    store = open_store()
+    with span("digests"):
+        digests = update_digests(
+            store, start.timestamp(), end.timestamp(), repos, author
+        )
+    with span("stats"):
+        stats_summary = format_stats(
+            get_stats(store, start.timestamp(), end.timestamp(), repos, author)
+        )
 
-    # Get the summary from OpenAI
-    summary = summarize_commits_with_gemini(commit_summary)
-    print("\nWeekly Summary:\n", summary)
+    if per_repo and digests:
+        with span("summarize"):
+            summary = summarize_per_repo(digests, period, stats_summary)
+    else:
+        # Format the digests
+        commit_summary = format_digests(digests, period)
+        print("Formatted Commits:\n", commit_summary)
+
+        # Reduce the digests into one summary
+        with span("summarize"):
+            summary = summarize_commits_with_gemini(
+                commit_summary, period, stats_summary
+            )
+    print("\nSummary:\n", summary)
+
+
+def summarize_week_commit():
+    summarize_commits()
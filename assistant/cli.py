@@ -1,15 +1,6 @@
 import sys
 
-from .analyze import summarize_week_commit
 from .cli_args import parse_args
-from .cli_interface import CLIInterface
-from .hooks_setup import setup_global_hooks
-from .husky_hooks_setup import setup_husky_hooks
-from .post_commit import save_commit_message
-from .pre_commit import save_commit_diff
-from .prepare_commit_msg import prepare_commit_msg
-from .setup_db import create_db
-from .config import config
 
 
 class Assistant:
@@ -24,10 +15,47 @@ class Assistant:
         "post-commit": "Run post-commit hook to save commit message",
         "setup-husky": "Configure Husky git hooks for the project",
         "summary": "Generate a summary of recent commits",
+        "stats": "Show commit and line counts per repo, author and day (no AI)",
+        "search": "Search commit messages and diffs: coas search <words>",
+        "import": "Backfill commits from the git history of repos: coas import <paths>",
+        "gc": "Drop old diffs by the retention policy and reclaim disk space",
+        "compress-diffs": "Compress the diffs already stored in the database",
+        "flush": "Ingest commits spooled by the hooks into the database",
+        "trace": "Show p50/p95/p99 timings per command phase: coas trace [report|clear]",
+        "daemon": """Keep a warm server for the git hooks: coas daemon [start|run|stop|status]
+    The hooks hand their work to it when it runs and work alone otherwise""",
     }
 
-    def __init__(self):
-        self.cli_interface = CLIInterface()
+    # Command name -> handler method. Each handler imports its module only
+    # when it runs, so the git hooks never load google-genai or rich.
+    COMMANDS = {
+        "setup": "setup",
+        "commit": "commit",
+        "pre-commit": "pre_commit",
+        "post-commit": "post_commit",
+        "setup-husky": "setup_husky",
+        "summary": "summary",
+        "stats": "stats",
+        "search": "search",
+        "import": "import_history",
+        "gc": "gc",
+        "compress-diffs": "compress_diffs",
+        "flush": "flush",
+        "trace": "trace",
+        "daemon": "daemon",
+    }
+
+    def __init__(self, args=None):
+        self.args = args
+        self._cli_interface = None
+
+    @property
+    def cli_interface(self):
+        if self._cli_interface is None:
+            from .cli_interface import CLIInterface
+
+            self._cli_interface = CLIInterface()
+        return self._cli_interface
 
     def show_help(self):
         """Display detailed help for all commands"""
@@ -46,6 +74,13 @@ class Assistant:
                 "coas commit        # Create a new commit",
                 "coas setup-husky   # Setup Husky git hooks",
                 "coas summary       # View commit summary",
+                "coas summary --since 2024-03-01 --per-repo",
+                "coas stats --since 2024-01-01 --repo widgets",
+                'coas search "race condition" --repo widgets',
+                "coas import ~/code/widgets ~/code/gadgets",
+                "coas gc --keep-days 90 --max-diff-mb 200",
+                "COAS_TRACE_ENABLED=1 git commit; coas trace report",
+                "coas daemon start  # Serve the git hooks from a warm process",
             ]
         )
 
@@ -53,6 +88,10 @@ class Assistant:
 
     def setup(self):
         """Run initial setup"""
+        from .config import config
+        from .hooks_setup import setup_global_hooks
+        from .setup_db import create_db
+
         # 0. Config
         config.get("gemini", "api_key")
 
@@ -62,45 +101,142 @@ class Assistant:
         setup_global_hooks()
 
     def commit(self):
-        prepare_commit_msg()
+        from .prepare_commit_msg import prepare_commit_msg
+
+        prepare_commit_msg(
+            stream=not self.args.no_stream, use_cache=not self.args.no_cache
+        )
+
+    def _run_hook(self, command):
+        """Hand a hook to the daemon; True if it ran there"""
+        from .daemon import run_in_daemon
+
+        code = run_in_daemon(command)
+        if code:
+            sys.exit(code)
+        return code is not None
 
     def pre_commit(self):
+        if self._run_hook("pre-commit"):
+            return
+        from .pre_commit import save_commit_diff
+
         save_commit_diff()
 
     def post_commit(self):
+        if self._run_hook("post-commit"):
+            return
+        from .post_commit import save_commit_message
+
         save_commit_message()
 
     def setup_husky(self):
+        from .husky_hooks_setup import setup_husky_hooks
+
         setup_husky_hooks()
 
     def summary(self):
-        summarize_week_commit()
+        from .analyze import summarize_commits
+
+        summarize_commits(
+            since=self.args.since,
+            until=self.args.until,
+            repos=self.args.repo,
+            author=self.args.author,
+            per_repo=self.args.per_repo,
+        )
+
+    def stats(self):
+        from .analyze import show_stats
+
+        show_stats(
+            since=self.args.since,
+            until=self.args.until,
+            repos=self.args.repo,
+            author=self.args.author,
+        )
+
+    def search(self):
+        from .search import search
+
+        if not self.args.terms and not self.args.reindex:
+            raise ValueError("Nothing to search for: coas search <words>")
+        search(
+            " ".join(self.args.terms),
+            since=self.args.since,
+            until=self.args.until,
+            repos=self.args.repo,
+            author=self.args.author,
+            limit=self.args.limit,
+            reindex=self.args.reindex,
+        )
+
+    def import_history(self):
+        from .git_import import import_history
+
+        import_history(self.args.terms)
+
+    def gc(self):
+        from .gc import run_gc
+
+        run_gc(
+            diff_max_age_days=self.args.keep_days,
+            keep_diffs_per_repo=self.args.keep_per_repo,
+            max_diff_mb=self.args.max_diff_mb,
+        )
+
+    def compress_diffs(self):
+        from .setup_db import compress_existing_diffs
+
+        compress_existing_diffs()
+
+    def flush(self):
+        from .spool import flush_spool
+
+        flush_spool()
 
+    def trace(self):
+        from .trace import run_trace
 
-def cli():
+        run_trace(*self.args.terms[:1])
+
+    def daemon(self):
+        from .daemon import run_daemon
+
+        run_daemon(*self.args.terms[:1])
+
+    def run_command(self, command):
+        """Dispatch a command name to its handler"""
+        getattr(self, self.COMMANDS[command])()
+
+
+def display_error(message):
+    """Display an error without forcing rich onto the hook path"""
+    try:
+        from .cli_interface import CLIInterface
+    except ImportError:
+        print(f"Error: {message}", file=sys.stderr)
+    else:
+        CLIInterface.display_error(message)
+
+
+def cli(argv=None):
     # Create and run assistant
     try:
-        args = parse_args()
-        assistant = Assistant()
+        args = parse_args(argv)
+        assistant = Assistant(args)
 
-        if hasattr(args, "--help-command") and args.help:
+        if args.help_command:
             assistant.show_help()
             return
 
-        if args.command == "setup":
-            assistant.setup()
-        elif args.command == "commit":
-            assistant.commit()
-        elif args.command == "pre-commit":
-            assistant.pre_commit()
-        elif args.command == "post-commit":
-            assistant.post_commit()
-        elif args.command == "setup-husky":
-            assistant.setup_husky()
-        elif args.command == "summary":
-            assistant.summary()
+        if args.command:
+            from .trace import traced
+
+            with traced(args.command):
+                assistant.run_command(args.command)
 
     except Exception as e:
         # Other runtime errors
-        CLIInterface.display_error(str(e))
+        display_error(str(e))
         sys.exit(1)
@@ -1,6 +1,8 @@
 import argparse
 from .__version__ import VERSION
-from .cli_interface import WELCOME_MESSAGE
+
+# Constants
+WELCOME_MESSAGE = f"Commit Assistant v{VERSION}\nAnalyze and organize your commits"
 
 
 def parse_args(args=None) -> argparse.Namespace:
@@ -16,6 +18,65 @@ def parse_args(args=None) -> argparse.Namespace:
         action="store_true",
         help="Show detailed help information for all commands",
     )
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="commit: wait for the whole message instead of streaming it",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="commit: ignore the cached message for the staged changes",
+    )
+    parser.add_argument(
+        "--since",
+        help="summary, stats, search: start date (YYYY-MM-DD), "
+        "default this Monday (search: all history)",
+    )
+    parser.add_argument(
+        "--until",
+        help="summary, stats, search: end date (YYYY-MM-DD), default today",
+    )
+    parser.add_argument(
+        "--repo",
+        action="append",
+        help="summary, stats, search: only this repo, as org/repo or repo (repeatable)",
+    )
+    parser.add_argument(
+        "--author", help="summary, stats, search: only this author's name or email"
+    )
+    parser.add_argument(
+        "--per-repo",
+        action="store_true",
+        help="summary: summarize each repo concurrently, then merge",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=20,
+        help="search: number of commits to show (default 20)",
+    )
+    parser.add_argument(
+        "--reindex",
+        action="store_true",
+        help="search: rebuild the search index first, after changing commits "
+        "outside coas",
+    )
+    parser.add_argument(
+        "--keep-days",
+        type=float,
+        help="gc: drop diffs of commits older than this many days",
+    )
+    parser.add_argument(
+        "--keep-per-repo",
+        type=int,
+        help="gc: keep only the diffs of the newest N commits per repo",
+    )
+    parser.add_argument(
+        "--max-diff-mb",
+        type=float,
+        help="gc: drop the oldest diffs until all diffs fit in this many MiB",
+    )
     parser.add_argument(
         "command",
         nargs="?",  # Make command optional when showing help
@@ -25,9 +86,24 @@ def parse_args(args=None) -> argparse.Namespace:
             "post-commit",
             "setup-husky",
             "summary",
+            "stats",
+            "search",
+            "import",
+            "gc",
             "commit",
+            "compress-diffs",
+            "flush",
+            "trace",
+            "daemon",
         ],
         help="Command to execute",
     )
+    parser.add_argument(
+        "terms",
+        nargs="*",
+        help="search: words to look for; import: repository paths (default .); "
+        "trace: report (default) or clear; "
+        "daemon: start (default), run, stop or status",
+    )
 
-    return parser.parse_args()
+    return parser.parse_args(args)
@@ -2,15 +2,14 @@ from rich.console import Console
 from rich.table import Table
 from rich.prompt import Confirm
 from rich.panel import Panel
+from rich.markup import escape
 from typing import List, Dict
-from .__version__ import VERSION
+from .cli_args import WELCOME_MESSAGE
 import sys
+from datetime import datetime
 
 console = Console()
 
-# Constants
-WELCOME_MESSAGE = f"Commit Assistant v{VERSION}\nAnalyze and organize your commits"
-
 
 class CLIInterface:
     def __init__(self):
@@ -137,6 +136,49 @@ class CLIInterface:
         """Display commit information"""
         console.print(f"Analyzed commit: {commit_hash[:8]} - {commit_message}")
 
+    def display_stats(self, stats: Dict, period: str):
+        """Display commit statistics per repo, author and day"""
+        commits, added, removed = stats["total"]
+        console.print(f"\n[cyan]━━━ Commit Stats {period} ━━━[/cyan]")
+        console.print(f"{commits} commits, [green]+{added}[/green] [red]-{removed}[/red]")
+        for dimension in ("repo", "author", "day"):
+            if not stats[dimension]:
+                continue
+            table = Table(show_header=True, header_style="bold magenta", padding=(0, 1))
+            table.add_column(dimension.capitalize(), style="cyan")
+            table.add_column("Commits", justify="right")
+            table.add_column("±", justify="right")
+            table.add_column("Share", justify="right")
+            for key, commits, added, removed, share in stats[dimension]:
+                table.add_row(
+                    str(key), str(commits), f"+{added}/-{removed}", f"{share or 0}%"
+                )
+            console.print(table)
+
+    def display_search_results(self, query: str, hits: list):
+        """Display search hits with the matched terms highlighted"""
+        from .search import HIGHLIGHT_END, HIGHLIGHT_START
+
+        def highlight(snippet):
+            return (
+                escape(snippet)
+                .replace(HIGHLIGHT_START, "[bold yellow]")
+                .replace(HIGHLIGHT_END, "[/bold yellow]")
+            )
+
+        if not hits:
+            console.print(f"No commits match {escape(query)!r}")
+            return
+        for hit in hits:
+            when = datetime.fromtimestamp(hit.timestamp).strftime("%Y-%m-%d %H:%M")
+            console.print(
+                f"\n[cyan]{escape(hit.repo_name)}[/cyan] {when} "
+                f"{escape(hit.author_name)} [dim]#{hit.id}[/dim]"
+            )
+            console.print(highlight(hit.message))
+            if hit.diff:
+                console.print(f"[dim]{highlight(hit.diff)}[/dim]")
+
     def display_no_changes(self):
         """Display no changes message"""
         console.print("❌ No changes found")
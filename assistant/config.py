@@ -1,11 +1,24 @@
 import os
 import configparser
+import sys
+import time
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
+
+# Environment variables named COAS_<SECTION>_<KEY> override the file, e.g.
+# COAS_GEMINI_API_KEY or COAS_HOOKS_SPOOL
+ENV_PREFIX = "COAS_"
+
+# The file is stat'ed for changes at most this often
+RELOAD_CHECK_INTERVAL = 1.0
 
 
 class Config:
-    """Configuration manager for commit-assistant"""
+    """
+    Configuration manager for commit-assistant.
+    Nothing is read until the first value is needed; after that the file is
+    re-read only when its mtime changes. Creating a Config has no side effects.
+    """
 
     DEFAULT_CONFIG = {
         "gemini": {},
@@ -15,7 +28,13 @@ class Config:
         self.config_dir = Path(os.path.expanduser("~/.config/commit-assistant"))
         self.config_file = self.config_dir / "coas.conf"
         self.parser = configparser.ConfigParser()
-        self._load_config()
+        self._loaded = False
+        self._mtime: Optional[int] = None
+        self._checked = 0.0
+
+    @staticmethod
+    def env_name(section: str, key: str) -> str:
+        return f"{ENV_PREFIX}{section}_{key}".upper()
 
     def setup_gemini_api(self) -> None:
         """Setup Gemini API key interactively"""
@@ -33,37 +52,66 @@ class Config:
         self.save()
         print("Gemini API key saved successfully!")
 
-    def _load_config(self) -> None:
-        """Load configuration from file"""
+    def _stat_mtime(self) -> Optional[int]:
         try:
-            if not self.config_file.exists():
-                # Create config directory and file if they don't exist
-                self.config_dir.mkdir(parents=True, exist_ok=True)
-                # Save default configuration to file
-                self.save()
-                print(f"Created new config file at: {self.config_file}")
-            else:
-                self.parser.read(self.config_file)
+            return os.stat(self.config_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_config(self, mtime: Optional[int] = None) -> None:
+        """Load configuration from file; a missing file means defaults"""
+        parser = configparser.ConfigParser()
+        try:
+            if mtime is not None or self.config_file.exists():
+                parser.read(self.config_file)
         except Exception as e:
-            print(f"Error loading config: {e}")
+            print(f"Error loading config: {e}", file=sys.stderr)
             # Continue with default values
+        self.parser = parser
+        self._loaded = True
+        self._mtime = self._stat_mtime() if mtime is None else mtime
+        self._checked = time.monotonic()
+
+    def _ensure_loaded(self) -> None:
+        """Load on first use, and again when the file changed since"""
+        if self._loaded and time.monotonic() - self._checked < RELOAD_CHECK_INTERVAL:
+            return
+        mtime = self._stat_mtime()
+        if not self._loaded or mtime != self._mtime:
+            self._load_config(mtime)
+        self._checked = time.monotonic()
 
     def get(self, section: str, key: str, fallback: Any = None) -> Any:
-        """Get a configuration value"""
-        try:
-            value = self.parser.get(section, key)
-            if section == "gemini" and key == "api_key" and not value:
-                self.setup_gemini_api()
-                value = self.parser.get(section, key)
+        """
+        Get a configuration value, from the environment first, then the file.
+        A missing Gemini API key is asked for, but only on an interactive terminal.
+        """
+        value = os.environ.get(self.env_name(section, key))
+        if value is not None:
             return value
-        except (configparser.NoSectionError, configparser.NoOptionError):
-            if section == "gemini" and key == "api_key":
-                self.setup_gemini_api()
-                return self.parser.get(section, key)
+
+        self._ensure_loaded()
+        value = self.parser.get(section, key, fallback=None)
+        if section == "gemini" and key == "api_key" and not value:
+            if sys.stdin is None or not sys.stdin.isatty():
+                raise SystemExit(
+                    "Gemini API key is not configured. Run `coas setup` or set "
+                    f"{self.env_name(section, key)}."
+                )
+            self.setup_gemini_api()
+            return self.parser.get(section, key)
+        return fallback if value is None else value
+
+    def get_bool(self, section: str, key: str, fallback: bool = False) -> bool:
+        """Get a yes/no setting: 1, true, yes and on are true"""
+        value = self.get(section, key)
+        if value is None:
             return fallback
+        return str(value).strip().lower() in ("1", "true", "yes", "on")
 
     def set(self, section: str, key: str, value: str) -> None:
         """Set a configuration value"""
+        self._ensure_loaded()
         if section not in self.parser:
             self.parser[section] = {}
         self.parser[section][key] = value
@@ -71,8 +119,10 @@ class Config:
     def save(self) -> None:
         """Save configuration to file"""
         try:
+            self.config_dir.mkdir(parents=True, exist_ok=True)
             with open(self.config_file, "w") as f:
                 self.parser.write(f)
+            self._mtime = self._stat_mtime()
         except Exception as e:
             print(f"Error saving config: {e}")
 
@@ -99,7 +149,7 @@ class Config:
         return os.path.expanduser(path)
 
 
-# Global config instance
+# Global config instance, loaded on first use
 config = Config()
 
 if __name__ == "__main__":
@@ -0,0 +1,332 @@
+"""
+Warm hook server: `coas daemon`.
+
+Every hook otherwise pays for imports, config parsing and opening commits.db
+before doing a few milliseconds of work. The daemon does that once and keeps
+it warm, listening on a Unix socket in the config directory (mode 0600, so
+only its user can connect). The pre-commit and post-commit commands first try
+to hand their work to it and run in-process when no daemon answers.
+
+A request is one JSON line with the command, the hook's working directory
+and its GIT_* and COAS_* environment (git passes the index to use in
+GIT_INDEX_FILE); the answer is one JSON line with the exit code and output.
+Requests are served one at a time, each inside the client's directory and
+environment, so the hook code runs unchanged.
+
+The daemon exits after idle_timeout seconds without requests
+(`[daemon] idle_timeout`, default one hour). A lock file guarantees one
+daemon per socket, so a socket left behind by a crashed daemon is removed on
+the next start.
+"""
+
+import io
+import json
+import os
+import socket
+import sys
+import time
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+
+try:
+    import fcntl
+except ImportError:  # Windows: no daemon, the hooks always run in-process
+    fcntl = None
+
+SOCKET_PATH = os.path.join(
+    os.path.expanduser("~"), ".config", "commit-assistant", "coas.sock"
+)
+
+DEFAULT_IDLE_TIMEOUT = 3600
+
+# Environment of the hook that is applied while serving its request
+FORWARDED_ENV_PREFIXES = ("GIT_", "COAS_")
+
+# How long a hook waits for the daemon to answer; longer than the database
+# busy timeout, so a hook only gives up on a daemon that is stuck
+RESPONSE_TIMEOUT = 30.0
+CONNECT_TIMEOUT = 1.0
+
+# How long `coas daemon start` waits for the new daemon to answer
+START_TIMEOUT = 5.0
+
+
+def _hook_pre_commit():
+    from .pre_commit import save_commit_diff
+
+    save_commit_diff()
+
+
+def _hook_post_commit():
+    from .post_commit import save_commit_message
+
+    save_commit_message()
+
+
+# Commands the daemon runs for clients
+HANDLERS = {
+    "pre-commit": _hook_pre_commit,
+    "post-commit": _hook_post_commit,
+}
+
+
+def _send(sock, message):
+    sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+
+def _receive(sock):
+    with sock.makefile("rb") as stream:
+        line = stream.readline()
+    if not line:
+        raise ConnectionError("Connection closed without an answer")
+    return json.loads(line)
+
+
+def request(message, socket_path=SOCKET_PATH, timeout=RESPONSE_TIMEOUT):
+    """
+    Send one request to the daemon and return its answer.
+    Raises ConnectionRefusedError when no daemon accepts the connection, and
+    socket.timeout when the request was sent but not answered in time.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        raise ConnectionRefusedError("Unix sockets are not supported here")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(socket_path)
+        except OSError as e:
+            # No socket file, nobody listening, or a daemon too busy to accept
+            raise ConnectionRefusedError(f"No coas daemon on {socket_path}: {e}") from e
+        sock.settimeout(timeout)
+        _send(sock, message)
+        return _receive(sock)
+
+
+def run_in_daemon(command, socket_path=SOCKET_PATH):
+    """
+    Run a hook command in the daemon, printing its output.
+    Returns its exit code, or None when no daemon is running and the
+    caller should run the command itself.
+    """
+    from .trace import span
+
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if key.startswith(FORWARDED_ENV_PREFIXES)
+    }
+    try:
+        with span("daemon"):
+            response = request(
+                {"command": command, "cwd": os.getcwd(), "env": env}, socket_path
+            )
+    except ConnectionRefusedError:
+        return None
+    except socket.timeout:
+        raise RuntimeError(f"coas daemon did not answer within {RESPONSE_TIMEOUT:g}s")
+    sys.stdout.write(response.get("output", ""))
+    return response.get("code", 1)
+
+
+@contextmanager
+def client_context(cwd, env):
+    """Run in the client's directory with its GIT_* and COAS_* environment"""
+    saved_cwd = os.getcwd()
+    saved_env = {
+        key: value
+        for key, value in os.environ.items()
+        if key.startswith(FORWARDED_ENV_PREFIXES)
+    }
+    for key in saved_env:
+        del os.environ[key]
+    os.environ.update(env)
+    os.chdir(cwd)
+    try:
+        yield
+    finally:
+        os.chdir(saved_cwd)
+        for key in env:
+            os.environ.pop(key, None)
+        os.environ.update(saved_env)
+
+
+def _command(message):
+    """The command of a request, None when the request is malformed"""
+    if isinstance(message, dict) and isinstance(message.get("command"), str):
+        return message["command"]
+    return None
+
+
+def handle(message):
+    """Serve one request. Returns the answer"""
+    from .trace import traced
+
+    command = _command(message)
+    if command is None:
+        return {"code": 2, "output": "Malformed daemon request\n"}
+    if command == "ping":
+        return {"code": 0, "pid": os.getpid()}
+    if command == "stop":
+        return {"code": 0, "output": "coas daemon stopped.\n"}
+    handler = HANDLERS.get(command)
+    if handler is None:
+        return {"code": 2, "output": f"Unknown daemon command: {command}\n"}
+
+    output = io.StringIO()
+    code = 0
+    with redirect_stdout(output), redirect_stderr(output):
+        try:
+            with client_context(message["cwd"], message.get("env", {})):
+                with traced(f"daemon:{command}", startup=False):
+                    handler()
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception as e:
+            print(f"Error: {e}")
+            code = 1
+    return {"code": code, "output": output.getvalue()}
+
+
+def _lock(socket_path):
+    """Take the daemon lock of socket_path. Returns its fd, None when held"""
+    fd = os.open(f"{socket_path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def warm_up():
+    """Load what the hooks need: modules, config and the database connection"""
+    from . import post_commit, pre_commit  # noqa: F401
+    from .spool import spool_enabled
+    from .store import DB_PATH, open_store
+
+    spool_enabled()
+    if os.path.exists(DB_PATH):
+        open_store()
+
+
+def serve(socket_path=SOCKET_PATH, idle_timeout=DEFAULT_IDLE_TIMEOUT, ready=None):
+    """
+    Serve requests until stopped or idle for idle_timeout seconds.
+    ready, if given, is called once the socket is listening.
+    Returns the number of hook requests served
+    """
+    if fcntl is None or not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("coas daemon needs Unix sockets")
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    lock_fd = _lock(socket_path)
+    if lock_fd is None:
+        raise RuntimeError(f"coas daemon is already running on {socket_path}")
+
+    served = 0
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        # Holding the lock, any socket file left is from a dead daemon
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        umask = os.umask(0o077)
+        try:
+            server.bind(socket_path)
+        finally:
+            os.umask(umask)
+        server.listen(16)
+        server.settimeout(idle_timeout or None)
+        warm_up()
+        if ready is not None:
+            ready()
+
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                break  # idle
+            with conn:
+                conn.settimeout(RESPONSE_TIMEOUT)
+                try:
+                    message = _receive(conn)
+                    response = handle(message)
+                    _send(conn, response)
+                except (OSError, ValueError):
+                    continue  # the client went away or sent garbage
+            command = _command(message)
+            if command == "stop":
+                break
+            if command in HANDLERS:
+                served += 1
+    finally:
+        server.close()
+        try:
+            os.remove(socket_path)
+        except FileNotFoundError:
+            pass
+        os.close(lock_fd)
+    return served
+
+
+def idle_timeout_setting():
+    from .config import config
+
+    return float(config.get("daemon", "idle_timeout", DEFAULT_IDLE_TIMEOUT))
+
+
+def daemon_pid(socket_path=SOCKET_PATH):
+    """pid of the running daemon, None when there is none"""
+    try:
+        return request({"command": "ping"}, socket_path, CONNECT_TIMEOUT)["pid"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def start(socket_path=SOCKET_PATH):
+    """Start a detached daemon and wait until it answers. Returns its pid"""
+    # Imported here: the hooks load this module and never start a daemon
+    import subprocess
+
+    pid = daemon_pid(socket_path)
+    if pid is not None:
+        return pid
+    subprocess.Popen(
+        [sys.executable, "-m", "assistant", "daemon", "run"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        pid = daemon_pid(socket_path)
+        if pid is not None:
+            return pid
+        time.sleep(0.05)
+    raise RuntimeError("coas daemon did not start, run `coas daemon run` to see why")
+
+
+def run_daemon(action="start"):
+    """Command entry point for `coas daemon [start|run|stop|status]`"""
+    if action == "start":
+        print(f"coas daemon running (pid {start()}) on {SOCKET_PATH}")
+    elif action == "run":
+        import signal
+
+        # Let SIGTERM run the cleanup in serve()
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        idle_timeout = idle_timeout_setting()
+        print(f"coas daemon listening on {SOCKET_PATH}, pid {os.getpid()}")
+        served = serve(SOCKET_PATH, idle_timeout)
+        print(f"coas daemon exiting after {served} requests")
+    elif action == "stop":
+        try:
+            print(request({"command": "stop"})["output"], end="")
+        except ConnectionRefusedError:
+            print("coas daemon is not running.")
+    elif action == "status":
+        pid = daemon_pid()
+        if pid is None:
+            print("coas daemon is not running.")
+        else:
+            print(f"coas daemon running (pid {pid}) on {SOCKET_PATH}")
+    else:
+        raise ValueError(f"Unknown daemon action: {action} (start, run, stop or status)")
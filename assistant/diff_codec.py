@@ -0,0 +1,59 @@
+"""
+Encoding and addressing of stored diffs.
+
+Diffs live in the diff_blobs table, once per distinct text, keyed by
+diff_hash() of the text (see the v11 migration); commits refer to them by
+that key. They are stored as zlib-compressed BLOBs with the codec name in
+code_diff_codec. Diffs written before compression keep plain TEXT and a
+NULL codec, so every reader must go through decode_diff.
+"""
+
+import hashlib
+import zlib
+
+CODEC_ZLIB = "zlib"
+
+# Diffs shorter than this rarely shrink enough to be worth compressing
+MIN_COMPRESS_BYTES = 64
+COMPRESS_LEVEL = 6
+
+
+def encode_diff(diff):
+    """
+    Encode a diff for storage.
+    Returns tuple of (code_diff, code_diff_codec)
+    """
+    if diff is None:
+        return None, None
+    raw = diff.encode("utf-8")
+    if len(raw) < MIN_COMPRESS_BYTES:
+        return diff, None
+    compressed = zlib.compress(raw, COMPRESS_LEVEL)
+    if len(compressed) >= len(raw):
+        return diff, None
+    return compressed, CODEC_ZLIB
+
+
+def diff_hash(diff):
+    """Content address of a diff: the hex SHA-256 of its text"""
+    return hashlib.sha256(diff.encode("utf-8")).hexdigest()
+
+
+def decode_diff(code_diff, codec):
+    """Decode a stored code_diff value back to text"""
+    if code_diff is None:
+        return None
+    if codec is None:
+        return code_diff if isinstance(code_diff, str) else code_diff.decode("utf-8")
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(code_diff).decode("utf-8")
+    raise ValueError(f"Unknown diff codec: {codec}")
+
+
+def register_functions(conn):
+    """
+    Make decode_diff available to SQL as coas_decode_diff(code_diff, codec).
+    The commits_text view behind the full-text index calls it, so search
+    snippets and index rebuilds need it; writing commits does not.
+    """
+    conn.create_function("coas_decode_diff", 2, decode_diff, deterministic=True)
@@ -0,0 +1,246 @@
+"""
+Fit a staged diff into a token budget before prompting.
+
+Binary, lock and generated files are reduced to their stat line, context
+lines are capped around each change, and the remaining files are included in
+order of churn until the budget is spent. A per-file stat header is always
+included so the model still sees everything that changed.
+"""
+
+import fnmatch
+import itertools
+import os
+import re
+from typing import List, NamedTuple, Tuple
+
+DEFAULT_TOKEN_BUDGET = 8000
+MAX_CONTEXT_LINES = 2
+
+# Files whose content says little about intent. Generated patterns match
+# at any depth: dist/* also matches web/dist/app.js
+LOCKFILE_PATTERNS = (
+    "package-lock.json",
+    "npm-shrinkwrap.json",
+    "yarn.lock",
+    "pnpm-lock.yaml",
+    "poetry.lock",
+    "Pipfile.lock",
+    "uv.lock",
+    "Cargo.lock",
+    "Gemfile.lock",
+    "composer.lock",
+    "go.sum",
+    "pubspec.lock",
+    "Podfile.lock",
+)
+GENERATED_PATTERNS = (
+    "*.min.js",
+    "*.min.css",
+    "*.map",
+    "*_pb2.py",
+    "*_pb2_grpc.py",
+    "*.pb.go",
+    "*.generated.*",
+    "*.snap",
+    "dist/*",
+    "build/*",
+    "vendor/*",
+    "node_modules/*",
+)
+
+DIFF_HEADER = re.compile(r"^diff --git a/(.*?) b/(.*)$")
+
+
+class FileDiff(NamedTuple):
+    path: str
+    lines: List[str]
+    added: int
+    removed: int
+    skip_reason: str  # "" when the content should be included
+
+
+class CompactionReport(NamedTuple):
+    original_tokens: int
+    compacted_tokens: int
+    skipped_files: List[Tuple[str, str]]  # (path, reason)
+    truncated_files: List[str]
+
+    @property
+    def changed(self) -> bool:
+        return self.compacted_tokens < self.original_tokens
+
+    def summary(self) -> str:
+        parts = [f"{self.original_tokens} -> {self.compacted_tokens} tokens"]
+        if self.skipped_files:
+            parts.append(f"{len(self.skipped_files)} files reduced to stats")
+        if self.truncated_files:
+            parts.append(f"{len(self.truncated_files)} files truncated")
+        return "Diff compacted: " + ", ".join(parts)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def skip_reason(path: str, lines: List[str]) -> str:
+    name = path.rsplit("/", 1)[-1]
+    if name in LOCKFILE_PATTERNS:
+        return "lockfile"
+    if any(
+        fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(path, "*/" + pattern)
+        for pattern in GENERATED_PATTERNS
+    ):
+        return "generated"
+    if any(
+        line.startswith("Binary files ") or line == "GIT binary patch" for line in lines
+    ):
+        return "binary"
+    return ""
+
+
+def split_files(diff: str) -> List[FileDiff]:
+    """Split a unified git diff into per-file sections with their churn"""
+    sections = []
+    for line in diff.splitlines():
+        if line.startswith("diff --git "):
+            sections.append([line])
+        elif sections:
+            sections[-1].append(line)
+
+    files = []
+    for lines in sections:
+        match = DIFF_HEADER.match(lines[0])
+        path = match.group(2) if match else lines[0][len("diff --git ") :]
+        added = removed = 0
+        in_hunk = False
+        for line in lines[1:]:
+            if line.startswith("@@"):
+                in_hunk = True
+            elif in_hunk and line.startswith("+"):
+                added += 1
+            elif in_hunk and line.startswith("-"):
+                removed += 1
+        files.append(FileDiff(path, lines, added, removed, skip_reason(path, lines)))
+    return files
+
+
+def cap_context(lines: List[str], max_context: int = MAX_CONTEXT_LINES) -> List[str]:
+    """Keep at most max_context unchanged lines around each change in a hunk"""
+    result = []
+    in_hunk = False
+    hunk: List[str] = []
+
+    def flush_hunk():
+        keep = [False] * len(hunk)
+        for i, line in enumerate(hunk):
+            if line[:1] != " ":
+                for j in range(max(0, i - max_context), min(len(hunk), i + max_context + 1)):
+                    keep[j] = True
+        elided = False
+        for line, kept in zip(hunk, keep):
+            if kept:
+                result.append(line)
+                elided = False
+            elif not elided:
+                result.append(" ...")
+                elided = True
+        hunk.clear()
+
+    for line in lines:
+        if line.startswith("@@"):
+            flush_hunk()
+            in_hunk = True
+            result.append(line)
+        elif in_hunk and line[:1] in (" ", "+", "-", "\\"):
+            hunk.append(line)
+        else:
+            flush_hunk()
+            in_hunk = False
+            result.append(line)
+    flush_hunk()
+    return result
+
+
+def stat_header(files: List[FileDiff]) -> str:
+    lines = ["Changed files:"]
+    for f in files:
+        note = f" ({f.skip_reason}, content omitted)" if f.skip_reason else ""
+        lines.append(f"  {f.path} | +{f.added} -{f.removed}{note}")
+    return "\n".join(lines)
+
+
+def compact_diff(
+    diff: str,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_context: int = MAX_CONTEXT_LINES,
+) -> Tuple[str, CompactionReport]:
+    """
+    Compact diff to roughly token_budget tokens.
+    Returns tuple of (compacted_diff, report)
+    """
+    files = split_files(diff)
+    header = stat_header(files)
+    remaining = token_budget - estimate_tokens(header)
+
+    skipped = [(f.path, f.skip_reason) for f in files if f.skip_reason]
+    truncated = []
+    parts = [header]
+    for f in sorted(files, key=lambda f: f.added + f.removed, reverse=True):
+        if f.skip_reason:
+            continue
+        text = "\n".join(cap_context(f.lines, max_context))
+        tokens = estimate_tokens(text)
+        if tokens <= remaining:
+            parts.append(text)
+            remaining -= tokens
+        elif remaining > 0:
+            # Include the head of the file's diff in what is left of the budget
+            cut = text[: remaining * 4].rsplit("\n", 1)[0]
+            parts.append(f"{cut}\n... (truncated)")
+            truncated.append(f.path)
+            remaining = 0
+        else:
+            truncated.append(f.path)
+
+    compacted = "\n\n".join(parts)
+    report = CompactionReport(
+        estimate_tokens(diff), estimate_tokens(compacted), skipped, truncated
+    )
+    return compacted, report
+
+
+def chunk_diff(diff: str, chunk_budget: int = DEFAULT_TOKEN_BUDGET) -> List[str]:
+    """
+    Split a diff too large for one prompt into chunks of about chunk_budget
+    tokens each. Files of one directory stay together when they fit; a single
+    file over the budget gets a chunk of its own and is compacted within it.
+    Lock, binary and generated files are left out, the stat header covers them.
+    """
+    files = sorted(
+        (f for f in split_files(diff) if not f.skip_reason), key=lambda f: f.path
+    )
+
+    # Units to pack: whole directories, or their files when a directory is too big
+    units = []
+    for _, group in itertools.groupby(files, key=lambda f: os.path.dirname(f.path)):
+        group = [(f, estimate_tokens("\n".join(cap_context(f.lines)))) for f in group]
+        if sum(tokens for _, tokens in group) <= chunk_budget:
+            units.append(group)
+        else:
+            units.extend([item] for item in group)
+
+    chunks: List[List[FileDiff]] = []
+    used = chunk_budget
+    for unit in units:
+        tokens = sum(tokens for _, tokens in unit)
+        if used + tokens > chunk_budget:
+            chunks.append([])
+            used = 0
+        chunks[-1].extend(f for f, _ in unit)
+        used += tokens
+
+    return [
+        compact_diff("\n".join("\n".join(f.lines) for f in chunk), chunk_budget)[0]
+        for chunk in chunks
+    ]
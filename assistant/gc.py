@@ -0,0 +1,251 @@
+"""
+Retention for commits.db: `coas gc`.
+
+Old diffs are the bulk of the database, so the policies drop diffs and keep
+the commit metadata and messages that stats and summaries use. Commits with
+the same diff share one stored copy (see the v11 migration); dropping a
+commit's diff releases its reference, and the copy is deleted with the last
+one.
+
+- diff_max_age_days: drop diffs of commits older than this many days
+- keep_diffs_per_repo: keep only the diffs of the newest N commits per repo
+- max_diff_mb: drop the oldest diffs until all diffs fit in this many MiB
+
+Policies are set under `[gc]` in coas.conf (0 or unset disables one) or on
+the command line. Rows are changed in small batches, each in its own short
+transaction, and the freed pages are returned to the filesystem with
+incremental vacuum steps, so hooks committing meanwhile only ever wait for
+one batch.
+
+gc also rebuilds the full-text index when commits were inserted or deleted
+by another SQLite client, which leaves the index behind (see store).
+"""
+
+import time
+from collections import Counter
+from typing import List, NamedTuple, Optional
+
+from .store import DB_PATH, open_store
+
+BATCH_SIZE = 500
+VACUUM_STEP_PAGES = 256
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class RetentionPolicy(NamedTuple):
+    diff_max_age_days: float = 0
+    keep_diffs_per_repo: int = 0
+    max_diff_mb: float = 0
+
+    @property
+    def enabled(self) -> bool:
+        return any(self)
+
+
+class GcReport(NamedTuple):
+    dropped_by_age: int
+    dropped_by_repo: int
+    dropped_by_size: int
+    pages_freed: int
+    index_rebuilt: bool = False
+
+
+def load_policy(
+    diff_max_age_days=None, keep_diffs_per_repo=None, max_diff_mb=None
+) -> RetentionPolicy:
+    """The retention policy from `[gc]` in the config, overridden by arguments"""
+    from .config import config
+
+    def setting(value, key, cast):
+        if value is None:
+            value = config.get("gc", key, 0)
+        return cast(value or 0)
+
+    return RetentionPolicy(
+        setting(diff_max_age_days, "diff_max_age_days", float),
+        setting(keep_diffs_per_repo, "keep_diffs_per_repo", int),
+        setting(max_diff_mb, "max_diff_mb", float),
+    )
+
+
+def _drop_in_batches(store, where, params, batch_size=BATCH_SIZE) -> int:
+    """
+    Drop the diffs of the rows matching where, oldest first, one short
+    transaction per batch, deleting the stored diffs no commit refers to any
+    more. Batches continue after the last row of the previous one, so no row
+    is scanned twice.
+    """
+    dropped = 0
+    last = (float("-inf"), 0)
+    while True:
+        with store.transaction():
+            rows = store.query(
+                f"""
+                SELECT timestamp, id FROM commits
+                WHERE diff_hash IS NOT NULL AND {where} AND (timestamp, id) > (?, ?)
+                ORDER BY timestamp, id
+                LIMIT ?
+                """,
+                [*params, *last, batch_size],
+            )
+            if rows:
+                store.drop_diffs([row[1] for row in rows])
+        dropped += len(rows)
+        if len(rows) < batch_size:
+            return dropped
+        last = rows[-1]
+
+
+def drop_old_diffs(store, max_age_days, now=None, batch_size=BATCH_SIZE) -> int:
+    cutoff = (now or time.time()) - max_age_days * 86400
+    return _drop_in_batches(store, "timestamp < ?", [cutoff], batch_size)
+
+
+def drop_diffs_beyond_per_repo(store, keep, batch_size=BATCH_SIZE) -> int:
+    dropped = 0
+    repos = store.query(
+        "SELECT DISTINCT repo_name FROM commits WHERE diff_hash IS NOT NULL"
+    )
+    for (repo_name,) in repos:
+        # The oldest diff to keep; everything before it goes
+        cutoff = store.query_one(
+            """
+            SELECT timestamp, id FROM commits
+            WHERE repo_name = ? AND diff_hash IS NOT NULL
+            ORDER BY timestamp DESC, id DESC
+            LIMIT 1 OFFSET ?
+            """,
+            (repo_name, keep - 1),
+        )
+        if cutoff is not None:
+            dropped += _drop_in_batches(
+                store,
+                "repo_name = ? AND (timestamp, id) < (?, ?)",
+                [repo_name, *cutoff],
+                batch_size,
+            )
+    return dropped
+
+
+def diff_bytes(store) -> int:
+    # length() of a BLOB is its size without reading it; legacy TEXT diffs
+    # count in characters, close enough for a budget. A shared diff counts
+    # once.
+    return store.query_one(
+        "SELECT COALESCE(SUM(length(code_diff)), 0) FROM diff_blobs"
+    )[0]
+
+
+def drop_diffs_over_size(store, max_bytes, batch_size=BATCH_SIZE) -> int:
+    """Drop the oldest diffs until the rest take at most max_bytes"""
+    excess = diff_bytes(store) - max_bytes
+    if excess <= 0:
+        return 0
+    # Find the newest diff that has to go, then drop everything up to it. A
+    # shared diff frees its space only with the last commit referring to it.
+    cutoff = None
+    released = Counter()
+    for timestamp, commit_id, key, refcount, size in store.conn.execute(
+        """
+        SELECT timestamp, id, hash, refcount, length(diff_blobs.code_diff)
+        FROM commits JOIN diff_blobs ON diff_blobs.hash = commits.diff_hash
+        ORDER BY timestamp, id
+        """
+    ):
+        released[key] += 1
+        if released[key] < refcount:
+            continue
+        excess -= size
+        if excess <= 0:
+            cutoff = (timestamp, commit_id)
+            break
+    if cutoff is None:
+        return 0
+    return _drop_in_batches(store, "(timestamp, id) <= (?, ?)", cutoff, batch_size)
+
+
+def incremental_vacuum(store, step_pages=VACUUM_STEP_PAGES) -> int:
+    """
+    Return free pages to the filesystem a few at a time, each step its own
+    short write. A database created before auto_vacuum was enabled is
+    converted once with a full VACUUM first.
+    Returns the number of pages freed
+    """
+    conn = store.conn
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        print("Enabling incremental vacuum (one-time full VACUUM)...")
+        before = conn.execute("PRAGMA page_count").fetchone()[0]
+        conn.execute(f"PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+        conn.execute("VACUUM")
+        return before - conn.execute("PRAGMA page_count").fetchone()[0]
+
+    freed = 0
+    while True:
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free_pages:
+            return freed
+        conn.execute(f"PRAGMA incremental_vacuum({step_pages})").fetchall()
+        freed += free_pages - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def collect(
+    policy: RetentionPolicy,
+    db_path=DB_PATH,
+    now: Optional[float] = None,
+    batch_size=BATCH_SIZE,
+) -> GcReport:
+    """
+    Rebuild the full-text index if it drifted, apply policy to the database
+    and vacuum what it freed
+    """
+    store = open_store(db_path)
+    # Before dropping diffs: taking a diff out of the index needs the index
+    # to hold the commit's current text
+    index_rebuilt = store.index_drifted()
+    if index_rebuilt:
+        store.rebuild_index()
+    by_age = by_repo = by_size = 0
+    if policy.diff_max_age_days:
+        by_age = drop_old_diffs(store, policy.diff_max_age_days, now, batch_size)
+    if policy.keep_diffs_per_repo:
+        by_repo = drop_diffs_beyond_per_repo(
+            store, policy.keep_diffs_per_repo, batch_size
+        )
+    if policy.max_diff_mb:
+        by_size = drop_diffs_over_size(
+            store, int(policy.max_diff_mb * 1024 * 1024), batch_size
+        )
+    return GcReport(
+        by_age, by_repo, by_size, incremental_vacuum(store), index_rebuilt
+    )
+
+
+def run_gc(diff_max_age_days=None, keep_diffs_per_repo=None, max_diff_mb=None):
+    """Command entry point for `coas gc`"""
+    from .spool import flush
+
+    flush()
+    policy = load_policy(diff_max_age_days, keep_diffs_per_repo, max_diff_mb)
+    if not policy.enabled:
+        print("No retention policy set, only reclaiming free space.")
+    report = collect(policy)
+    if report.index_rebuilt:
+        print("Rebuilt the search index: commits were changed outside coas")
+    lines: List[str] = []
+    if policy.diff_max_age_days:
+        lines.append(
+            f"{report.dropped_by_age} diffs older than {policy.diff_max_age_days:g} days"
+        )
+    if policy.keep_diffs_per_repo:
+        lines.append(
+            f"{report.dropped_by_repo} diffs beyond the newest "
+            f"{policy.keep_diffs_per_repo} per repo"
+        )
+    if policy.max_diff_mb:
+        lines.append(
+            f"{report.dropped_by_size} diffs over the {policy.max_diff_mb:g} MiB budget"
+        )
+    for line in lines:
+        print(f"Dropped {line}")
+    print(f"Freed {report.pages_freed} pages")
@@ -0,0 +1,181 @@
+"""
+Backfill the database from existing git history.
+
+`coas import <paths>` reads each repository's log with one `git log --numstat`
+call, in parallel worker processes, and inserts the commits in one
+transaction per repository. The last imported commit is recorded in the
+imports table, so a re-run only reads the commits made since.
+
+Imported rows have no diff and the commit token "git:<sha>", which makes a
+repeated import of the same commit a no-op. Commits made after the hooks
+started recording a repository are left to the hooks.
+"""
+
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional
+
+from .repo_info import find_git_dir, get_repo_info
+from .store import DB_PATH, open_store
+
+TOKEN_PREFIX = "git:"
+
+# One record per commit: NUL, the header fields separated by US, RS, then the
+# --numstat lines of the commit
+LOG_FORMAT = "%x00%H%x1f%ct%x1f%an%x1f%ae%x1f%B%x1e"
+
+
+class RepoLog(NamedTuple):
+    repo_path: str
+    repo_url: str
+    repo_name: str
+    head: str  # "" for a repository without commits
+    rows: list  # CommitStore.insert_commits rows, oldest commit first
+
+
+def parse_log(output: str, repo_url: str, repo_name: str, branch: str) -> list:
+    """Turn `git log --format=LOG_FORMAT --numstat` output into commit rows"""
+    rows = []
+    for record in output.split("\0"):
+        header, sep, numstat = record.partition("\x1e")
+        if not sep:
+            continue
+        sha, timestamp, author_name, author_email, message = header.split("\x1f", 4)
+        added_lines = removed_lines = 0
+        for line in numstat.splitlines():
+            added, _, rest = line.partition("\t")
+            removed = rest.partition("\t")[0]
+            if added.isdigit() and removed.isdigit():  # "-" for binary files
+                added_lines += int(added)
+                removed_lines += int(removed)
+        rows.append(
+            (
+                float(timestamp),
+                author_name,
+                author_email,
+                message.strip(),
+                repo_url,
+                repo_name,
+                branch,
+                None,
+                added_lines,
+                removed_lines,
+                TOKEN_PREFIX + sha,
+            )
+        )
+    return rows
+
+
+def _git(repo_path, *args, check=True):
+    return subprocess.run(
+        ["git", "-C", repo_path, *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=check,
+    )
+
+
+def read_repo_log(repo_path: str, since_sha: Optional[str] = None) -> RepoLog:
+    """
+    Read the commits reachable from HEAD, only those after since_sha when it
+    is still an ancestor of HEAD (history may have been rewritten since).
+    Runs in a worker process.
+    """
+    _, _, work_tree = find_git_dir(repo_path)
+    info = get_repo_info(work_tree)
+    head = _git(work_tree, "rev-parse", "--verify", "--quiet", "HEAD", check=False)
+    head = head.stdout.decode().strip()
+    if not head or head == since_sha:
+        return RepoLog(work_tree, info.repo_url, info.repo_name, head, [])
+
+    revisions = "HEAD"
+    if since_sha:
+        ancestor = _git(
+            work_tree, "merge-base", "--is-ancestor", since_sha, "HEAD", check=False
+        )
+        if ancestor.returncode == 0:
+            revisions = f"{since_sha}..HEAD"
+
+    output = _git(
+        work_tree,
+        "log",
+        "--reverse",
+        "--no-merges",
+        "--no-renames",
+        "--no-color",
+        "--numstat",
+        f"--format={LOG_FORMAT}",
+        revisions,
+    ).stdout.decode("utf-8", errors="replace")
+    rows = parse_log(output, info.repo_url, info.repo_name, info.branch)
+    return RepoLog(work_tree, info.repo_url, info.repo_name, head, rows)
+
+
+def store_repo_log(store, log: RepoLog) -> int:
+    """
+    Insert the commits of one repository and record its head, in one transaction.
+    Returns the number of commits inserted.
+    """
+    with store.transaction():
+        # Leave commits the hooks recorded (or will record) to the hooks
+        hooked_since = store.query_one(
+            """
+            SELECT MIN(timestamp) FROM commits
+            WHERE repo_name = ? AND (commit_token IS NULL OR commit_token NOT LIKE ?)
+            """,
+            (log.repo_name, TOKEN_PREFIX + "%"),
+        )[0]
+        rows = log.rows
+        if hooked_since is not None:
+            rows = [row for row in rows if row[0] < hooked_since]
+
+        inserted = store.insert_commits(rows)
+        if log.head:
+            store.conn.execute(
+                """
+                INSERT INTO imports (repo_path, repo_name, last_sha, commit_count, updated)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (repo_path) DO UPDATE SET
+                    repo_name = excluded.repo_name,
+                    last_sha = excluded.last_sha,
+                    commit_count = commit_count + excluded.commit_count,
+                    updated = excluded.updated
+                """,
+                (log.repo_path, log.repo_name, log.head, inserted, time.time()),
+            )
+    return inserted
+
+
+def import_repos(paths: List[str], db_path=DB_PATH, max_workers=None) -> list:
+    """
+    Import the history of each repository in paths.
+    Returns list of (repo_name, commits_inserted)
+    """
+    store = open_store(db_path)
+    repos = [find_git_dir(path)[2] for path in paths]
+    since = dict(store.query("SELECT repo_path, last_sha FROM imports"))
+    jobs = [(repo, since.get(repo)) for repo in dict.fromkeys(repos)]
+
+    if len(jobs) <= 1:
+        logs = [read_repo_log(*job) for job in jobs]
+        return [(log.repo_name, store_repo_log(store, log)) for log in logs]
+    # git does the heavy lifting, the workers only run and parse it. Writes
+    # stay in this process, one repository at a time as the logs arrive.
+    workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [
+            (log.repo_name, store_repo_log(store, log))
+            for log in pool.map(read_repo_log, *zip(*jobs))
+        ]
+
+
+def import_history(paths):
+    """Command entry point for `coas import`"""
+    start = time.perf_counter()
+    results = import_repos(paths or ["."])
+    for repo_name, inserted in results:
+        print(f"{repo_name}: imported {inserted} commits")
+    total = sum(inserted for _, inserted in results)
+    print(f"Imported {total} commits in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,398 @@
+"""
+LLM client interface.
+
+Commands talk to the model through an LLMClient so the backend can be
+swapped: GeminiClient wraps google-genai (imported only when used), and
+FakeClient is a local, deterministic backend for tests and benchmarks.
+
+get_client() hands every command the same Scheduler around the backend,
+which keeps all model calls of the process within the quota:
+
+- a token bucket limits the request rate (`[gemini] requests_per_minute`);
+  a minute's worth of requests may go at once, so the chunk fan-out of a
+  single large commit or summary is not held back
+- a semaphore caps the calls in flight (`[gemini] max_concurrency`)
+- throttled (429), unavailable (5xx) and timed-out calls are retried with
+  jittered exponential backoff (`[gemini] max_retries`)
+- every call has a deadline covering queueing, retries and the response
+  itself (`[gemini] deadline`, in seconds)
+- concurrent generate() calls for the same prompt share one request
+"""
+
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_MODEL = "gemini-2.0-flash-exp"
+
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_DEADLINE = 120.0
+
+
+# Backoff before retry n is uniform in [0, min(BACKOFF_CAP, BACKOFF_BASE * 2**n)]
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# HTTP statuses worth retrying: throttled, or the service is having trouble
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """A failed model call; code is the HTTP status, when there is one"""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+
+class DeadlineExceeded(LLMError, TimeoutError):
+    """The call did not finish within its deadline"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether a failed call may succeed when repeated. google-genai's APIError
+    carries the status in .code, like LLMError.
+    """
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, "code", None) in RETRYABLE_STATUS
+
+
+class LLMClient(ABC):
+    """Interface every backend implements"""
+
+    def generate(self, prompt: str, model: str = DEFAULT_MODEL) -> str:
+        """Return the whole response text"""
+        return "".join(self.generate_stream(prompt, model))
+
+    @abstractmethod
+    def generate_stream(self, prompt: str, model: str = DEFAULT_MODEL) -> Iterator[str]:
+        """Yield response text chunks as they arrive"""
+
+
+class GeminiClient(LLMClient):
+    """Backend using the google-genai SDK"""
+
+    def __init__(self, api_key: str, timeout: float = DEFAULT_DEADLINE):
+        from google import genai
+
+        # The SDK's own timeout bounds each HTTP request, in milliseconds
+        self.client = genai.Client(
+            api_key=api_key, http_options={"timeout": int(timeout * 1000)}
+        )
+
+    def generate(self, prompt: str, model: str = DEFAULT_MODEL) -> str:
+        response = self.client.models.generate_content(model=model, contents=prompt)
+        return response.text
+
+    def generate_stream(self, prompt: str, model: str = DEFAULT_MODEL) -> Iterator[str]:
+        for chunk in self.client.models.generate_content_stream(
+            model=model, contents=prompt
+        ):
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeClient(LLMClient):
+    """
+    Local backend that streams a canned response, optionally with a delay
+    before the first chunk and between chunks. Prompts are recorded in
+    self.prompts so tests can inspect what would have been sent.
+
+    It can also play a throttling service: with max_concurrent or
+    requests_per_second set, requests beyond them fail with a 429 LLMError
+    and are counted in self.rejected, and self.peak_concurrency records the
+    most requests that were in flight at once.
+    """
+
+    def __init__(
+        self,
+        response: str = "chore: update files",
+        chunk_size: int = 8,
+        first_chunk_delay: float = 0.0,
+        chunk_delay: float = 0.0,
+        max_concurrent: Optional[int] = None,
+        requests_per_second: Optional[float] = None,
+    ):
+        self.response = response
+        self.chunk_size = chunk_size
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+        self.max_concurrent = max_concurrent
+        self.requests_per_second = requests_per_second
+        self.prompts: List[str] = []
+        self.rejected = 0
+        self.peak_concurrency = 0
+        self._in_flight = 0
+        self._accepted: List[float] = []
+        self._lock = threading.Lock()
+
+    def respond(self, prompt: str) -> str:
+        """The response for a prompt; override for prompt-dependent answers"""
+        return self.response
+
+    def _admit(self):
+        """Enforce the simulated quota; raises LLMError(429) beyond it"""
+        with self._lock:
+            now = time.monotonic()
+            # Requests accepted within the last second
+            self._accepted = [t for t in self._accepted if now - t < 1.0]
+            if (
+                self.max_concurrent is not None
+                and self._in_flight >= self.max_concurrent
+            ) or (
+                self.requests_per_second is not None
+                and len(self._accepted) >= self.requests_per_second
+            ):
+                self.rejected += 1
+                raise LLMError("Resource has been exhausted (fake quota)", code=429)
+            self._accepted.append(now)
+            self._in_flight += 1
+            self.peak_concurrency = max(self.peak_concurrency, self._in_flight)
+
+    def generate_stream(self, prompt: str, model: str = DEFAULT_MODEL) -> Iterator[str]:
+        self._admit()
+        try:
+            with self._lock:
+                self.prompts.append(prompt)
+            response = self.respond(prompt)
+            time.sleep(self.first_chunk_delay)
+            for start in range(0, len(response), self.chunk_size):
+                if start:
+                    time.sleep(self.chunk_delay)
+                yield response[start : start + self.chunk_size]
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+class TokenBucket:
+    """Lets through rate requests per second on average, burst at once"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, deadline: float) -> None:
+        """Wait for a token; raises DeadlineExceeded if none comes in time"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                raise DeadlineExceeded("Deadline exceeded waiting for the rate limit")
+            time.sleep(wait)
+
+    def drain(self) -> None:
+        """Spend every token: the service said we are going too fast"""
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0)
+
+
+class Scheduler(LLMClient):
+    """
+    Runs every model call of the process through one rate limit, concurrency
+    cap, retry policy and deadline, in front of a backend LLMClient.
+    """
+
+    def __init__(
+        self,
+        backend: LLMClient,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        deadline: float = DEFAULT_DEADLINE,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.backend = backend
+        # Quotas are per minute: a full minute's requests at once stay within
+        # them, and sustained use is held to the rate
+        self.bucket = TokenBucket(
+            requests_per_minute / 60.0, max(1, int(requests_per_minute))
+        )
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.deadline = deadline
+        self.sleep = sleep
+        self.retries = 0
+        self._in_flight: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, deadline: float) -> None:
+        """Wait for the rate limit and a free slot"""
+        self.bucket.acquire(deadline)
+        if not self.slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise DeadlineExceeded("Deadline exceeded waiting for a free slot")
+
+    def _backoff(self, attempt: int, error: BaseException, deadline: float) -> None:
+        """Sleep before retry attempt, or re-raise error when out of retries or time"""
+        if attempt >= self.max_retries or not is_retryable(error):
+            raise error
+        if getattr(error, "code", None) == 429:
+            self.bucket.drain()
+        delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+        if time.monotonic() + delay >= deadline:
+            raise error
+        with self._lock:
+            self.retries += 1
+        self.sleep(delay)
+
+    def _attempt(self, prompt: str, model: str, deadline: float) -> str:
+        """
+        One request, abandoned once the deadline passes. The slot stays
+        taken until the backend really returns, so an abandoned request
+        still counts against the concurrency cap.
+        """
+        result: Future = Future()
+
+        def run():
+            try:
+                result.set_result(self.backend.generate(prompt, model))
+            except BaseException as e:
+                result.set_exception(e)
+            finally:
+                self.slots.release()
+
+        threading.Thread(target=run, daemon=True).start()
+        try:
+            return result.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            if result.done():
+                return result.result()
+            raise DeadlineExceeded("Deadline exceeded waiting for the model")
+
+    def _generate(self, prompt: str, model: str) -> str:
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self._start(deadline)
+            try:
+                return self._attempt(prompt, model, deadline)
+            except Exception as e:
+                self._backoff(attempt, e, deadline)
+            attempt += 1
+
+    def generate(self, prompt: str, model: str = DEFAULT_MODEL) -> str:
+        """Generate a response; a caller asking for a prompt already in flight shares it"""
+        key = (model, prompt)
+        with self._lock:
+            shared = self._in_flight.get(key)
+            if shared is None:
+                self._in_flight[key] = owned = Future()
+        if shared is not None:
+            return shared.result()
+
+        try:
+            response = self._generate(prompt, model)
+        except BaseException as e:
+            owned.set_exception(e)
+            raise
+        else:
+            owned.set_result(response)
+            return response
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def generate_stream(self, prompt: str, model: str = DEFAULT_MODEL) -> Iterator[str]:
+        """
+        Stream a response. A request is retried only until its first chunk:
+        after that the caller has shown part of the answer. The deadline is
+        checked between chunks; the backend's own timeout bounds each wait.
+        """
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self._start(deadline)
+            started = False
+            try:
+                for chunk in self.backend.generate_stream(prompt, model):
+                    started = True
+                    yield chunk
+                    if time.monotonic() > deadline:
+                        raise DeadlineExceeded("Deadline exceeded while streaming")
+                return
+            except Exception as e:
+                if started:
+                    raise
+                error = e
+            finally:
+                self.slots.release()
+            self._backoff(attempt, error, deadline)
+            attempt += 1
+
+
+_client: Optional[LLMClient] = None
+_scheduler: Optional[Scheduler] = None
+_client_lock = threading.Lock()
+
+
+def set_client(client: Optional[LLMClient]) -> None:
+    """Use client for all model calls; None restores the configured backend"""
+    global _client, _scheduler
+    with _client_lock:
+        _client = client
+        _scheduler = None
+
+
+def scheduler_settings() -> dict:
+    """Scheduler limits from `[gemini]` in the config"""
+    from .config import config
+
+    settings = {
+        "requests_per_minute": float(
+            config.get("gemini", "requests_per_minute", DEFAULT_REQUESTS_PER_MINUTE)
+        ),
+        "max_concurrency": int(
+            config.get("gemini", "max_concurrency", DEFAULT_MAX_CONCURRENCY)
+        ),
+        "max_retries": int(config.get("gemini", "max_retries", DEFAULT_MAX_RETRIES)),
+        "deadline": float(config.get("gemini", "deadline", DEFAULT_DEADLINE)),
+    }
+    for key in ("requests_per_minute", "max_concurrency", "deadline"):
+        if settings[key] <= 0:
+            raise SystemExit(f"[gemini] {key} must be positive, got {settings[key]:g}.")
+    if settings["max_retries"] < 0:
+        raise SystemExit(
+            f"[gemini] max_retries must not be negative, got {settings['max_retries']}."
+        )
+    return settings
+
+
+def get_client() -> LLMClient:
+    """
+    Return the shared Scheduler in front of the active backend, creating the
+    Gemini client on first use
+    """
+    global _client, _scheduler
+    with _client_lock:
+        if _scheduler is None:
+            settings = scheduler_settings()
+            if _client is None:
+                from .config import config
+
+                _client = GeminiClient(
+                    api_key=config.get("gemini", "api_key"),
+                    timeout=settings["deadline"],
+                )
+            _scheduler = Scheduler(_client, **settings)
+        return _scheduler
@@ -0,0 +1,35 @@
+"""
+Concurrent fan-out of independent model calls.
+
+Used when one prompt cannot hold everything: each part is summarized on its
+own in a bounded thread pool and the caller reduces the results with a final
+call, so wall-clock time follows the slowest part rather than the total.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from .llm import LLMClient, get_client
+
+MAX_WORKERS = 4
+
+
+def get_max_workers() -> int:
+    """Concurrent model calls, from `[gemini] max_workers`"""
+    from .config import config
+
+    return int(config.get("gemini", "max_workers", MAX_WORKERS))
+
+
+def run_map(
+    prompts: List[str],
+    client: Optional[LLMClient] = None,
+    max_workers: Optional[int] = None,
+) -> List[str]:
+    """Generate a response for every prompt concurrently, in prompt order"""
+    client = client or get_client()
+    if len(prompts) <= 1:
+        return [client.generate(prompt) for prompt in prompts]
+    max_workers = max_workers or get_max_workers()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(prompts))) as pool:
+        return list(pool.map(client.generate, prompts))
@@ -0,0 +1,96 @@
+"""
+Cache of generated commit messages.
+
+Entries are keyed by the staged tree, the commit it will be made on top of,
+the model and the prompt, so re-running `coas commit` on identical staged
+content answers without calling the model. Entries expire after MAX_AGE and
+the least recently used ones are evicted once the cache exceeds MAX_BYTES.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from .store import DB_PATH
+
+CACHE_PATH = os.path.join(os.path.dirname(DB_PATH), "message_cache.db")
+
+MAX_AGE = 7 * 24 * 3600
+MAX_BYTES = 1024 * 1024
+
+
+def cache_key(tree_hash: str, head: str, model: str, prompt: str) -> str:
+    """Key for one (staged tree, parent commit, model, prompt template) combination"""
+    return hashlib.sha256("\0".join((tree_hash, head, model, prompt)).encode()).hexdigest()
+
+
+class MessageCache:
+    """Size- and age-bounded key -> commit message store"""
+
+    def __init__(
+        self, path: str = CACHE_PATH, max_age: float = MAX_AGE, max_bytes: int = MAX_BYTES
+    ):
+        self.path = path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=5.0)
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            key TEXT PRIMARY KEY,
+            message TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+        """)
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached message, or None when missing or expired"""
+        now = time.time()
+        row = self.conn.execute(
+            "SELECT message FROM messages WHERE key = ? AND created >= ?",
+            (key, now - self.max_age),
+        ).fetchone()
+        if row is None:
+            return None
+        with self.conn:
+            self.conn.execute(
+                "UPDATE messages SET last_used = ? WHERE key = ?", (now, key)
+            )
+        return row[0]
+
+    def put(self, key: str, message: str) -> None:
+        """Store a message and evict expired and least recently used entries"""
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?)",
+                (key, message, len(message.encode("utf-8")), now, now),
+            )
+            self.evict(now)
+
+    def evict(self, now: Optional[float] = None) -> None:
+        now = now or time.time()
+        self.conn.execute(
+            "DELETE FROM messages WHERE created < ?", (now - self.max_age,)
+        )
+        # Drop the oldest-used entries beyond the byte budget
+        self.conn.execute(
+            """
+            DELETE FROM messages WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS total
+                    FROM messages
+                )
+                WHERE total > ?
+            )
+            """,
+            (self.max_bytes,),
+        )
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,344 @@
+"""
+Schema migrations for the commits database.
+
+The schema version lives in `PRAGMA user_version`. Each migration upgrades
+the schema by one version inside its own transaction, so existing databases
+are upgraded in place and an interrupted upgrade resumes where it stopped.
+"""
+
+import sqlite3
+from collections import Counter
+
+from .diff_codec import decode_diff, diff_hash, register_functions
+
+# Rows moved per statement batch by migrations that rewrite data
+MIGRATE_BATCH_SIZE = 500
+
+
+def _create_commits(conn):
+    """v1: the original commits table"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS commits (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        author_name TEXT NOT NULL,
+        author_email TEXT NOT NULL,
+        commit_message TEXT NOT NULL,
+        repo_url TEXT NOT NULL,
+        repo_name TEXT NOT NULL,
+        branch_name TEXT NOT NULL,
+        code_diff TEXT,
+        added_lines INTEGER DEFAULT 0,
+        removed_lines INTEGER DEFAULT 0
+    )
+    """)
+
+
+def _add_diff_codec(conn):
+    """v2: code_diff may hold a compressed BLOB, see diff_codec"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(commits)")]
+    if "code_diff_codec" not in columns:
+        conn.execute("ALTER TABLE commits ADD COLUMN code_diff_codec TEXT")
+
+
+def _numeric_timestamp(conn):
+    """v3: store timestamp as REAL unix time instead of TEXT"""
+    conn.execute("""
+    CREATE TABLE commits_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp REAL NOT NULL,
+        author_name TEXT NOT NULL,
+        author_email TEXT NOT NULL,
+        commit_message TEXT NOT NULL,
+        repo_url TEXT NOT NULL,
+        repo_name TEXT NOT NULL,
+        branch_name TEXT NOT NULL,
+        code_diff BLOB,
+        code_diff_codec TEXT,
+        added_lines INTEGER DEFAULT 0,
+        removed_lines INTEGER DEFAULT 0
+    )
+    """)
+    conn.execute("""
+    INSERT INTO commits_new (
+        id, timestamp, author_name, author_email, commit_message, repo_url,
+        repo_name, branch_name, code_diff, code_diff_codec, added_lines, removed_lines
+    )
+    SELECT
+        id, CAST(timestamp AS REAL), author_name, author_email, commit_message, repo_url,
+        repo_name, branch_name, code_diff, code_diff_codec, added_lines, removed_lines
+    FROM commits
+    """)
+    conn.execute("DROP TABLE commits")
+    conn.execute("ALTER TABLE commits_new RENAME TO commits")
+
+
+def _timestamp_indexes(conn):
+    """v4: indexes for the time-range and per-repo queries"""
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_commits_timestamp ON commits (timestamp)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_commits_repo_timestamp "
+        "ON commits (repo_name, timestamp)"
+    )
+
+
+def _commit_token(conn):
+    """v5: per-commit token linking the pre-commit row to its post-commit update"""
+    conn.execute("ALTER TABLE commits ADD COLUMN commit_token TEXT")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_commits_token ON commits (commit_token)"
+    )
+
+
+def _daily_digests(conn):
+    """v6: cached per-day, per-repo summaries for the weekly summary"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS digests (
+        day TEXT NOT NULL,
+        repo_name TEXT NOT NULL,
+        commit_count INTEGER NOT NULL,
+        last_commit_id INTEGER NOT NULL,
+        added_lines INTEGER NOT NULL,
+        digest TEXT NOT NULL,
+        created REAL NOT NULL,
+        PRIMARY KEY (day, repo_name)
+    )
+    """)
+
+
+def _digest_author(conn):
+    """
+    v7: digests are also kept per author filter ("" for all authors), and
+    record the total length of their commit messages, so a digest made
+    before post-commit filled in a message is regenerated
+    """
+    # The table is a cache, so it is rebuilt rather than copied
+    conn.execute("DROP TABLE IF EXISTS digests")
+    conn.execute("""
+    CREATE TABLE digests (
+        day TEXT NOT NULL,
+        repo_name TEXT NOT NULL,
+        author TEXT NOT NULL DEFAULT '',
+        commit_count INTEGER NOT NULL,
+        last_commit_id INTEGER NOT NULL,
+        message_chars INTEGER NOT NULL,
+        added_lines INTEGER NOT NULL,
+        digest TEXT NOT NULL,
+        created REAL NOT NULL,
+        PRIMARY KEY (day, repo_name, author)
+    )
+    """)
+
+
+def _full_text_search(conn):
+    """
+    v8: FTS5 index over commit messages and decoded diffs.
+    The index has external content: it stores only the terms and reads the
+    text back through the commits_text view, so diffs stay compressed on disk.
+    CommitStore writes the index along with every change to commits. There
+    are no triggers: they would decode diffs with coas_decode_diff, which
+    only coas registers, and fail every other client writing to commits.
+    """
+    conn.execute("""
+    CREATE VIEW IF NOT EXISTS commits_text AS
+    SELECT id, commit_message, coas_decode_diff(code_diff, code_diff_codec) AS code_diff
+    FROM commits
+    """)
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS commits_fts USING fts5 (
+        commit_message, code_diff, content = 'commits_text', content_rowid = 'id'
+    )
+    """)
+    conn.execute("INSERT INTO commits_fts (commits_fts) VALUES ('rebuild')")
+
+
+def _import_state(conn):
+    """v9: last commit imported by `coas import` per repository"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS imports (
+        repo_path TEXT PRIMARY KEY,
+        repo_name TEXT NOT NULL,
+        last_sha TEXT NOT NULL,
+        commit_count INTEGER NOT NULL,
+        updated REAL NOT NULL
+    )
+    """)
+
+
+def _similarity_index(conn):
+    """
+    v10: MinHash signatures of diffs for finding similar past commits, see
+    similar.py. commit_minhashes is the inverted index of the signatures.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS commit_signatures (
+        commit_id INTEGER PRIMARY KEY,
+        signature BLOB NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS commit_minhashes (
+        repo_name TEXT NOT NULL,
+        hash INTEGER NOT NULL,
+        commit_id INTEGER NOT NULL,
+        PRIMARY KEY (repo_name, hash, commit_id)
+    ) WITHOUT ROWID
+    """)
+
+
+def _diff_blobs(conn):
+    """
+    v11: content-addressed diffs. Each distinct diff is stored once in
+    diff_blobs, keyed by diff_hash() of its text, and commits refer to it
+    by commits.diff_hash, so amends, rebases and cherry-picks of the same
+    change add no diff. Triggers count the references of each blob; blobs
+    nobody refers to any more are deleted by the writer that released them
+    (see CommitStore.delete_unreferenced_diffs), once it has taken their
+    text out of the full-text index.
+
+    commits.code_diff and code_diff_codec are left empty rather than
+    dropped, which SQLite before 3.35 cannot do.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS diff_blobs (
+        hash TEXT PRIMARY KEY,
+        code_diff BLOB NOT NULL,
+        code_diff_codec TEXT,
+        refcount INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_diff_blobs_unreferenced
+    ON diff_blobs (hash) WHERE refcount = 0
+    """)
+    conn.execute("ALTER TABLE commits ADD COLUMN diff_hash TEXT")
+
+    # The text of every commit stays the same, so the full-text index stays
+    # valid; only the view reading it changes
+    conn.execute("DROP VIEW IF EXISTS commits_text")
+
+    refcounts = Counter()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            """
+            SELECT id, code_diff, code_diff_codec FROM commits
+            WHERE id > ? AND code_diff IS NOT NULL
+            ORDER BY id
+            LIMIT ?
+            """,
+            (last_id, MIGRATE_BATCH_SIZE),
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        blobs, refs = [], []
+        for commit_id, code_diff, codec in rows:
+            key = diff_hash(decode_diff(code_diff, codec))
+            refcounts[key] += 1
+            blobs.append((key, code_diff, codec))
+            refs.append((key, commit_id))
+        conn.executemany(
+            "INSERT OR IGNORE INTO diff_blobs (hash, code_diff, code_diff_codec) "
+            "VALUES (?, ?, ?)",
+            blobs,
+        )
+        conn.executemany(
+            "UPDATE commits SET diff_hash = ?, code_diff = NULL, code_diff_codec = NULL "
+            "WHERE id = ?",
+            refs,
+        )
+    conn.executemany(
+        "UPDATE diff_blobs SET refcount = ? WHERE hash = ?",
+        [(count, key) for key, count in refcounts.items()],
+    )
+
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS diff_blobs_ref_insert
+    AFTER INSERT ON commits WHEN new.diff_hash IS NOT NULL BEGIN
+        UPDATE diff_blobs SET refcount = refcount + 1 WHERE hash = new.diff_hash;
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS diff_blobs_ref_delete
+    AFTER DELETE ON commits WHEN old.diff_hash IS NOT NULL BEGIN
+        UPDATE diff_blobs SET refcount = refcount - 1 WHERE hash = old.diff_hash;
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS diff_blobs_ref_update
+    AFTER UPDATE OF diff_hash ON commits
+    WHEN old.diff_hash IS NOT new.diff_hash BEGIN
+        UPDATE diff_blobs SET refcount = refcount - 1 WHERE hash = old.diff_hash;
+        UPDATE diff_blobs SET refcount = refcount + 1 WHERE hash = new.diff_hash;
+    END
+    """)
+
+    conn.execute("""
+    CREATE VIEW IF NOT EXISTS commits_text AS
+    SELECT
+        commits.id, commits.commit_message,
+        coas_decode_diff(diff_blobs.code_diff, diff_blobs.code_diff_codec) AS code_diff
+    FROM commits LEFT JOIN diff_blobs ON diff_blobs.hash = commits.diff_hash
+    """)
+
+
+# Append only: the position of a migration is the version it upgrades to
+MIGRATIONS = [
+    _create_commits,
+    _add_diff_codec,
+    _numeric_timestamp,
+    _timestamp_indexes,
+    _commit_token,
+    _daily_digests,
+    _digest_author,
+    _full_text_search,
+    _import_state,
+    _similarity_index,
+    _diff_blobs,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Bring the database up to SCHEMA_VERSION.
+    Returns the version the database was at before migrating.
+    """
+    # Migrations that rebuild the full-text index read the commits_text view
+    register_functions(conn)
+    start_version = get_version(conn)
+    if start_version == SCHEMA_VERSION:
+        return start_version
+    if start_version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema v{start_version} is newer than this version of "
+            f"commit-assistant supports (v{SCHEMA_VERSION}). Please upgrade."
+        )
+
+    while True:
+        if conn.in_transaction:
+            conn.commit()
+        # IMMEDIATE takes the write lock before re-reading the version, so two
+        # hooks starting at once do not both run the same migration
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = get_version(conn)
+            if version >= SCHEMA_VERSION:
+                conn.rollback()
+                break
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+    return start_version
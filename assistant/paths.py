@@ -0,0 +1,15 @@
+"""
+Locations of the database and the hook spool.
+
+Kept free of imports beyond os, so the hooks can name these files without
+loading sqlite3 and the store.
+"""
+
+import os
+
+# Set fixed path in user's home directory
+DB_PATH = os.path.join(
+    os.path.expanduser("~"), ".config", "commit-assistant", "commits.db"
+)
+
+SPOOL_PATH = os.path.join(os.path.dirname(DB_PATH), "spool.jsonl")
@@ -1,14 +1,13 @@
 import os
-import sqlite3
-import subprocess
-from .setup_db import DB_PATH
+from .repo_info import commit_token_path, find_git_dir, get_repo_info
+from .paths import DB_PATH
+from .spool import spool_enabled, spool_message, start_background_flush
+from .trace import set_repo, span, tracing
 
 
 def get_commit_info():
     # Get the absolute path of the git directory and commit message file
-    git_dir = subprocess.check_output(
-        ["git", "rev-parse", "--absolute-git-dir"], universal_newlines=True
-    ).strip()
+    git_dir, _, _ = find_git_dir()
     commit_msg_file = os.path.join(git_dir, "COMMIT_EDITMSG")
 
     if not os.path.exists(commit_msg_file):
@@ -21,25 +20,32 @@ def get_commit_info():
     return commit_message
 
 
-def insert_commit_message(commit_message):
+def read_commit_token():
     """
-    Update the latest record in the commits table with the commit message.
+    Take the token left by pre-commit for this commit, removing the file.
+    Returns None when pre-commit did not run (e.g. `git commit --no-verify`).
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    token_path = commit_token_path()
+    try:
+        with open(token_path, "r") as f:
+            token = f.read().strip()
+    except FileNotFoundError:
+        return None
+    os.remove(token_path)
+    return token or None
 
-    # Update the most recent record (highest ID) with the commit message
-    cursor.execute(
-        """
-        UPDATE commits 
-        SET commit_message = ?
-        WHERE id = (SELECT MAX(id) FROM commits)
-        """,
-        (commit_message,),
-    )
 
-    conn.commit()
-    conn.close()
+def insert_commit_message(commit_message, commit_token, db_path=DB_PATH):
+    """
+    Update the record saved by pre-commit for this commit with the commit message.
+    Returns whether a record was updated.
+    """
+    # Imported here: in spool mode the hook never touches the database
+    from .store import open_store
+
+    # The token ties this update to the row of the same commit, even when
+    # other repositories are committing at the same moment
+    return open_store(db_path).update_messages([(commit_message, commit_token)]) > 0
 
 
 def save_commit_message():
@@ -47,8 +53,29 @@ def save_commit_message():
         print(f"Error: Database not found at {DB_PATH}. Please initialize it first.")
         exit(1)
 
+    commit_token = read_commit_token()
+    if not commit_token:
+        print("No pre-commit record for this commit. Skipping.")
+        return
+
+    if tracing():
+        # Cached by pre-commit moments ago, so this spawns no git process
+        set_repo(get_repo_info().repo_name)
+
     # Get commit information
-    commit_message = get_commit_info()
+    with span("message"):
+        commit_message = get_commit_info()
 
-    insert_commit_message(commit_message)
-    print(f"Commit {commit_message} saved to database at {DB_PATH}")
+    if spool_enabled():
+        # Leave the database write to the flusher
+        with span("spool"):
+            spool_size = spool_message(commit_message, commit_token)
+        start_background_flush(spool_size)
+        print(f"Commit {commit_message} spooled.")
+        return
+    with span("db_write"):
+        updated = insert_commit_message(commit_message, commit_token)
+    if updated:
+        print(f"Commit {commit_message} saved to database at {DB_PATH}")
+    else:
+        print("Pre-commit record for this commit not found. Skipping.")
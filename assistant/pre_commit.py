@@ -1,89 +1,101 @@
 #!/usr/bin/env python3
 
 import os
-import sqlite3
 import subprocess
+import uuid
 from datetime import datetime
-from .setup_db import DB_PATH
+from .repo_info import commit_token_path, get_repo_info
+from .paths import DB_PATH
+from .spool import spool_commit, spool_enabled
+from .trace import set_repo, span
+
+# Budget for the diff stored with each commit
+MAX_DIFF_LINES = 1000
+MAX_DIFF_BYTES = 256 * 1024
+MAX_LINE_BYTES = 4096
 
 
 def get_commit_info():
     """
-    Get commit message, author name, email, and repository information from the current commit being made.
+    Get author name, email, and repository information from the current commit being made.
+    Identity, remote and branch are collected in one batch, see repo_info.get_repo_info.
     """
-
-    # Get the author information from git config
-    author_name = subprocess.check_output(
-        ["git", "config", "user.name"], universal_newlines=True
-    ).strip()
-    author_email = subprocess.check_output(
-        ["git", "config", "user.email"], universal_newlines=True
-    ).strip()
-
-    # Get repository information
-    repo_url = subprocess.check_output(
-        ["git", "config", "--get", "remote.origin.url"], universal_newlines=True
-    ).strip()
-
-    # Extract org/username and repo name from URL
-    if ":" in repo_url:  # SSH format: git@github.com:org/repo.git
-        path_part = repo_url.split(":")[-1]
-    else:  # HTTPS format: https://github.com/org/repo.git
-        path_part = repo_url.split("//")[-1].split("/", 1)[-1]
-
-    # Remove .git and split into org/repo
-    path_parts = path_part.replace(".git", "").split("/")
-    if len(path_parts) >= 2:
-        org_or_user = path_parts[-2]
-        repo_name = f"{org_or_user}/{path_parts[-1]}"
-    else:
-        repo_name = path_parts[-1]
-
-    try:
-        current_branch = subprocess.check_output(
-            ["git", "rev-parse", "--abbrev-ref", "HEAD"], universal_newlines=True
-        ).strip()
-    except subprocess.CalledProcessError:
-        print("Warning: Could not detect current branch, defaulting to 'main'")
-        current_branch = "main"
-
+    info = get_repo_info()
     timestamp = datetime.now().timestamp()
 
     return (
-        author_name,
-        author_email,
+        info.author_name,
+        info.author_email,
         timestamp,
-        repo_url,
-        repo_name,
-        current_branch,
+        info.repo_url,
+        info.repo_name,
+        info.branch,
     )
 
 
-def get_code_diff():
+def _parse_numstat(stream):
     """
-    Get the code diff of the committed changes, limited to 1000 lines.
-    Returns tuple of (diff_content, total_lines, added_lines, removed_lines)
+    Sum the "<added>\t<removed>\t<path>" header that `--numstat --patch` prints
+    before the patch. Binary files report "-" and are skipped.
     """
-    diff = subprocess.check_output(
-        ["git", "diff", "--cached"], universal_newlines=True
-    ).strip()
-
-    # Calculate added and removed lines
     added_lines = 0
     removed_lines = 0
-    for line in diff.splitlines():
-        if line.startswith("+") and not line.startswith("+++"):
-            added_lines += 1
-        elif line.startswith("-") and not line.startswith("---"):
-            removed_lines += 1
+    for raw in iter(stream.readline, b""):
+        if raw == b"\n":  # blank line separates the stats from the patch
+            break
+        added, removed, _ = raw.split(b"\t", 2)
+        if added != b"-":
+            added_lines += int(added)
+            removed_lines += int(removed)
+    return added_lines, removed_lines
 
-    # Split into lines and limit to 1000 lines
-    diff_lines = diff.splitlines()[:1000]
 
-    if len(diff_lines) == 1000:
-        diff_lines.append("\n... (diff truncated at 1000 lines)")
-
-    return ("\n".join(diff_lines), added_lines, removed_lines)
+def get_code_diff(max_lines=MAX_DIFF_LINES, max_bytes=MAX_DIFF_BYTES):
+    """
+    Get the code diff of the committed changes, limited to max_lines lines and max_bytes.
+    The diff is streamed from git and reading stops once the budget is spent, so
+    memory stays flat however large the staged change is. Line counts come from
+    --numstat and are exact even when the stored diff is truncated.
+    Returns tuple of (diff_content, added_lines, removed_lines)
+    """
+    process = subprocess.Popen(
+        ["git", "diff", "--cached", "--no-color", "--no-ext-diff", "--numstat", "--patch"],
+        stdout=subprocess.PIPE,
+    )
+    diff_lines = []
+    diff_bytes = 0
+    truncated = False
+    try:
+        added_lines, removed_lines = _parse_numstat(process.stdout)
+
+        while True:
+            raw = process.stdout.readline(MAX_LINE_BYTES)
+            if not raw:
+                break
+            if len(diff_lines) >= max_lines or diff_bytes + len(raw) > max_bytes:
+                truncated = True
+                break
+            if not raw.endswith(b"\n"):
+                # Overlong line (minified or generated file): keep only its head
+                while True:
+                    rest = process.stdout.readline(MAX_LINE_BYTES)
+                    if not rest or rest.endswith(b"\n"):
+                        break
+            diff_bytes += len(raw)
+            diff_lines.append(raw.decode("utf-8", errors="replace").rstrip("\n"))
+    finally:
+        if truncated:
+            process.kill()
+        process.stdout.close()
+        returncode = process.wait()
+
+    if not truncated and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, process.args)
+
+    if truncated:
+        diff_lines.append(f"\n... (diff truncated at {len(diff_lines)} lines)")
+
+    return ("\n".join(diff_lines).strip(), added_lines, removed_lines)
 
 
 def save_to_database(
@@ -97,39 +109,36 @@ def save_to_database(
     code_diff=None,
     added_lines=0,
     removed_lines=0,
+    commit_token=None,
+    db_path=DB_PATH,
 ):
     """
     Save the commit information and code diff to the SQLite database.
+    The diff is stored compressed, once per distinct text, see
+    CommitStore.insert_commits.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    # Imported here: in spool mode the hook never touches the database
+    from .store import open_store
 
     # Insert the commit information
-    cursor.execute(
-        """
-                INSERT INTO commits (
-                    timestamp, author_name, author_email, commit_message, 
-                    repo_url, repo_name, branch_name, code_diff, added_lines, removed_lines
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-        (
-            timestamp,
-            author_name,
-            author_email,
-            commit_message,
-            repo_url,
-            repo_name,
-            current_branch,
-            code_diff,
-            added_lines,
-            removed_lines,
-        ),
+    open_store(db_path).insert_commits(
+        [
+            (
+                timestamp,
+                author_name,
+                author_email,
+                commit_message,
+                repo_url,
+                repo_name,
+                current_branch,
+                code_diff,
+                added_lines,
+                removed_lines,
+                commit_token,
+            )
+        ]
     )
 
-    conn.commit()
-    conn.close()
-
 
 def save_commit_diff():
     if not os.path.exists(DB_PATH):
@@ -139,30 +148,60 @@ def save_commit_diff():
     # If the commit message is not 'initial commit', capture the code diff
     code_diff = None
     # Get commit information
-    (
-        author_name,
-        author_email,
-        timestamp,
-        repo_url,
-        repo_name,
-        current_branch,
-    ) = get_commit_info()
+    with span("repo_info"):
+        (
+            author_name,
+            author_email,
+            timestamp,
+            repo_url,
+            repo_name,
+            current_branch,
+        ) = get_commit_info()
+    set_repo(repo_name)
 
-    (code_diff, added_lines, removed_lines) = get_code_diff()
+    with span("diff"):
+        (code_diff, added_lines, removed_lines) = get_code_diff()
     print("Code diff captured.")
 
-    # Save commit info and code diff to the database
-    save_to_database(
-        "",
-        author_name,
-        author_email,
-        timestamp,
-        repo_url,
-        repo_name,
-        current_branch,
-        code_diff,
-        added_lines,
-        removed_lines,
-    )
-
-    print(f"Commit saved to database at {DB_PATH}")
+    # Links this row to the post-commit update of the same commit
+    commit_token = uuid.uuid4().hex
+
+    spooled = spool_enabled()
+    if spooled:
+        # Leave the database write to the flusher
+        with span("spool"):
+            spool_commit(
+                author_name,
+                author_email,
+                timestamp,
+                repo_url,
+                repo_name,
+                current_branch,
+                code_diff,
+                added_lines,
+                removed_lines,
+                commit_token,
+            )
+    else:
+        # Save commit info and code diff to the database
+        with span("db_write"):
+            save_to_database(
+                "",
+                author_name,
+                author_email,
+                timestamp,
+                repo_url,
+                repo_name,
+                current_branch,
+                code_diff,
+                added_lines,
+                removed_lines,
+                commit_token,
+            )
+    with open(commit_token_path(), "w") as f:
+        f.write(commit_token)
+
+    if spooled:
+        print("Commit spooled.")
+    else:
+        print(f"Commit saved to database at {DB_PATH}")
@@ -1,8 +1,21 @@
 #!/usr/bin/env python3
 
-from google import genai
 import subprocess
+import sys
+import time
 from .config import config
+from .diff_compact import (
+    DEFAULT_TOKEN_BUDGET,
+    chunk_diff,
+    compact_diff,
+    split_files,
+    stat_header,
+)
+from .llm import DEFAULT_MODEL, get_client
+from .map_reduce import run_map
+from .message_cache import MessageCache, cache_key
+from .similar import few_shot_examples
+from .trace import span
 
 
 def get_code_diff():
@@ -21,61 +34,235 @@ def get_code_diff():
         return None
 
 
-def generate_commit_message(diff):
+def get_staged_tree():
     """
-    Generate a commit message using Gemini AI based on the code diff.
+    Identify the commit about to be made.
+    Returns tuple of (tree_hash, head), head is "" before the first commit,
+    or None when the index has no tree yet, e.g. with unresolved conflicts
     """
-    if not diff:
+    try:
+        tree_hash = subprocess.check_output(
+            ["git", "write-tree"], stderr=subprocess.DEVNULL, universal_newlines=True
+        )
+    except subprocess.CalledProcessError:
         return None
+    try:
+        head = subprocess.check_output(
+            ["git", "rev-parse", "--verify", "--quiet", "HEAD"],
+            universal_newlines=True,
+        )
+    except subprocess.CalledProcessError:
+        head = ""
+    return tree_hash.strip(), head.strip()
 
-    # Create Gemini model instance
-    api_key = config.get("gemini", "api_key")
-    client = genai.Client(api_key=api_key)
 
-    prompt = f"""
-    As a Git commit message generator, analyze the following code changes and create a clear, 
-    concise commit message following these rules:
-    1. Start with a type prefix (feat, fix, docs, style, refactor, test, chore)
+def get_token_budget():
+    """Token budget for the diff in the prompt, from `[gemini] diff_token_budget`"""
+    return int(config.get("gemini", "diff_token_budget", DEFAULT_TOKEN_BUDGET))
+
+
+def message_cache_key(token_budget):
+    """
+    Cache key of the staged content for the current model and prompt, None
+    when the staged content has no tree to key it by
+    """
+    staged = get_staged_tree()
+    if staged is None:
+        return None
+    tree_hash, head = staged
+    prompt = f"{build_prompt('{diff}')}\0{token_budget}"
+    return cache_key(tree_hash, head, DEFAULT_MODEL, prompt)
+
+
+COMMIT_RULES = """1. Start with a type prefix (feat, fix, docs, style, refactor, test, chore)
     2. Keep the first line under 50 characters
     3. Use the imperative mood ("add" not "added")
     4. Focus on the "what" and "why", not the "how"
-    5. Return as plain text
+    5. Return as plain text"""
+
+
+def format_examples(examples):
+    """Past commit messages for similar changes, for the prompt to imitate"""
+    if not examples:
+        return ""
+    quoted = "\n\n".join(f"<message>\n{message}\n</message>" for message in examples)
+    return f"""
+
+    Messages written in this repository for similar changes; match their style,
+    conventions and level of detail, but describe only the changes below:
+
+{quoted}"""
+
+
+def build_prompt(diff, examples=()):
+    return f"""
+    As a Git commit message generator, analyze the following code changes and create a clear, 
+    concise commit message following these rules:
+    {COMMIT_RULES}{format_examples(examples)}
 
     Here are the code changes:
 
     {diff}
     """
 
+
+def build_chunk_prompt(chunk):
+    return f"""
+    The following code changes are one part of a larger commit. Summarize what
+    changed and why in a few short bullet points, naming the files or areas involved:
+
+    {chunk}
+    """
+
+
+def build_reduce_prompt(summaries, header, examples=()):
+    parts = "\n\n".join(
+        f"Part {i}:\n{summary.strip()}" for i, summary in enumerate(summaries, 1)
+    )
+    return f"""
+    As a Git commit message generator, write one clear, concise commit message for a
+    large commit from the summaries of its parts below, following these rules:
+    {COMMIT_RULES}{format_examples(examples)}
+
+    {header}
+
+    Summaries of the changes:
+
+    {parts}
+    """
+
+
+def build_commit_prompt(diff, token_budget, max_workers=None, examples=()):
+    """
+    Build the prompt for the staged diff. A diff that fits the budget after
+    compaction is sent as is; a larger one is split into chunks that are
+    summarized concurrently, and the prompt asks to combine the summaries.
+    examples are past messages to imitate, see similar.py.
+    """
+    compacted, report = compact_diff(diff, token_budget)
+    if not report.truncated_files:
+        if report.changed:
+            print(report.summary())
+        return build_prompt(compacted, examples)
+
+    chunks = chunk_diff(diff, token_budget)
+    print(f"Large commit: summarizing {len(chunks)} parts in parallel...")
+    summaries = run_map(
+        [build_chunk_prompt(chunk) for chunk in chunks], max_workers=max_workers
+    )
+    return build_reduce_prompt(summaries, stat_header(split_files(diff)), examples)
+
+
+def generate_response(prompt):
+    """Generate the whole response for a prompt, None on error"""
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-exp", contents=prompt
-        )
-        return response.text
+        return get_client().generate(prompt)
     except Exception as e:
         print(f"Error generating commit message: {str(e)}")
         return None
 
 
-def prepare_commit_msg():
+def stream_response(prompt, out=None):
+    """
+    Generate a response and write each chunk to out as it arrives.
+    Returns tuple of (response, time_to_first_token, total_latency) in seconds
+    """
+    out = out or sys.stdout
+
+    chunks = []
+    time_to_first_token = None
+    start = time.perf_counter()
+    try:
+        for chunk in get_client().generate_stream(prompt):
+            if time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - start
+            chunks.append(chunk)
+            out.write(chunk)
+            out.flush()
+    except Exception as e:
+        print(f"\nError generating commit message: {str(e)}")
+        return None, time_to_first_token, time.perf_counter() - start
+
+    total_latency = time.perf_counter() - start
+    if not chunks:
+        return None, time_to_first_token, total_latency
+    if not chunks[-1].endswith("\n"):
+        out.write("\n")
+    return "".join(chunks), time_to_first_token, total_latency
+
+
+def generate_commit_message(diff):
+    """
+    Generate a commit message using Gemini AI based on the code diff.
+    """
+    if not diff:
+        return None
+    return generate_response(build_prompt(diff))
+
+
+def prepare_commit_msg(stream=True, use_cache=True):
     """
     Main function to generate and apply commit message.
+    With stream, the message is printed while it is being generated.
+    Messages are cached by staged content; use_cache=False regenerates.
     """
     # Get the code diff
-    diff = get_code_diff()
+    with span("diff"):
+        diff = get_code_diff()
     if not diff:
         print("No staged changes found. Please stage your changes first.")
         return
 
-    # Generate commit message
-    commit_message = generate_commit_message(diff)
-    if not commit_message:
-        print("Failed to generate commit message.")
-        return
+    token_budget = get_token_budget()
+    cache = MessageCache()
+    with span("cache"):
+        key = message_cache_key(token_budget)
+        commit_message = cache.get(key) if use_cache and key else None
+    cached = commit_message is not None
+
+    if not cached:
+        # Past messages for similar changes keep the style consistent
+        try:
+            with span("examples"):
+                examples = few_shot_examples(diff)
+        except Exception as e:
+            print(f"Not using past commits as examples: {str(e)}")
+            examples = []
+
+        # Keep the prompt, and so the latency, bounded on large commits
+        try:
+            with span("prompt"):
+                prompt = build_commit_prompt(diff, token_budget, examples=examples)
+        except Exception as e:
+            print(f"Error summarizing changes: {str(e)}")
+            cache.close()
+            return
 
     print("\nGenerated commit message:")
     print("------------------------")
-    print(commit_message)
+    if cached:
+        print(commit_message)
+    elif stream:
+        with span("generate"):
+            commit_message, first_token, total = stream_response(prompt)
+    else:
+        with span("generate"):
+            commit_message = generate_response(prompt)
+        if commit_message:
+            print(commit_message)
+    if not commit_message:
+        print("Failed to generate commit message.")
+        cache.close()
+        return
     print("------------------------")
+    if cached:
+        print("(cached, run with --no-cache to regenerate)")
+    else:
+        if key:
+            cache.put(key, commit_message)
+        if stream:
+            print(f"(first token {first_token:.2f}s, total {total:.2f}s)")
+    cache.close()
     # Ask for confirmation
     try:
         while True:
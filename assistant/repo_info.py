@@ -0,0 +1,227 @@
+"""
+Repository metadata (identity, remote, branch) for the commit hooks.
+
+The branch is read straight from HEAD and the identity and remote come from a
+single `git config` call, whose parsed result is cached per repository until
+one of the config files git reads changes.
+"""
+
+import json
+import os
+import subprocess
+from typing import NamedTuple, Optional, Tuple
+
+CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".config", "commit-assistant", "repo_cache.json"
+)
+
+# Written to the git dir by pre-commit and consumed by post-commit
+COMMIT_TOKEN_FILE = "COAS_COMMIT_TOKEN"
+
+CONFIG_KEYS = ("user.name", "user.email", "remote.origin.url")
+
+# Environment variables that inject config without touching any file, which
+# would make a cached entry stale without any mtime changing.
+CONFIG_ENV_OVERRIDES = ("GIT_CONFIG_PARAMETERS", "GIT_CONFIG_COUNT", "GIT_CONFIG")
+
+
+class RepoInfo(NamedTuple):
+    author_name: str
+    author_email: str
+    repo_url: str
+    repo_name: str
+    branch: str
+
+
+def _read_text(path: str) -> str:
+    with open(path, "r") as f:
+        return f.read().strip()
+
+
+def find_git_dir(start: Optional[str] = None) -> Tuple[str, str, str]:
+    """
+    Locate the repository without spawning git.
+    Returns tuple of (git_dir, common_dir, work_tree)
+    """
+    start = os.path.abspath(start or os.getcwd())
+    git_dir = os.environ.get("GIT_DIR")
+    work_tree = start
+
+    if git_dir:
+        git_dir = os.path.join(start, git_dir)
+    else:
+        current = start
+        while True:
+            candidate = os.path.join(current, ".git")
+            if os.path.isdir(candidate):
+                git_dir = candidate
+                break
+            if os.path.isfile(candidate):
+                # Worktrees and submodules: ".git" is a "gitdir: <path>" file
+                content = _read_text(candidate)
+                if content.startswith("gitdir:"):
+                    git_dir = os.path.join(current, content[len("gitdir:") :].strip())
+                    break
+            parent = os.path.dirname(current)
+            if parent == current:
+                raise RuntimeError(f"Not a git repository: {start}")
+            current = parent
+        work_tree = current
+
+    git_dir = os.path.normpath(git_dir)
+    common_dir = git_dir
+    commondir_file = os.path.join(git_dir, "commondir")
+    if os.path.isfile(commondir_file):
+        common_dir = os.path.normpath(
+            os.path.join(git_dir, _read_text(commondir_file))
+        )
+    return git_dir, common_dir, work_tree
+
+
+def read_branch(git_dir: str) -> str:
+    """Read the current branch from HEAD, "HEAD" when detached"""
+    head = _read_text(os.path.join(git_dir, "HEAD"))
+    if head.startswith("ref:"):
+        ref = head[len("ref:") :].strip()
+        if ref.startswith("refs/heads/"):
+            return ref[len("refs/heads/") :]
+        return ref
+    return "HEAD"
+
+
+def commit_token_path(start: Optional[str] = None) -> str:
+    """Path of the file that hands the commit token from pre- to post-commit"""
+    git_dir, _, _ = find_git_dir(start)
+    return os.path.join(git_dir, COMMIT_TOKEN_FILE)
+
+
+def parse_repo_name(repo_url: str) -> str:
+    """Extract "org/repo" from an SSH or HTTPS remote URL"""
+    if ":" in repo_url and "//" not in repo_url:  # SSH: git@github.com:org/repo.git
+        path_part = repo_url.split(":")[-1]
+    else:  # HTTPS: https://github.com/org/repo.git
+        path_part = repo_url.split("//")[-1].split("/", 1)[-1]
+
+    path_part = path_part.rstrip("/")
+    if path_part.endswith(".git"):
+        path_part = path_part[: -len(".git")]
+    path_parts = path_part.split("/")
+    if len(path_parts) >= 2:
+        return f"{path_parts[-2]}/{path_parts[-1]}"
+    return path_parts[-1]
+
+
+def config_files(common_dir: str) -> list:
+    """Config files git consults for this repository, in any order"""
+    xdg_home = os.environ.get("XDG_CONFIG_HOME") or os.path.join(
+        os.path.expanduser("~"), ".config"
+    )
+    return [
+        os.path.join(common_dir, "config"),
+        os.path.join(common_dir, "config.worktree"),
+        os.environ.get("GIT_CONFIG_GLOBAL") or os.path.expanduser("~/.gitconfig"),
+        os.path.join(xdg_home, "git", "config"),
+        os.environ.get("GIT_CONFIG_SYSTEM") or "/etc/gitconfig",
+    ]
+
+
+def config_fingerprint(common_dir: str) -> list:
+    """mtimes of every config file (None when missing), used to invalidate the cache"""
+    fingerprint = []
+    for path in config_files(common_dir):
+        try:
+            fingerprint.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            fingerprint.append(None)
+    return fingerprint
+
+
+def read_git_config(cwd: Optional[str] = None) -> dict:
+    """Read identity and remote with one `git config` call"""
+    pattern = "^(" + "|".join(key.replace(".", r"\.") for key in CONFIG_KEYS) + ")$"
+    result = subprocess.run(
+        ["git", "config", "-z", "--get-regexp", pattern],
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    # Exit code 1 only means none of the keys are set
+    if result.returncode not in (0, 1):
+        raise subprocess.CalledProcessError(result.returncode, result.args)
+
+    values = {}
+    for entry in result.stdout.split("\0"):
+        if entry:
+            key, _, value = entry.partition("\n")
+            values[key] = value  # last one wins, like `git config --get`
+    return values
+
+
+def _load_cache(cache_path: str) -> dict:
+    try:
+        with open(cache_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache_path: str, cache: dict) -> None:
+    """
+    Write the cache atomically, dropping entries of repositories that no longer
+    exist; a missing config directory just skips caching
+    """
+    if not os.path.isdir(os.path.dirname(cache_path)):
+        return
+    cache = {
+        common_dir: entry
+        for common_dir, entry in cache.items()
+        if os.path.isdir(common_dir)
+    }
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+def get_repo_info(
+    cwd: Optional[str] = None, cache_path: Optional[str] = None
+) -> RepoInfo:
+    """
+    Collect author, remote and branch for the repository containing cwd.
+    Spawns at most one git process, none when the cached entry is still fresh.
+    """
+    cache_path = cache_path or CACHE_PATH
+    git_dir, common_dir, work_tree = find_git_dir(cwd)
+    branch = read_branch(git_dir)
+
+    fingerprint = config_fingerprint(common_dir)
+    cacheable = not any(os.environ.get(name) for name in CONFIG_ENV_OVERRIDES)
+    cache = _load_cache(cache_path) if cacheable else {}
+    entry = cache.get(common_dir)
+
+    if not entry or entry.get("fingerprint") != fingerprint:
+        values = read_git_config(cwd)
+        repo_url = values.get("remote.origin.url", "")
+        entry = {
+            "fingerprint": fingerprint,
+            "author_name": values.get("user.name", ""),
+            "author_email": values.get("user.email", ""),
+            "repo_url": repo_url,
+            "repo_name": (
+                parse_repo_name(repo_url) if repo_url else os.path.basename(work_tree)
+            ),
+        }
+        if cacheable:
+            cache[common_dir] = entry
+            _save_cache(cache_path, cache)
+
+    return RepoInfo(
+        entry["author_name"],
+        entry["author_email"],
+        entry["repo_url"],
+        entry["repo_name"],
+        branch,
+    )
@@ -0,0 +1,128 @@
+"""
+Full-text search over stored commits.
+
+Messages and diffs are indexed by the commits_fts FTS5 table (see the v8
+migration), which CommitStore keeps up to date as it writes commits.
+Changes made by other SQLite clients are not indexed; `coas search
+--reindex` rebuilds the index from the commits.
+
+Queries use FTS5 syntax: words, "exact phrases", AND / OR / NOT, prefix*
+and NEAR(). Input that is not valid FTS5 syntax is searched as plain words
+instead.
+"""
+
+import sqlite3
+from typing import List, NamedTuple
+
+from .analyze import build_filters, parse_date
+from .spool import flush
+from .store import open_store
+
+DEFAULT_LIMIT = 20
+SNIPPET_TOKENS = 16
+
+# Marks around matched terms in snippets, replaced when displayed
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+# bm25 weights of (commit_message, code_diff): a hit in the message says
+# more about a commit than one somewhere in its diff
+RANK = "bm25(commits_fts, 4.0, 1.0)"
+
+
+class SearchHit(NamedTuple):
+    id: int
+    timestamp: float
+    repo_name: str
+    author_name: str
+    message: str  # snippet of the commit message
+    diff: str  # snippet of the diff, "" when only the message matched
+
+
+def quote_terms(query: str) -> str:
+    """Turn free text into an FTS5 query matching all of its words"""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+def search_commits(
+    store,
+    query,
+    start_timestamp=None,
+    end_timestamp=None,
+    repos=None,
+    author=None,
+    limit=DEFAULT_LIMIT,
+) -> List[SearchHit]:
+    """Best matching commits first"""
+    where, params = build_filters(start_timestamp, end_timestamp, repos, author)
+    try:
+        return _search(store, query, where, params, limit)
+    except sqlite3.OperationalError as e:
+        if "fts5" not in str(e) and "syntax error" not in str(e):
+            raise
+        return _search(store, quote_terms(query), where, params, limit)
+
+
+def _search(store, query, where, params, limit):
+    # Rank and filter first, so that only the rows shown get their diff
+    # decompressed for the snippets
+    ids = [
+        row[0]
+        for row in store.query(
+            f"""
+            SELECT commits.id FROM commits_fts
+            JOIN commits ON commits.id = commits_fts.rowid
+            WHERE commits_fts MATCH ? AND {where}
+            ORDER BY {RANK}
+            LIMIT ?
+            """,
+            [query, *params, limit],
+        )
+    ]
+    if not ids:
+        return []
+
+    marks = f"'{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', {SNIPPET_TOKENS}"
+    rows = store.query(
+        f"""
+        SELECT commits.id, commits.timestamp, commits.repo_name, commits.author_name,
+               snippet(commits_fts, 0, {marks}), snippet(commits_fts, 1, {marks})
+        FROM commits_fts
+        JOIN commits ON commits.id = commits_fts.rowid
+        WHERE commits_fts MATCH ? AND commits_fts.rowid IN ({", ".join("?" * len(ids))})
+        """,
+        [query, *ids],
+    )
+    hits = {row[0]: row for row in rows}
+    return [
+        SearchHit(*hit[:4], hit[4], hit[5] if HIGHLIGHT_START in (hit[5] or "") else "")
+        for hit in (hits[commit_id] for commit_id in ids)
+    ]
+
+
+def search(
+    query,
+    since=None,
+    until=None,
+    repos=None,
+    author=None,
+    limit=DEFAULT_LIMIT,
+    reindex=False,
+):
+    """
+    Command entry point for `coas search`.
+    With reindex, the index is rebuilt first; query may then be empty.
+    """
+    from .cli_interface import CLIInterface
+
+    flush()
+    store = open_store()
+    if reindex:
+        store.rebuild_index()
+        print("Search index rebuilt.")
+    if not query:
+        return
+    start = parse_date(since).timestamp() if since else None
+    end = parse_date(until, end=True).timestamp() if until else None
+    hits = search_commits(store, query, start, end, repos, author, limit)
+    CLIInterface().display_search_results(query, hits)
@@ -1,51 +1,83 @@
-import sqlite3
-
 import os
 
-# Set fixed path in user's home directory
-DB_PATH = os.path.join(
-    os.path.expanduser("~"), ".config", "commit-assistant", "commits.db"
-)
+from .diff_codec import encode_diff
+from .migrations import SCHEMA_VERSION
+from .store import DB_PATH, CommitStore, open_store
+
+COMPRESS_BATCH_SIZE = 500
 
 
 def create_db():
+    """Create the database, or upgrade an existing one in place"""
     # Create directory structure if it doesn't exist
     db_dir = os.path.dirname(DB_PATH)
     os.makedirs(db_dir, exist_ok=True)
 
-    if os.path.exists(DB_PATH):
-        backup_path = DB_PATH.replace(".db", "_backup.db")
-        response = input(
-            f"Database already exists at {DB_PATH}. Backup and create new? (y/N): "
+    with CommitStore(DB_PATH) as store:
+        previous_version = store.previous_version
+
+    if previous_version == 0:
+        print("Database and tables created!")
+    elif previous_version < SCHEMA_VERSION:
+        print(
+            f"Database upgraded from schema v{previous_version} to v{SCHEMA_VERSION}"
         )
+    else:
+        print(f"Database is up to date (schema v{SCHEMA_VERSION})")
+
+
+def compress_diffs(db_path=DB_PATH, batch_size=COMPRESS_BATCH_SIZE, vacuum=True):
+    """
+    Compress the stored plain-text diffs in batches, one transaction per
+    batch, then VACUUM so the file actually shrinks.
+    Returns tuple of (diffs_compressed, bytes_before, bytes_after)
+    """
+    if not os.path.exists(db_path):
+        raise SystemExit(f"Database not found at {db_path}. Please initialize it first.")
+
+    store = open_store(db_path)
+
+    diffs_compressed = 0
+    bytes_before = 0
+    bytes_after = 0
+    last_id = 0
+    while True:
+        rows = store.query(
+            """
+            SELECT rowid, code_diff FROM diff_blobs
+            WHERE rowid > ? AND code_diff_codec IS NULL
+            ORDER BY rowid
+            LIMIT ?
+            """,
+            (last_id, batch_size),
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        updates = []
+        for blob_id, code_diff in rows:
+            if isinstance(code_diff, bytes):
+                code_diff = code_diff.decode("utf-8")
+            encoded, codec = encode_diff(code_diff)
+            if codec is None:
+                continue
+            bytes_before += len(code_diff.encode("utf-8"))
+            bytes_after += len(encoded)
+            updates.append((encoded, codec, blob_id))
+
+        store.execute_batched(
+            "UPDATE diff_blobs SET code_diff = ?, code_diff_codec = ? WHERE rowid = ?",
+            updates,
+        )
+        diffs_compressed += len(updates)
+
+    if vacuum and diffs_compressed:
+        store.conn.execute("VACUUM")
+    return diffs_compressed, bytes_before, bytes_after
+
 
-        if response.lower() == "y":
-            os.rename(DB_PATH, backup_path)
-            print(f"Existing database backed up to: {backup_path}")
-        else:
-            raise SystemExit("Database creation cancelled by user.")
-        print(f"Existing database backed up to: {backup_path}")
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Create the commits table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS commits (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT NOT NULL,
-        author_name TEXT NOT NULL,
-        author_email TEXT NOT NULL,
-        commit_message TEXT NOT NULL,
-        repo_url TEXT NOT NULL,
-        repo_name TEXT NOT NULL,
-        branch_name TEXT NOT NULL,
-        code_diff TEXT,
-        added_lines INTEGER DEFAULT 0,
-        removed_lines INTEGER DEFAULT 0
-    )
-    """)
-
-    conn.commit()
-    conn.close()
-    print("Database and tables created!")
+def compress_existing_diffs():
+    """Command entry point for `coas compress-diffs`"""
+    diffs, before, after = compress_diffs()
+    print(f"Compressed {diffs} diffs: {before / 1024:.1f} KiB -> {after / 1024:.1f} KiB")
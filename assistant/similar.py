@@ -0,0 +1,237 @@
+"""
+Past commits similar to a diff, used as few-shot examples by `coas commit`.
+
+A diff is reduced to a set of features: the paths, directories and file
+extensions it touches and the identifiers on its changed lines. The set is
+summarized by a bottom-k MinHash signature, the SIGNATURE_SIZE smallest
+hashes of its features, from which the Jaccard similarity of two diffs can
+be estimated without their text.
+
+Signatures live in commit_signatures, and their hashes in commit_minhashes,
+an inverted index by repo (see the v10 migration). Commits are indexed
+incrementally: each lookup first signs the commits stored since the last
+one, so the hooks do no extra work. Signatures stay when gc drops a diff, so
+old commits keep serving as examples. A lookup is two indexed queries.
+"""
+
+import hashlib
+import keyword
+import os
+import posixpath
+import re
+import struct
+from typing import Iterable, List, NamedTuple
+
+from .store import DB_PATH, open_store
+
+SIGNATURE_SIZE = 64
+BATCH_SIZE = 500
+
+DEFAULT_EXAMPLES = 3
+
+# Commits sharing the most hashes with the diff, ranked by similarity
+CANDIDATES = 50
+
+# Below this estimated similarity a commit is no example
+MIN_SIMILARITY = 0.05
+
+# Changed lines read for features; the rest of a huge diff adds little
+MAX_FEATURE_LINES = 5000
+
+EXAMPLE_MAX_CHARS = 500
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]{2,}")
+
+# Words every diff has, in whatever language: no signal for similarity
+STOPWORDS = frozenset(keyword.kwlist) | frozenset(
+    """
+    self cls this the and for not def class return import from const let var
+    function func true false null nil none new int str string bool void
+    public private protected static final async await export default
+    """.split()
+)
+
+
+class SimilarCommit(NamedTuple):
+    id: int
+    message: str
+    similarity: float
+
+
+def diff_features(diff: str) -> set:
+    """Paths, directories, extensions and changed identifiers of a diff"""
+    features = set()
+    changed = 0
+    for line in diff.splitlines():
+        if line.startswith("diff --git "):
+            path = line.rsplit(" b/", 1)[-1]
+            directory, extension = posixpath.dirname(path), posixpath.splitext(path)[1]
+            features.add(f"path:{path}")
+            if directory:
+                features.add(f"dir:{directory}")
+            if extension:
+                features.add(f"ext:{extension}")
+        elif line[:1] in ("+", "-") and not line.startswith(("+++", "---")):
+            changed += 1
+            if changed > MAX_FEATURE_LINES:
+                continue
+            for identifier in IDENTIFIER.findall(line):
+                if identifier.lower() not in STOPWORDS:
+                    features.add(f"id:{identifier}")
+    return features
+
+
+def feature_hash(feature: str) -> int:
+    """A stable 63-bit hash, so it fits an SQLite INTEGER"""
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+
+def signature(features: Iterable[str], size=SIGNATURE_SIZE) -> List[int]:
+    """The size smallest feature hashes, ascending"""
+    return sorted(feature_hash(feature) for feature in features)[:size]
+
+
+def pack_signature(hashes: List[int]) -> bytes:
+    return struct.pack(f"<{len(hashes)}q", *hashes)
+
+
+def unpack_signature(blob: bytes) -> List[int]:
+    return list(struct.unpack(f"<{len(blob) // 8}q", blob))
+
+
+def estimate_similarity(a: List[int], b: List[int], size=SIGNATURE_SIZE) -> float:
+    """
+    Jaccard similarity of two feature sets estimated from their signatures:
+    the share of the bottom hashes of the union that both sets have. Exact
+    when both sets have fewer than size features.
+    """
+    union = sorted(set(a) | set(b))[:size]
+    if not union:
+        return 0.0
+    shared = set(a) & set(b)
+    return sum(1 for h in union if h in shared) / len(union)
+
+
+def unindexed_count(store) -> int:
+    return store.query_one(
+        """
+        SELECT COUNT(*) FROM commits
+        WHERE id > (SELECT COALESCE(MAX(commit_id), 0) FROM commit_signatures)
+        """
+    )[0]
+
+
+def update_index(store, batch_size=BATCH_SIZE) -> int:
+    """
+    Sign the commits stored since the last call, a batch per transaction.
+    Returns the number of commits indexed
+    """
+    indexed = 0
+    while True:
+        with store.transaction():
+            last = store.query_one(
+                "SELECT COALESCE(MAX(commit_id), 0) FROM commit_signatures"
+            )[0]
+            rows = store.read_diffs(
+                "commits.id, repo_name",
+                "commits.id > ? ORDER BY commits.id LIMIT ?",
+                (last, batch_size),
+            )
+            signatures, minhashes = [], []
+            for commit_id, repo_name, diff in rows:
+                hashes = signature(diff_features(diff or ""))
+                signatures.append((commit_id, pack_signature(hashes)))
+                minhashes.extend((repo_name, h, commit_id) for h in hashes)
+            store.conn.executemany(
+                "INSERT INTO commit_signatures VALUES (?, ?)", signatures
+            )
+            store.conn.executemany(
+                "INSERT OR IGNORE INTO commit_minhashes VALUES (?, ?, ?)", minhashes
+            )
+        indexed += len(rows)
+        if len(rows) < batch_size:
+            return indexed
+
+
+def similar_commits(
+    store, repo_name, diff, limit=DEFAULT_EXAMPLES, candidates=CANDIDATES
+) -> List[SimilarCommit]:
+    """Committed changes of repo_name most similar to diff, most similar first"""
+    query = signature(diff_features(diff))
+    if not query:
+        return []
+    ids = [
+        row[0]
+        for row in store.query(
+            f"""
+            SELECT commit_id FROM commit_minhashes
+            WHERE repo_name = ? AND hash IN ({", ".join("?" * len(query))})
+            GROUP BY commit_id
+            ORDER BY COUNT(*) DESC, commit_id DESC
+            LIMIT ?
+            """,
+            [repo_name, *query, candidates],
+        )
+    ]
+    if not ids:
+        return []
+
+    rows = store.query(
+        f"""
+        SELECT commit_signatures.commit_id, signature, commit_message
+        FROM commit_signatures
+        JOIN commits ON commits.id = commit_signatures.commit_id
+        WHERE commit_signatures.commit_id IN ({", ".join("?" * len(ids))})
+          AND commit_message != ''
+        """,
+        ids,
+    )
+    scored = sorted(
+        (
+            SimilarCommit(
+                commit_id,
+                message,
+                estimate_similarity(query, unpack_signature(blob)),
+            )
+            for commit_id, blob, message in rows
+        ),
+        key=lambda commit: (-commit.similarity, -commit.id),
+    )
+
+    # The same message twice (amends, cherry-picks) teaches nothing new
+    similar, seen = [], set()
+    for commit in scored:
+        if commit.similarity < MIN_SIMILARITY or commit.message in seen:
+            continue
+        seen.add(commit.message)
+        similar.append(commit)
+        if len(similar) == limit:
+            break
+    return similar
+
+
+def get_example_count() -> int:
+    """Few-shot examples per prompt, from `[gemini] few_shot_examples`"""
+    from .config import config
+
+    return int(config.get("gemini", "few_shot_examples", DEFAULT_EXAMPLES))
+
+
+def few_shot_examples(diff, limit=None, db_path=DB_PATH) -> List[str]:
+    """Messages of the past commits of this repo most similar to diff"""
+    from .repo_info import get_repo_info
+
+    limit = get_example_count() if limit is None else limit
+    if not limit or not os.path.exists(db_path):
+        return []
+    store = open_store(db_path)
+    pending = unindexed_count(store)
+    if pending > BATCH_SIZE:
+        print(f"Indexing {pending} past commits to find similar ones (only once)...")
+    update_index(store)
+    repo_name = get_repo_info().repo_name
+    return [
+        commit.message[:EXAMPLE_MAX_CHARS].strip()
+        for commit in similar_commits(store, repo_name, diff, limit)
+    ]
@@ -0,0 +1,205 @@
+"""
+Append-only spool for the git hooks.
+
+With `[hooks] spool = true` in coas.conf, pre-commit and post-commit only
+append one JSON line to spool.jsonl instead of writing to SQLite. `coas flush`
+(also started in the background once the spool grows, and run before
+summaries) ingests pending records into commits.db in one transaction.
+
+Replay is safe: commits are inserted with INSERT OR IGNORE on their unique
+commit_token and messages are applied by token, so a flusher that crashes
+after committing but before deleting its batch file only repeats no-ops.
+"""
+
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+
+from .paths import DB_PATH, SPOOL_PATH
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are still atomic, rotation is unlocked
+    fcntl = None
+
+# Start a background flush once the spool holds this much
+FLUSH_THRESHOLD_BYTES = 256 * 1024
+
+
+def spool_enabled():
+    """Whether the hooks should spool instead of writing to the database"""
+    from .config import config
+
+    return config.get_bool("hooks", "spool")
+
+
+def _lock(fd, exclusive=False):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+
+def append_record(record, spool_path=SPOOL_PATH):
+    """
+    Append one record with a single O_APPEND write.
+    The shared lock keeps the write out of a concurrent rotation; if the file
+    was rotated while waiting for it, the record goes to the new spool file.
+    """
+    line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+    while True:
+        fd = os.open(spool_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            _lock(fd)
+            try:
+                current = os.stat(spool_path)
+            except FileNotFoundError:
+                current = None
+            if current is not None and current.st_ino == os.fstat(fd).st_ino:
+                os.write(fd, line)
+                return os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+
+
+def spool_commit(
+    author_name,
+    author_email,
+    timestamp,
+    repo_url,
+    repo_name,
+    current_branch,
+    code_diff,
+    added_lines,
+    removed_lines,
+    commit_token,
+    spool_path=SPOOL_PATH,
+):
+    """Spool the pre-commit half of a commit"""
+    return append_record(
+        {
+            "type": "commit",
+            "commit_token": commit_token,
+            "timestamp": timestamp,
+            "author_name": author_name,
+            "author_email": author_email,
+            "repo_url": repo_url,
+            "repo_name": repo_name,
+            "branch_name": current_branch,
+            "code_diff": code_diff,
+            "added_lines": added_lines,
+            "removed_lines": removed_lines,
+        },
+        spool_path,
+    )
+
+
+def spool_message(commit_message, commit_token, spool_path=SPOOL_PATH):
+    """Spool the post-commit half of a commit"""
+    return append_record(
+        {
+            "type": "message",
+            "commit_token": commit_token,
+            "commit_message": commit_message,
+        },
+        spool_path,
+    )
+
+
+def _rotate(spool_path):
+    """Move the live spool aside so new appends start a fresh file"""
+    try:
+        fd = os.open(spool_path, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        _lock(fd, exclusive=True)
+        os.rename(spool_path, f"{spool_path}.{time.time_ns()}.flushing")
+    except FileNotFoundError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _read_records(path):
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A torn last line from a writer that died mid-append
+                continue
+
+
+def flush(db_path=DB_PATH, spool_path=SPOOL_PATH):
+    """
+    Ingest every pending spool record in one transaction.
+    Returns tuple of (commits_inserted, messages_applied)
+    """
+    batch_pattern = f"{glob.escape(spool_path)}.*.flushing"
+    if not os.path.exists(spool_path) and not glob.glob(batch_pattern):
+        return 0, 0
+
+    from .store import open_store
+
+    store = open_store(db_path)
+    # Holding the write lock serialises flushers: any batch file present now
+    # was left by a flusher that died, and is replayed along with ours
+    with store.transaction():
+        _rotate(spool_path)
+        batches = sorted(glob.glob(batch_pattern))
+
+        commits = []
+        messages = {}  # commit_token -> latest message
+        for batch in batches:
+            for record in _read_records(batch):
+                if record.get("type") == "commit":
+                    commits.append(
+                        (
+                            record["timestamp"],
+                            record["author_name"],
+                            record["author_email"],
+                            "",
+                            record["repo_url"],
+                            record["repo_name"],
+                            record["branch_name"],
+                            record["code_diff"],
+                            record["added_lines"],
+                            record["removed_lines"],
+                            record["commit_token"],
+                        )
+                    )
+                elif record.get("type") == "message":
+                    messages[record["commit_token"]] = record["commit_message"]
+
+        commits_inserted = store.insert_commits(commits)
+        messages_applied = store.update_messages(
+            (message, token) for token, message in messages.items()
+        )
+
+    for batch in batches:
+        os.remove(batch)
+    return commits_inserted, messages_applied
+
+
+def start_background_flush(spool_size):
+    """Start a detached `coas flush` once the spool is big enough"""
+    if spool_size < FLUSH_THRESHOLD_BYTES:
+        return
+    subprocess.Popen(
+        [sys.executable, "-m", "assistant", "flush"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def flush_spool():
+    """Command entry point for `coas flush`"""
+    if not os.path.exists(DB_PATH):
+        print(f"Error: Database not found at {DB_PATH}. Please initialize it first.")
+        exit(1)
+    commits, messages = flush()
+    print(f"Flushed {commits} commits and {messages} messages into {DB_PATH}")
@@ -0,0 +1,325 @@
+"""
+Storage layer for commits.db.
+
+Every command reads and writes the database through a CommitStore, which
+owns the connection and its tuning in one place: incremental auto-vacuum,
+WAL journal, relaxed fsync, page cache and memory-mapped I/O sizes, the
+prepared statement cache and batched writes. open_store() hands out one
+store per database and thread and keeps it open until the process exits.
+Diffs are stored once per distinct text, see insert_commits.
+
+The store also keeps the full-text index in step with every write to
+commits, as it has the decoded text at hand. The schema has no triggers
+calling an application function, so other SQLite clients can still write
+to commits, but their changes do not reach the index: `coas gc` rebuilds
+it when commits were added or deleted behind its back, and `coas search
+--reindex` after any other change, such as an edited message.
+"""
+
+import atexit
+import itertools
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+from .diff_codec import decode_diff, diff_hash, encode_diff, register_functions
+from .migrations import migrate
+from .paths import DB_PATH
+
+# How long a writer waits for a concurrent hook's lock before failing
+BUSY_TIMEOUT = 10.0
+
+# Page cache per connection (negative: in KiB) and memory-mapped read window
+CACHE_SIZE_KIB = 16 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+
+# Prepared statements kept per connection; every query the commands run
+# fits, so each is compiled once per process
+STATEMENT_CACHE_SIZE = 128
+
+# Rows per executemany call in batched writes, bounds memory for generators
+WRITE_BATCH_SIZE = 10000
+
+# Shared by the direct hook write, the spool flusher and `coas import`. OR
+# IGNORE makes a replayed insert of an already stored commit_token a no-op.
+INSERT_COMMIT_SQL = """
+INSERT OR IGNORE INTO commits (
+    timestamp, author_name, author_email, commit_message,
+    repo_url, repo_name, branch_name, diff_hash,
+    added_lines, removed_lines, commit_token
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Position of diff_hash in INSERT_COMMIT_SQL
+DIFF_COLUMN = 7
+
+INSERT_DIFF_SQL = """
+INSERT OR IGNORE INTO diff_blobs (hash, code_diff, code_diff_codec) VALUES (?, ?, ?)
+"""
+
+# Reference counts are kept by triggers; the partial index on refcount = 0
+# makes this a lookup of the few blobs just released
+DELETE_UNREFERENCED_DIFFS_SQL = "DELETE FROM diff_blobs WHERE refcount = 0"
+
+UPDATE_MESSAGE_SQL = "UPDATE commits SET commit_message = ? WHERE commit_token = ?"
+
+DROP_DIFF_SQL = "UPDATE commits SET diff_hash = NULL WHERE id = ?"
+
+# commits_fts has external content (the commits_text view), so removing a
+# row takes the exact text it was indexed with
+INDEX_SQL = """
+INSERT INTO commits_fts (rowid, commit_message, code_diff) VALUES (?, ?, ?)
+"""
+UNINDEX_SQL = """
+INSERT INTO commits_fts (commits_fts, rowid, commit_message, code_diff)
+VALUES ('delete', ?, ?, ?)
+"""
+REBUILD_INDEX_SQL = "INSERT INTO commits_fts (commits_fts) VALUES ('rebuild')"
+
+# Commits missing from the index, or indexed rows whose commit is gone;
+# commits_fts_docsize has one row per indexed commit
+INDEX_DRIFT_SQL = """
+SELECT EXISTS (
+    SELECT 1 FROM commits
+    WHERE NOT EXISTS (SELECT 1 FROM commits_fts_docsize WHERE id = commits.id)
+) OR EXISTS (
+    SELECT 1 FROM commits_fts_docsize
+    WHERE NOT EXISTS (SELECT 1 FROM commits WHERE id = commits_fts_docsize.id)
+)
+"""
+
+
+def connect(db_path=DB_PATH):
+    """
+    Open the database for concurrent use: WAL lets readers and one writer
+    proceed together, and the busy timeout makes writers queue instead of
+    failing with "database is locked".
+    """
+    conn = sqlite3.connect(
+        db_path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE
+    )
+    # Takes effect when a new database gets its first table; `coas gc`
+    # converts older ones
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    register_functions(conn)
+    return conn
+
+
+def _batches(rows: Iterable, size: int):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class CommitStore:
+    """One migrated connection to the commits database"""
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self.conn = connect(db_path)
+        # The version before migrating, for `coas setup` to report
+        self.previous_version = migrate(self.conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run a block in one write transaction, committed at the end and rolled
+        back on error. IMMEDIATE takes the write lock up front, so the block
+        never fails halfway on a lock held by another writer. Nested blocks
+        join the outer transaction.
+        """
+        if self.conn.in_transaction:
+            yield self.conn
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def query(self, sql: str, params=()) -> list:
+        return self.conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params=()):
+        return self.conn.execute(sql, params).fetchone()
+
+    def execute_batched(
+        self, sql: str, rows: Iterable, batch_size: int = WRITE_BATCH_SIZE
+    ) -> int:
+        """
+        Run sql for every parameter tuple in rows, in one transaction.
+        Returns the number of rows changed, not counting trigger writes.
+        """
+        changed = 0
+        with self.transaction():
+            for batch in _batches(rows, batch_size):
+                changed += self.conn.executemany(sql, batch).rowcount
+        return changed
+
+    def store_diff(self, diff: Optional[str]) -> Optional[str]:
+        """
+        Store a diff unless the same text is already stored, returns its
+        diff_hash. A known diff costs one primary key lookup; only a new one
+        is compressed and written. Call within a transaction.
+        """
+        if diff is None:
+            return None
+        key = diff_hash(diff)
+        if self.conn.execute(
+            "SELECT 1 FROM diff_blobs WHERE hash = ?", (key,)
+        ).fetchone() is None:
+            self.conn.execute(INSERT_DIFF_SQL, (key, *encode_diff(diff)))
+        return key
+
+    def read_diffs(self, columns: str, where: str, params=()) -> list:
+        """
+        The given commits columns of the commits matching where, each row
+        followed by the decoded diff (None without one). where may end with
+        ORDER BY and LIMIT.
+        """
+        return [
+            (*row[:-2], decode_diff(*row[-2:]))
+            for row in self.query(
+                f"""
+                SELECT {columns}, diff_blobs.code_diff, diff_blobs.code_diff_codec
+                FROM commits LEFT JOIN diff_blobs ON diff_blobs.hash = diff_hash
+                WHERE {where}
+                """,
+                params,
+            )
+        ]
+
+    def index_drifted(self) -> bool:
+        """
+        Whether commits were inserted or deleted without the full-text index,
+        as other SQLite clients do. Edited messages and diffs go unnoticed.
+        """
+        return bool(self.query_one(INDEX_DRIFT_SQL)[0])
+
+    def rebuild_index(self) -> None:
+        """Re-index every commit from the commits_text view, decoding all diffs"""
+        with self.transaction():
+            self.conn.execute(REBUILD_INDEX_SQL)
+
+    def delete_unreferenced_diffs(self) -> int:
+        """Delete the diffs no commit refers to, returns how many went"""
+        return self.conn.execute(DELETE_UNREFERENCED_DIFFS_SQL).rowcount
+
+    def insert_commits(self, rows: Iterable) -> int:
+        """
+        Insert INSERT_COMMIT_SQL rows that have the diff text in place of
+        diff_hash. Each diff is stored once however many commits share it:
+        an amend, rebase or cherry-pick of the same change adds only its
+        commit row. Returns how many commits were new
+        """
+        changed = 0
+        with self.transaction():
+            for batch in _batches(rows, WRITE_BATCH_SIZE):
+                indexed = []
+                for row in batch:
+                    diff = row[DIFF_COLUMN]
+                    cursor = self.conn.execute(
+                        INSERT_COMMIT_SQL,
+                        (
+                            *row[:DIFF_COLUMN],
+                            self.store_diff(diff),
+                            *row[DIFF_COLUMN + 1 :],
+                        ),
+                    )
+                    if cursor.rowcount:
+                        indexed.append((cursor.lastrowid, row[3], diff))
+                self.conn.executemany(INDEX_SQL, indexed)
+                changed += len(indexed)
+            # Diffs of replayed commits that were already stored
+            self.delete_unreferenced_diffs()
+        return changed
+
+    def update_messages(self, updates: Iterable) -> int:
+        """Apply (commit_message, commit_token) pairs, returns how many matched"""
+        changed = 0
+        with self.transaction():
+            for message, token in updates:
+                old = self.read_diffs(
+                    "commits.id, commit_message", "commit_token = ?", (token,)
+                )
+                self.conn.executemany(UNINDEX_SQL, old)
+                self.conn.execute(UPDATE_MESSAGE_SQL, (message, token))
+                self.conn.executemany(
+                    INDEX_SQL,
+                    [(commit_id, message, diff) for commit_id, _, diff in old],
+                )
+                changed += len(old)
+        return changed
+
+    def drop_diffs(self, ids: list) -> None:
+        """
+        Remove the diffs of some commits, keeping the rows. A stored diff is
+        deleted with the last commit referring to it.
+        """
+        with self.transaction():
+            old = self.read_diffs(
+                "commits.id, commit_message",
+                f"commits.id IN ({', '.join('?' * len(ids))})",
+                ids,
+            )
+            self.conn.executemany(UNINDEX_SQL, old)
+            self.conn.executemany(DROP_DIFF_SQL, [(commit_id,) for commit_id in ids])
+            self.conn.executemany(
+                INDEX_SQL, [(commit_id, message, None) for commit_id, message, _ in old]
+            )
+            self.delete_unreferenced_diffs()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+_local = threading.local()
+_lock = threading.Lock()
+_opened = []
+_generation = 0  # bumped by close_stores, so threads drop their closed stores
+
+
+def open_store(db_path: str = DB_PATH) -> CommitStore:
+    """The shared store of db_path for the current thread, opened on first use"""
+    if getattr(_local, "generation", None) != _generation:
+        _local.stores = {}
+        _local.generation = _generation
+    store: Optional[CommitStore] = _local.stores.get(db_path)
+    if store is None:
+        store = _local.stores[db_path] = CommitStore(db_path)
+        with _lock:
+            _opened.append(store)
+    return store
+
+
+@atexit.register
+def close_stores() -> None:
+    """Close every shared store, letting SQLite checkpoint the WAL"""
+    global _generation
+    with _lock:
+        _generation += 1
+        stores = _opened[:]
+        _opened.clear()
+    for store in stores:
+        try:
+            store.close()
+        except sqlite3.Error:
+            # Closing from another thread than the one that opened it
+            pass
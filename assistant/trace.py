@@ -0,0 +1,225 @@
+"""
+Opt-in timing of commands and their phases: `coas trace report`.
+
+With `[trace] enabled = true` in coas.conf (or COAS_TRACE_ENABLED=1), every
+command appends one JSON line to trace.jsonl as it exits: the command, the
+repo, its wall time, the CPU time the interpreter spent starting up and
+importing before the command ran, and the time of each phase wrapped in
+span(). With tracing off, span() only checks a module global.
+
+`coas trace report` shows p50/p95/p99 of every phase per command and repo.
+"""
+
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple
+
+# Next to commits.db; not taken from store, which the daemon client never loads
+TRACE_PATH = os.path.join(
+    os.path.expanduser("~"), ".config", "commit-assistant", "trace.jsonl"
+)
+
+# Past this size the trace moves to trace.jsonl.1, replacing the older one
+MAX_TRACE_BYTES = 4 * 1024 * 1024
+
+# Phases recorded for every command, listed before the command's own spans
+TOTAL = "total"
+STARTUP = "startup"
+
+# Spans of the command running in this process, None when not tracing
+_spans = None
+_repo = ""
+
+
+class PhaseStats(NamedTuple):
+    command: str
+    repo: str
+    phase: str
+    count: int
+    p50: float
+    p95: float
+    p99: float
+
+
+def trace_enabled() -> bool:
+    from .config import config
+
+    return config.get_bool("trace", "enabled")
+
+
+def tracing() -> bool:
+    """Whether the running command is being traced"""
+    return _spans is not None
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as phase name of the running command"""
+    spans = _spans
+    if spans is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans[name] = spans.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def set_repo(repo_name):
+    """Attribute the running command to a repo in the report"""
+    global _repo
+    _repo = repo_name or ""
+
+
+@contextmanager
+def traced(command, trace_path=TRACE_PATH, startup=True):
+    """
+    Run a command, recording it to the trace when tracing is enabled.
+    startup=False leaves out the startup phase, for commands served by a
+    process that was already running.
+    """
+    global _spans, _repo
+    if not trace_enabled():
+        yield
+        return
+
+    phases = {STARTUP: time.process_time() * 1000} if startup else {}
+    _spans, _repo = {}, ""
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    except SystemExit as e:
+        failed = bool(e.code)
+        raise
+    finally:
+        total = (time.perf_counter() - start) * 1000
+        record = {
+            "ts": time.time(),
+            "command": command,
+            "repo": _repo,
+            "failed": failed,
+            "spans": {TOTAL: total, **phases, **_spans},
+        }
+        _spans, _repo = None, ""
+        write_record(record, trace_path)
+
+
+def write_record(record, trace_path=TRACE_PATH):
+    """
+    Append one record with a single O_APPEND write. Tracing must never fail a
+    command, so a record that cannot be written is dropped.
+    """
+    line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+    try:
+        os.makedirs(os.path.dirname(trace_path), exist_ok=True)
+        fd = os.open(trace_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, line)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > MAX_TRACE_BYTES:
+            os.replace(trace_path, f"{trace_path}.1")
+    except OSError:
+        pass
+
+
+def read_records(trace_path=TRACE_PATH) -> Iterator[dict]:
+    """Records of the rotated trace, then the current one; torn lines are skipped"""
+    for path in (f"{trace_path}.1", trace_path):
+        try:
+            with open(path, "r") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            continue
+        for line in lines:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an ordered, non-empty list"""
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def build_report(records) -> List[PhaseStats]:
+    """Phase timings grouped by command, repo and phase"""
+    groups: Dict[tuple, List[float]] = {}
+    for record in records:
+        key = (record.get("command", ""), record.get("repo", ""))
+        for phase, ms in record.get("spans", {}).items():
+            groups.setdefault(key + (phase,), []).append(ms)
+
+    def order(key):
+        command, repo, phase = key
+        return (command, repo, phase != TOTAL, phase != STARTUP, phase)
+
+    report = []
+    for key in sorted(groups, key=order):
+        ordered = sorted(groups[key])
+        report.append(
+            PhaseStats(
+                *key,
+                len(ordered),
+                percentile(ordered, 0.50),
+                percentile(ordered, 0.95),
+                percentile(ordered, 0.99),
+            )
+        )
+    return report
+
+
+def format_report(report) -> str:
+    lines = [
+        f"{'command':<14} {'repo':<24} {'phase':<12} {'n':>6} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    ]
+    previous = None
+    for row in report:
+        group = (row.command, row.repo or "-")
+        command, repo = ("", "") if group == previous else group
+        previous = group
+        lines.append(
+            f"{command:<14} {repo:<24} {row.phase:<12} "
+            f"{row.count:>6} {row.p50:>9.1f} {row.p95:>9.1f} {row.p99:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def clear(trace_path=TRACE_PATH) -> int:
+    """Delete the trace. Returns the number of files removed"""
+    removed = 0
+    for path in (trace_path, f"{trace_path}.1"):
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def run_trace(action="report", trace_path=TRACE_PATH):
+    """Command entry point for `coas trace [report|clear]`"""
+    if action == "clear":
+        clear(trace_path)
+        print("Trace cleared.")
+        return
+    if action != "report":
+        raise ValueError(f"Unknown trace action: {action} (report or clear)")
+
+    report = build_report(read_records(trace_path))
+    if not report:
+        print(
+            "No traces recorded. Enable tracing with `[trace] enabled = true` "
+            "in coas.conf or COAS_TRACE_ENABLED=1."
+        )
+        return
+    print(format_report(report))
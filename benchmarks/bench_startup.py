@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Measure interpreter startup and import cost of the coas commands.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N] [--max-ms MS] [--json]
+
+Each scenario runs in a fresh interpreter so the numbers include what a git
+hook actually pays. The hook scenarios also fail if they load any of the
+heavy modules (google-genai, rich) that only the interactive commands need.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("google.genai", "rich")
+
+# Scenario name -> (modules imported, whether heavy modules are forbidden)
+SCENARIOS = {
+    "python": ((), True),
+    "cli": (("assistant.cli",), True),
+    "pre-commit": (("assistant.cli", "assistant.pre_commit"), True),
+    "post-commit": (("assistant.cli", "assistant.post_commit"), True),
+}
+
+PROBE = """
+import sys
+for name in {modules!r}:
+    __import__(name)
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(",".join(heavy))
+"""
+
+
+def run_scenario(modules, runs):
+    """Return (timings in ms, heavy modules loaded) for one scenario"""
+    code = PROBE.format(modules=modules, heavy=HEAVY_MODULES)
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, PYTHONDONTWRITEBYTECODE="1")
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.check_output(
+            [sys.executable, "-c", code], env=env, universal_newlines=True
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+        loaded = [m for m in output.strip().split(",") if m]
+    return timings, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="Fail if a hook scenario's median startup exceeds this many ms",
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON results")
+    args = parser.parse_args()
+
+    results = {}
+    failures = []
+    for name, (modules, forbid_heavy) in SCENARIOS.items():
+        timings, loaded = run_scenario(modules, args.runs)
+        median = statistics.median(timings)
+        results[name] = {
+            "median_ms": round(median, 2),
+            "min_ms": round(min(timings), 2),
+            "heavy_modules": loaded,
+        }
+        if forbid_heavy and loaded:
+            failures.append(f"{name} imported {', '.join(loaded)}")
+        if args.max_ms and name != "python" and median > args.max_ms:
+            failures.append(f"{name} took {median:.1f}ms (limit {args.max_ms}ms)")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            print(
+                f"{name:12} median {result['median_ms']:8.2f}ms  "
+                f"min {result['min_ms']:8.2f}ms"
+            )
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""Benchmark what commits, captures and summaries cost with the hooks installed.
+
+Usage:
+    python benchmarks/bench_suite.py [--scenario NAME ...] [--commits N]
+        [--diff-files N] [--diff-lines N] [--runs N] [--daemon] [--json]
+        [--output FILE] [--compare BASELINE.json]
+
+Everything runs against synthetic data in a temporary HOME: git repositories
+with a staged change of --diff-files files of --diff-lines lines each, and a
+database seeded with --commits commits (up to a million). The model is
+replaced by the local FakeClient, so no network is used and runs are
+repeatable. Results are JSON-serializable; --output saves them and --compare
+prints the change of every metric against a saved run.
+
+Scenarios:
+    hooks    pre-commit and post-commit end to end, each in a fresh interpreter
+             (with --daemon, served by `coas daemon`)
+    capture  staged diff capture throughput and peak memory
+    summary  stats, digest grouping and search queries on the seeded database
+    commit   `coas commit` prompt building and streamed generation latency
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+SCENARIOS = ("hooks", "capture", "summary", "commit")
+
+WORDS = (
+    "add fix update remove refactor cache spool flush index token stream "
+    "commit widget gadget login parser config digest summary search store"
+).split()
+
+
+def percentiles(timings_ms):
+    """p50/p95/max of a list of timings in milliseconds"""
+    ordered = sorted(timings_ms)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(p95, 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def git(repo, *args, env=None):
+    return subprocess.check_output(
+        ["git", *args], cwd=repo, env=env, universal_newlines=True
+    ).strip()
+
+
+def make_file(lines, seed):
+    rng = random.Random(seed)
+    return "".join(
+        f"    {rng.choice(WORDS)}_{i} = {rng.choice(WORDS)}({rng.randint(0, 999)})\n"
+        for i in range(lines)
+    )
+
+
+def build_repo(path, files, lines, env):
+    """A repository with one commit, ready for stage_change"""
+    os.makedirs(path)
+    git(path, "init", "-q", "-b", "main", env=env)
+    git(path, "config", "user.name", "Bench", env=env)
+    git(path, "config", "user.email", "bench@example.com", env=env)
+    git(path, "config", "commit.gpgsign", "false", env=env)
+    git(path, "remote", "add", "origin", "git@github.com:bench/repo.git", env=env)
+    for i in range(files):
+        with open(os.path.join(path, f"module_{i}.py"), "w") as f:
+            f.write(make_file(lines, i))
+    git(path, "add", "-A", env=env)
+    git(path, "commit", "-q", "--no-verify", "-m", "initial", env=env)
+    return path
+
+
+def stage_change(path, files, lines, seed, env):
+    """Rewrite every file and stage it: a diff of about files * lines * 2 lines"""
+    for i in range(files):
+        with open(os.path.join(path, f"module_{i}.py"), "w") as f:
+            f.write(make_file(lines, seed * 1000 + i))
+    git(path, "add", "-A", env=env)
+
+
+def seed_db(db_path, commits, repos=20, days=365):
+    """Fill a database with commits spread over the last days, in large batches"""
+    from assistant.store import CommitStore
+
+    rng = random.Random(0)
+    now = time.time()
+    store = CommitStore(db_path)
+
+    def rows():
+        for i in range(commits):
+            message = f"{rng.choice(['feat', 'fix', 'chore'])}: " + " ".join(
+                rng.choices(WORDS, k=5)
+            )
+            diff = "\n".join("+" + " ".join(rng.choices(WORDS, k=8)) for _ in range(8))
+            yield (
+                now - rng.random() * days * 86400,
+                f"author{i % 7}",
+                f"author{i % 7}@example.com",
+                message,
+                "",
+                f"bench/repo{i % repos}",
+                "main",
+                diff,
+                rng.randint(1, 200),
+                rng.randint(0, 100),
+                f"seed-{i}",
+            )
+
+    elapsed, _ = timed(store.insert_commits, rows())
+    store.close()
+    return elapsed
+
+
+def bench_hooks(args, work, env):
+    """pre-commit and post-commit as git runs them: fresh interpreters"""
+    repo = build_repo(
+        os.path.join(work, "hooks-repo"), args.diff_files, args.diff_lines, env
+    )
+
+    def run_hook(name):
+        elapsed, _ = timed(
+            subprocess.run,
+            [sys.executable, "-m", "assistant", name],
+            cwd=repo,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        return elapsed
+
+    if args.daemon:
+        run_hook("daemon")
+    pre, post = [], []
+    try:
+        for run in range(args.runs):
+            stage_change(repo, args.diff_files, args.diff_lines, run + 1, env)
+            pre.append(run_hook("pre-commit"))
+            git(repo, "commit", "-q", "--no-verify", "-m", f"bench {run}", env=env)
+            post.append(run_hook("post-commit"))
+    finally:
+        if args.daemon:
+            subprocess.run(
+                [sys.executable, "-m", "assistant", "daemon", "stop"],
+                env=env,
+                stdout=subprocess.DEVNULL,
+            )
+    return {"pre-commit": percentiles(pre), "post-commit": percentiles(post)}
+
+
+def bench_capture(args, work, env):
+    """Diff capture in this process, with tracemalloc for the peak"""
+    from assistant.pre_commit import get_code_diff
+
+    repo = build_repo(
+        os.path.join(work, "capture-repo"), args.diff_files, args.diff_lines, env
+    )
+    stage_change(repo, args.diff_files, args.diff_lines, 1, env)
+    raw_bytes = len(
+        subprocess.check_output(["git", "diff", "--cached"], cwd=repo, env=env)
+    )
+
+    cwd = os.getcwd()
+    os.chdir(repo)
+    try:
+        timings = []
+        for _ in range(args.runs):
+            elapsed, (diff, _, _) = timed(get_code_diff)
+            timings.append(elapsed)
+        tracemalloc.start()
+        get_code_diff()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        os.chdir(cwd)
+
+    median_s = statistics.median(timings) / 1000
+    return {
+        **percentiles(timings),
+        "staged_diff_bytes": raw_bytes,
+        "stored_diff_bytes": len(diff.encode("utf-8")),
+        "throughput_mb_s": round(raw_bytes / median_s / 2**20, 2),
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def bench_summary(args, work, env):
+    """Queries behind summary, stats and search on the seeded database"""
+    from assistant.analyze import get_day_groups, get_stats
+    from assistant.search import search_commits
+    from assistant.store import CommitStore
+
+    db_path = os.path.join(work, "summary.db")
+    seed_ms = seed_db(db_path, args.commits)
+    store = CommitStore(db_path)
+    now = time.time()
+    week = (now - 7 * 86400, now)
+    year = (now - 366 * 86400, now)
+    queries = {
+        "stats_week": lambda: get_stats(store, *week),
+        "stats_year": lambda: get_stats(store, *year),
+        "day_groups_week": lambda: get_day_groups(store, *week),
+        "day_groups_week_repo": lambda: get_day_groups(store, *week, repos=["repo3"]),
+        "search": lambda: search_commits(store, "spool flush"),
+        "search_repo_week": lambda: search_commits(store, "login", *week, ["repo3"]),
+    }
+    results = {
+        "commits": args.commits,
+        "seed_commits_per_s": round(args.commits / (seed_ms / 1000)),
+        "db_bytes": os.path.getsize(db_path),
+    }
+    for name, query in queries.items():
+        results[name] = percentiles([timed(query)[0] for _ in range(args.runs)])
+    store.close()
+    return results
+
+
+def bench_commit(args, work, env):
+    """`coas commit` up to the confirmation prompt, with the fake model"""
+    from assistant import llm
+    from assistant.llm import FakeClient
+    from assistant.prepare_commit_msg import (
+        build_commit_prompt,
+        get_code_diff,
+        get_token_budget,
+        stream_response,
+    )
+
+    repo = build_repo(
+        os.path.join(work, "commit-repo"), args.diff_files, args.diff_lines, env
+    )
+    stage_change(repo, args.diff_files, args.diff_lines, 1, env)
+    backend = FakeClient(
+        "feat: update generated modules\n\nRewrite every module.",
+        first_chunk_delay=args.fake_latency_ms / 1000,
+    )
+    cwd = os.getcwd()
+    os.chdir(repo)
+    prompt_ms, first_token_ms, total_ms = [], [], []
+    try:
+        for _ in range(args.runs):
+            # Each `coas commit` is its own process with a fresh scheduler and
+            # the configured rate limit
+            llm.set_client(backend)
+            start = time.perf_counter()
+            diff = get_code_diff()
+            prompt = build_commit_prompt(diff, get_token_budget())
+            prompt_ms.append((time.perf_counter() - start) * 1000)
+            _, first_token, total = stream_response(prompt, io.StringIO())
+            first_token_ms.append(prompt_ms[-1] + first_token * 1000)
+            total_ms.append(prompt_ms[-1] + total * 1000)
+    finally:
+        os.chdir(cwd)
+        llm.set_client(None)
+    return {
+        "prompt": percentiles(prompt_ms),
+        "first_token": percentiles(first_token_ms),
+        "total": percentiles(total_ms),
+        "fake_latency_ms": args.fake_latency_ms,
+    }
+
+
+BENCHMARKS = {
+    "hooks": bench_hooks,
+    "capture": bench_capture,
+    "summary": bench_summary,
+    "commit": bench_commit,
+}
+
+
+def flatten(results, prefix=""):
+    """{"a": {"b": 1}} -> {"a.b": 1}, for comparing runs"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(results, baseline):
+    current = flatten(results["results"])
+    previous = flatten(baseline["results"])
+    for name, value in current.items():
+        before = previous.get(name)
+        if before:
+            print(f"{name:50} {before:>12} -> {value:>12}  {value / before - 1:+.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.splitlines()[1:]),
+    )
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--commits", type=int, default=100_000)
+    parser.add_argument("--diff-files", type=int, default=20)
+    parser.add_argument("--diff-lines", type=int, default=200)
+    parser.add_argument("--fake-latency-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--daemon", action="store_true", help="hooks: serve them from `coas daemon`"
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON results")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    parser.add_argument("--compare", help="Print changes against a saved run")
+    args = parser.parse_args()
+
+    from assistant.__version__ import VERSION
+
+    results = {
+        "version": VERSION,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "params": {
+            "runs": args.runs,
+            "commits": args.commits,
+            "diff_files": args.diff_files,
+            "diff_lines": args.diff_lines,
+            "fake_latency_ms": args.fake_latency_ms,
+            "daemon": args.daemon,
+        },
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="coas-bench-") as work:
+        # A private HOME: the hooks find their database and config there
+        home = os.path.join(work, "home")
+        os.makedirs(os.path.join(home, ".config", "commit-assistant"))
+        env = dict(
+            os.environ,
+            HOME=home,
+            PYTHONPATH=REPO_ROOT,
+            GIT_CONFIG_NOSYSTEM="1",
+            GIT_CONFIG_GLOBAL=os.path.join(home, ".gitconfig"),
+        )
+        env.pop("GIT_DIR", None)
+        # The in-process scenarios use the same HOME; assistant modules are
+        # only imported from here on, so their paths point into it
+        os.environ.clear()
+        os.environ.update(env)
+        from assistant.store import DB_PATH, CommitStore
+
+        CommitStore(DB_PATH).close()
+
+        for name in args.scenario or SCENARIOS:
+            print(f"Running {name}...", file=sys.stderr)
+            results["results"][name] = BENCHMARKS[name](args, work, env)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    elif args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, value in flatten(results["results"]).items():
+            print(f"{name:50} {value:>12}")
+
+
+if __name__ == "__main__":
+    main()
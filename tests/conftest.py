@@ -0,0 +1,70 @@
+import sqlite3
+import subprocess
+
+import pytest
+
+
+def git(repo, *args):
+    return subprocess.check_output(
+        ["git", *args], cwd=repo, universal_newlines=True
+    ).strip()
+
+
+@pytest.fixture(autouse=True)
+def repo_cache(tmp_path, monkeypatch):
+    """Keep get_repo_info away from the real ~/.config cache"""
+    cache_path = tmp_path / "repo_cache.json"
+    monkeypatch.setattr("assistant.repo_info.CACHE_PATH", str(cache_path))
+    return cache_path
+
+
+@pytest.fixture
+def git_repo(tmp_path, monkeypatch):
+    """Create a git repository with an identity and remote, and cd into it"""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    git(repo, "init", "-q", "-b", "main")
+    git(repo, "config", "user.name", "Test User")
+    git(repo, "config", "user.email", "test@example.com")
+    git(repo, "remote", "add", "origin", "git@github.com:acme/widgets.git")
+    monkeypatch.chdir(repo)
+    monkeypatch.delenv("GIT_DIR", raising=False)
+    return repo
+
+
+LEGACY_SCHEMA = """
+CREATE TABLE commits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    author_name TEXT NOT NULL,
+    author_email TEXT NOT NULL,
+    commit_message TEXT NOT NULL,
+    repo_url TEXT NOT NULL,
+    repo_name TEXT NOT NULL,
+    branch_name TEXT NOT NULL,
+    code_diff TEXT,
+    added_lines INTEGER DEFAULT 0,
+    removed_lines INTEGER DEFAULT 0
+)
+"""
+
+
+def create_legacy_db(db_path, rows=()):
+    """
+    Create a database the way commit-assistant 0.1 did (no user_version).
+    rows are (timestamp, commit_message, repo_name, code_diff, added_lines)
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.executemany(
+        """
+        INSERT INTO commits (
+            timestamp, author_name, author_email, commit_message, repo_url,
+            repo_name, branch_name, code_diff, added_lines
+        )
+        VALUES (?, 'Test User', 'test@example.com', ?, '', ?, 'main', ?, ?)
+        """,
+        rows,
+    )
+    conn.commit()
+    conn.close()
@@ -0,0 +1,193 @@
+from datetime import datetime
+
+import pytest
+
+from assistant import llm
+from assistant.analyze import (
+    format_digests,
+    format_stats,
+    get_stats,
+    resolve_range,
+    update_digests,
+)
+from assistant.llm import FakeClient
+from assistant.pre_commit import save_to_database
+from assistant.store import CommitStore
+
+MONDAY = datetime(2024, 3, 4, 10, 0).timestamp()
+TUESDAY = datetime(2024, 3, 5, 10, 0).timestamp()
+WEEK = (datetime(2024, 3, 4).timestamp(), datetime(2024, 3, 10, 23, 59).timestamp())
+
+
+def add_commit(db_path, timestamp, repo_name, message, added_lines=1):
+    save_to_database(
+        message, "Test", "t@example.com", timestamp, "", repo_name, "main",
+        None, added_lines, 0, commit_token=f"{repo_name}-{timestamp}-{message}",
+        db_path=db_path,
+    )
+
+
+@pytest.fixture
+def db(tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    store = CommitStore(db_path)
+    yield db_path, store
+    store.close()
+
+
+@pytest.fixture
+def client():
+    client = FakeClient("digest")
+    llm.set_client(client)
+    yield client
+    llm.set_client(None)
+
+
+def test_digests_are_reused_until_their_day_changes(db, client):
+    db_path, store = db
+    add_commit(db_path, MONDAY, "acme/widgets", "feat: widgets", 10)
+    add_commit(db_path, MONDAY + 60, "acme/widgets", "fix: widgets", 5)
+    add_commit(db_path, TUESDAY, "acme/gadgets", "feat: gadgets", 7)
+
+    digests = update_digests(store, *WEEK)
+    assert digests == [
+        ("2024-03-04", "acme/widgets", 15, "digest"),
+        ("2024-03-05", "acme/gadgets", 7, "digest"),
+    ]
+    assert len(client.prompts) == 2
+    # Digests are generated concurrently, in any order
+    assert any("fix: widgets" in prompt for prompt in client.prompts)
+
+    # Nothing changed: no model call at all
+    assert update_digests(store, *WEEK) == digests
+    assert len(client.prompts) == 2
+
+    # A new Tuesday commit only re-digests Tuesday's repo
+    add_commit(db_path, TUESDAY + 60, "acme/gadgets", "docs: gadgets", 3)
+    update_digests(store, *WEEK)
+    assert len(client.prompts) == 3
+    assert "docs: gadgets" in client.prompts[2]
+
+
+def test_digest_follows_messages_filled_in_later(db, client):
+    """pre-commit stores an empty message; post-commit fills it in"""
+    db_path, store = db
+    add_commit(db_path, MONDAY, "acme/widgets", "")
+    update_digests(store, *WEEK)
+    assert len(client.prompts) == 1
+
+    store.update_messages([("feat: widgets", f"acme/widgets-{MONDAY}-")])
+    update_digests(store, *WEEK)
+    assert len(client.prompts) == 2
+    assert "feat: widgets" in client.prompts[1]
+
+
+def test_range_ending_or_starting_within_a_day(db, client):
+    db_path, store = db
+    add_commit(db_path, TUESDAY, "acme/widgets", "feat: morning")
+    add_commit(db_path, TUESDAY + 4 * 3600, "acme/widgets", "feat: afternoon")
+
+    start, end, _ = resolve_range(since="2024-03-05T12:00", until="2024-03-10")
+    digests = update_digests(store, start.timestamp(), end.timestamp())
+    assert digests == [("2024-03-05", "acme/widgets", 1, "digest")]
+    assert "feat: afternoon" in client.prompts[0]
+    assert "feat: morning" not in client.prompts[0]
+
+    # The partial day was not cached: the whole day gets its own digest
+    update_digests(store, *WEEK)
+    assert len(client.prompts) == 2
+    assert "feat: morning" in client.prompts[1]
+    update_digests(store, *WEEK)
+    assert len(client.prompts) == 2
+
+
+def test_format_digests():
+    assert format_digests([("2024-03-04", "acme/widgets", 15, "Built widgets.")]) == (
+        "Summaries of each day's commits made this week:\n\n"
+        "- [2024-03-04] widgets: Built widgets."
+    )
+
+
+def test_filters_by_repo_and_author(db, client):
+    db_path, store = db
+    add_commit(db_path, MONDAY, "acme/widgets", "feat: widgets")
+    add_commit(db_path, MONDAY, "acme/gadgets", "feat: gadgets")
+    save_to_database(
+        "fix: other author", "Other", "other@example.com", MONDAY + 1, "",
+        "acme/widgets", "main", None, 1, 0, commit_token="other", db_path=db_path,
+    )
+
+    digests = update_digests(store, *WEEK, repos=["widgets"])
+    assert [d[1] for d in digests] == ["acme/widgets"]
+    # _ in a repo name is no wildcard
+    assert update_digests(store, *WEEK, repos=["wid_ets"]) == []
+    assert "fix: other author" in client.prompts[-1]
+
+    # The author's digest is generated separately from the all-authors one
+    digests = update_digests(store, *WEEK, repos=["acme/widgets"], author="t@example.com")
+    assert len(digests) == 1
+    assert "fix: other author" not in client.prompts[-1]
+    assert len(client.prompts) == 2
+
+
+def test_per_repo_summaries_run_concurrently(db):
+    import time
+
+    from assistant.analyze import summarize_per_repo
+
+    client = FakeClient("summary", first_chunk_delay=0.2)
+    llm.set_client(client)
+    digests = [("2024-03-04", f"acme/repo{i}", i, "digest") for i in range(4)]
+    try:
+        start = time.perf_counter()
+        summarize_per_repo(digests, "this week", "Total: 4 commits")
+        elapsed = time.perf_counter() - start
+    finally:
+        llm.set_client(None)
+
+    assert len(client.prompts) == 5
+    assert "## repo3\n" in client.prompts[-1]
+    assert "Total: 4 commits" in client.prompts[-1]
+    assert elapsed < 0.8
+
+
+def test_parse_date():
+    from assistant.analyze import parse_date
+
+    assert parse_date("2024-03-04") == datetime(2024, 3, 4)
+    assert parse_date("2024-03-04", end=True) == datetime(2024, 3, 4, 23, 59, 59, 999999)
+    assert parse_date("2024-03-04T12:30", end=True) == datetime(2024, 3, 4, 12, 30)
+
+
+def test_stats_are_aggregated_in_sql(db):
+    db_path, store = db
+    add_commit(db_path, MONDAY, "acme/widgets", "feat: widgets", 30)
+    add_commit(db_path, TUESDAY, "acme/widgets", "fix: widgets", 10)
+    add_commit(db_path, TUESDAY, "acme/gadgets", "feat: gadgets", 10)
+    add_commit(db_path, WEEK[0] - 3600, "acme/widgets", "last week", 99)
+
+    stats = get_stats(store, *WEEK)
+    assert stats["total"] == (3, 50, 0)
+    assert stats["repo"] == [
+        ("acme/widgets", 2, 40, 0, 80.0),
+        ("acme/gadgets", 1, 10, 0, 20.0),
+    ]
+    assert stats["author"] == [("Test", 3, 50, 0, 100.0)]
+    assert stats["day"] == [
+        ("2024-03-04", 1, 30, 0, 60.0),
+        ("2024-03-05", 2, 20, 0, 40.0),
+    ]
+
+    stats = get_stats(store, *WEEK, repos=["gadgets"])
+    assert stats["total"] == (1, 10, 0)
+    assert "- acme/gadgets: 1 commits, +10 -0 lines, 100.0% of added lines" in (
+        format_stats(stats)
+    )
+
+
+def test_stats_of_empty_range(db):
+    _, store = db
+    stats = get_stats(store, *WEEK)
+    assert stats["total"] == (0, 0, 0)
+    assert stats["repo"] == []
+    assert format_stats(stats).startswith("Total: 0 commits")
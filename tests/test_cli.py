@@ -0,0 +1,39 @@
+import subprocess
+import sys
+
+import pytest
+
+from assistant.cli import Assistant, cli
+
+
+HEAVY_MODULES = ("google.genai", "rich")
+
+
+@pytest.mark.parametrize("module", ["assistant.pre_commit", "assistant.post_commit"])
+def test_hook_path_skips_heavy_imports(module):
+    """Hook commands must not import google-genai or rich"""
+    code = (
+        "import sys\n"
+        "import assistant.cli\n"
+        f"import {module}\n"
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])\n"
+    )
+    output = subprocess.check_output(
+        [sys.executable, "-c", code], universal_newlines=True
+    )
+    assert output.strip() == "[]"
+
+
+def test_every_command_has_handler():
+    """Every command maps to an Assistant method"""
+    for handler in Assistant.COMMANDS.values():
+        assert callable(getattr(Assistant, handler))
+
+
+def test_cli_dispatches_command(monkeypatch):
+    """cli() runs only the handler of the requested command"""
+    calls = []
+    monkeypatch.setattr(Assistant, "pre_commit", lambda self: calls.append("pre"))
+    monkeypatch.setattr(Assistant, "post_commit", lambda self: calls.append("post"))
+    cli(["pre-commit"])
+    assert calls == ["pre"]
@@ -100,3 +100,44 @@ def test_get_nonexistent_value(config_with_temp_dir):
     """Test getting non-existent configuration value"""
     config = config_with_temp_dir
     assert config.get("nonexistent", "key", "default") == "default"
+
+
+def test_config_is_loaded_lazily_without_side_effects(tmp_path):
+    """Creating and reading a config never creates files or directories"""
+    config = Config()
+    config.config_dir = tmp_path / "missing"
+    config.config_file = config.config_dir / "coas.conf"
+    assert config.get("hooks", "spool", "false") == "false"
+    assert not config.config_dir.exists()
+
+
+def test_config_reloads_when_file_changes(temp_config_dir, monkeypatch):
+    monkeypatch.setattr("assistant.config.RELOAD_CHECK_INTERVAL", 0)
+    config = Config()
+    config.config_dir = temp_config_dir
+    config.config_file = temp_config_dir / "coas.conf"
+    config.config_file.write_text("[hooks]\nspool = false\n")
+    assert config.get("hooks", "spool") == "false"
+
+    config.config_file.write_text("[hooks]\nspool = true\n")
+    os.utime(config.config_file, ns=(0, 10**18))
+    assert config.get("hooks", "spool") == "true"
+
+
+def test_environment_overrides_file(config_with_temp_dir, monkeypatch):
+    config = config_with_temp_dir
+    config.set("gemini", "diff_token_budget", "8000")
+    monkeypatch.setenv("COAS_GEMINI_DIFF_TOKEN_BUDGET", "2000")
+    monkeypatch.setenv("COAS_GEMINI_API_KEY", "env_key")
+    assert config.get("gemini", "diff_token_budget") == "2000"
+    assert config.get("gemini", "api_key") == "env_key"
+
+
+@patch("builtins.input", side_effect=AssertionError("prompted"))
+def test_missing_api_key_never_prompts_without_terminal(
+    mock_input, config_with_temp_dir, monkeypatch
+):
+    monkeypatch.delenv("COAS_GEMINI_API_KEY", raising=False)
+    monkeypatch.setattr("sys.stdin.isatty", lambda: False, raising=False)
+    with pytest.raises(SystemExit, match="COAS_GEMINI_API_KEY"):
+        config_with_temp_dir.get("gemini", "api_key")
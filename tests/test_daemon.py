@@ -0,0 +1,112 @@
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+from assistant import daemon
+from assistant.daemon import request, run_in_daemon, serve
+
+
+@pytest.fixture
+def socket_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(daemon, "warm_up", lambda: None)
+    return str(tmp_path / "coas.sock")
+
+
+def start_daemon(socket_path, idle_timeout=30):
+    """Serve in a thread. Returns the thread, its result is in thread.served"""
+    ready = threading.Event()
+
+    def run():
+        thread.served = serve(socket_path, idle_timeout, ready.set)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert ready.wait(5)
+    return thread
+
+
+def test_hook_runs_in_client_context(socket_path, tmp_path, monkeypatch, capsys):
+    def hook():
+        print(os.getcwd(), os.environ.get("GIT_INDEX_FILE"))
+        sys.exit(3)
+
+    monkeypatch.setitem(daemon.HANDLERS, "pre-commit", hook)
+    thread = start_daemon(socket_path)
+
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    monkeypatch.chdir(repo)
+    monkeypatch.setenv("GIT_INDEX_FILE", ".git/next-index-1.lock")
+    assert run_in_daemon("pre-commit", socket_path) == 3
+    assert capsys.readouterr().out == f"{repo} .git/next-index-1.lock\n"
+    assert run_in_daemon("pre-commit", socket_path) == 3
+
+    request({"command": "stop"}, socket_path)
+    thread.join(5)
+    assert thread.served == 2
+    assert not os.path.exists(socket_path)
+
+
+def test_errors_become_exit_codes(socket_path, monkeypatch, capsys):
+    def hook():
+        raise RuntimeError("Not a git repository")
+
+    monkeypatch.setitem(daemon.HANDLERS, "post-commit", hook)
+    thread = start_daemon(socket_path)
+    assert run_in_daemon("post-commit", socket_path) == 1
+    assert "Not a git repository" in capsys.readouterr().out
+    assert request({"command": "rebase"}, socket_path)["code"] == 2
+    assert request([], socket_path)["code"] == 2
+    assert request({"command": ["stop"]}, socket_path)["code"] == 2
+    assert daemon.daemon_pid(socket_path) == os.getpid()
+    request({"command": "stop"}, socket_path)
+    thread.join(5)
+
+
+def test_no_daemon_falls_back(socket_path):
+    assert run_in_daemon("pre-commit", socket_path) is None
+
+    # A socket file nobody listens on, as left by a killed daemon
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    assert run_in_daemon("pre-commit", socket_path) is None
+
+    # The next daemon replaces it
+    thread = start_daemon(socket_path)
+    assert daemon.daemon_pid(socket_path) == os.getpid()
+    request({"command": "stop"}, socket_path)
+    thread.join(5)
+
+
+def test_connect_timeout_falls_back(socket_path, monkeypatch):
+    """A daemon too busy to accept is no reason to fail the commit"""
+    thread = start_daemon(socket_path)
+
+    def busy(self, address):
+        raise socket.timeout("timed out")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(socket.socket, "connect", busy)
+        assert run_in_daemon("pre-commit", socket_path) is None
+    request({"command": "stop"}, socket_path)
+    thread.join(5)
+
+
+def test_one_daemon_per_socket(socket_path):
+    thread = start_daemon(socket_path)
+    with pytest.raises(RuntimeError, match="already running"):
+        serve(socket_path)
+    request({"command": "stop"}, socket_path)
+    thread.join(5)
+
+
+def test_idle_shutdown(socket_path):
+    thread = start_daemon(socket_path, idle_timeout=0.1)
+    thread.join(5)
+    assert not thread.is_alive()
+    assert thread.served == 0
+    assert not os.path.exists(socket_path)
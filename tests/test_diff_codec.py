@@ -0,0 +1,45 @@
+import pytest
+
+from assistant.diff_codec import CODEC_ZLIB, decode_diff, encode_diff
+from assistant.setup_db import compress_diffs
+from assistant.store import CommitStore
+from tests.conftest import create_legacy_db
+
+DIFF = "diff --git a/f b/f\n" + "+added line of code\n" * 200
+
+
+def test_encode_roundtrip():
+    data, codec = encode_diff(DIFF)
+    assert codec == CODEC_ZLIB
+    assert len(data) < len(DIFF) / 5
+    assert decode_diff(data, codec) == DIFF
+
+
+def test_small_diffs_stay_plain():
+    assert encode_diff("+x") == ("+x", None)
+    assert encode_diff(None) == (None, None)
+    assert decode_diff("+x", None) == "+x"
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        decode_diff(b"", "lz4")
+
+
+def test_compress_diffs_migrates_old_rows(tmp_path):
+    """Diffs from a pre-compression database are compressed in batches"""
+    db_path = str(tmp_path / "commits.db")
+    diffs = [f"{DIFF}+line {i}\n" for i in range(7)] + ["+x", None]
+    create_legacy_db(
+        db_path, [(1.0, "msg", "acme/widgets", diff, 1) for diff in diffs]
+    )
+
+    rows, before, after = compress_diffs(db_path, batch_size=3)
+    assert rows == 7
+    assert after < before
+
+    with CommitStore(db_path) as store:
+        stored = dict(store.read_diffs("commits.id", "commits.id IN (1, 8, 9)"))
+    assert stored == {1: diffs[0], 8: "+x", 9: None}
+
+    assert compress_diffs(db_path)[0] == 0
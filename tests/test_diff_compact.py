@@ -0,0 +1,67 @@
+from assistant.diff_compact import (
+    cap_context,
+    compact_diff,
+    estimate_tokens,
+    skip_reason,
+    split_files,
+)
+
+
+def file_diff(path, added, context=0):
+    lines = [
+        f"diff --git a/{path} b/{path}",
+        f"--- a/{path}",
+        f"+++ b/{path}",
+        f"@@ -1,{context} +1,{context + added} @@",
+    ]
+    lines += [f" unchanged {i}" for i in range(context)]
+    lines += [f"+{path} line {i}" for i in range(added)]
+    return "\n".join(lines)
+
+
+BINARY = "diff --git a/logo.png b/logo.png\nnew file mode 100644\nBinary files /dev/null and b/logo.png differ"
+
+
+def test_lockfiles_and_binaries_keep_only_stats():
+    diff = "\n".join([file_diff("src/app.py", 3), file_diff("yarn.lock", 500), BINARY])
+    compacted, report = compact_diff(diff)
+
+    assert "src/app.py | +3 -0" in compacted
+    assert "yarn.lock | +500 -0 (lockfile, content omitted)" in compacted
+    assert "logo.png | +0 -0 (binary, content omitted)" in compacted
+    assert "+yarn.lock line" not in compacted
+    assert "+src/app.py line 2" in compacted
+    assert dict(report.skipped_files) == {"yarn.lock": "lockfile", "logo.png": "binary"}
+
+
+def test_generated_directories_match_at_any_depth():
+    assert skip_reason("dist/app.js", []) == "generated"
+    assert skip_reason("web/dist/app.js", []) == "generated"
+    assert skip_reason("web/node_modules/left-pad/index.js", []) == "generated"
+    assert skip_reason("web/distance.js", []) == ""
+
+
+def test_budget_is_respected_and_high_churn_first():
+    diff = "\n".join(
+        [file_diff("small.py", 5), file_diff("big.py", 2000), file_diff("mid.py", 50)]
+    )
+    compacted, report = compact_diff(diff, token_budget=1000)
+
+    assert estimate_tokens(compacted) <= 1000 + 10
+    assert "+big.py line 0" in compacted
+    assert "+mid.py line 0" not in compacted
+    assert report.truncated_files == ["big.py", "mid.py", "small.py"]
+    assert "small.py | +5 -0" in compacted
+    assert "Diff compacted:" in report.summary()
+
+
+def test_context_lines_are_capped():
+    lines = ["@@ -1,8 +1,8 @@"] + [f" ctx {i}" for i in range(6)] + ["-old", "+new", " after"]
+    assert cap_context(lines, max_context=2) == [
+        "@@ -1,8 +1,8 @@", " ...", " ctx 4", " ctx 5", "-old", "+new", " after",
+    ]
+
+
+def test_split_files_counts_churn():
+    (f,) = split_files(file_diff("a.py", 4, context=2))
+    assert (f.path, f.added, f.removed, f.skip_reason) == ("a.py", 4, 0, "")
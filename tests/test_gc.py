@@ -0,0 +1,143 @@
+import os
+import sqlite3
+
+from assistant.gc import (
+    AUTO_VACUUM_INCREMENTAL,
+    RetentionPolicy,
+    collect,
+    diff_bytes,
+    load_policy,
+)
+from assistant.pre_commit import save_to_database
+from assistant.search import search_commits
+from assistant.store import open_store
+from tests.conftest import create_legacy_db
+
+DAY = 86400
+NOW = 1_700_000_000.0
+
+
+def add_commit(db_path, age_days, repo_name, token, diff_size=4000):
+    # Random bytes as hex do not compress much, so each diff keeps its size
+    diff = "+" + os.urandom(diff_size // 2).hex()
+    save_to_database(
+        f"commit {token}", "Test", "t@example.com", NOW - age_days * DAY, "",
+        repo_name, "main", diff, 1, 0, commit_token=token, db_path=db_path,
+    )
+
+
+def diffs(db_path):
+    return [
+        token
+        for (token,) in open_store(db_path).query(
+            "SELECT commit_token FROM commits WHERE diff_hash IS NOT NULL ORDER BY id"
+        )
+    ]
+
+
+def test_drops_diffs_older_than_max_age(tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    for age in range(10):
+        add_commit(db_path, age, "acme/widgets", f"d{age}")
+
+    report = collect(RetentionPolicy(diff_max_age_days=4.5), db_path, NOW, batch_size=2)
+    assert report.dropped_by_age == 5
+    assert diffs(db_path) == ["d0", "d1", "d2", "d3", "d4"]
+    # Metadata and messages stay
+    count = open_store(db_path).query_one("SELECT COUNT(*) FROM commits")[0]
+    assert count == 10
+
+
+def test_keeps_newest_diffs_per_repo(tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    for age in range(4):
+        add_commit(db_path, age, "acme/widgets", f"w{age}")
+        add_commit(db_path, age, "acme/gadgets", f"g{age}")
+
+    report = collect(RetentionPolicy(keep_diffs_per_repo=2), db_path, NOW, batch_size=1)
+    assert report.dropped_by_repo == 4
+    assert sorted(diffs(db_path)) == ["g0", "g1", "w0", "w1"]
+
+
+def test_caps_total_diff_size_and_frees_pages(tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    for age in range(20):
+        add_commit(db_path, age, "acme/widgets", f"d{age}", diff_size=8000)
+    store = open_store(db_path)
+    assert store.query_one("PRAGMA auto_vacuum")[0] == AUTO_VACUUM_INCREMENTAL
+    size_before = os.path.getsize(db_path) + os.path.getsize(db_path + "-wal")
+
+    report = collect(RetentionPolicy(max_diff_mb=40000 / 2**20), db_path, NOW)
+    assert diff_bytes(store) <= 40000
+    # Only as many as needed went, oldest first
+    kept = 20 - report.dropped_by_size
+    assert diffs(db_path) == [f"d{age}" for age in range(kept)]
+    one_diff_size = store.query_one(
+        """
+        SELECT length(diff_blobs.code_diff)
+        FROM commits JOIN diff_blobs ON diff_blobs.hash = commits.diff_hash
+        WHERE commit_token = 'd0'
+        """
+    )[0]
+    assert diff_bytes(store) + one_diff_size > 40000
+    assert report.pages_freed > 0
+    store.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    assert os.path.getsize(db_path) < size_before
+
+
+def test_shared_diff_is_freed_with_its_last_commit(tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    diff = "+" + os.urandom(2000).hex()
+    for age, token in [(9, "original"), (1, "cherry-pick")]:
+        save_to_database(
+            token, "Test", "t@example.com", NOW - age * DAY, "", "acme/widgets",
+            "main", diff, 1, 0, commit_token=token, db_path=db_path,
+        )
+    store = open_store(db_path)
+    # One compressed copy: hex text shrinks to about half, not less
+    assert 2000 < diff_bytes(store) < 4000
+
+    # Dropping the older commit's diff frees nothing, so the budget needs both
+    report = collect(RetentionPolicy(max_diff_mb=1000 / 2**20), db_path, NOW)
+    assert report.dropped_by_size == 2
+    assert diff_bytes(store) == 0
+
+    add_commit(db_path, 9, "acme/widgets", "old")
+    collect(RetentionPolicy(diff_max_age_days=5), db_path, NOW)
+    assert store.query_one("SELECT COUNT(*) FROM diff_blobs") == (0,)
+
+
+def test_index_is_rebuilt_after_other_clients_delete_commits(tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    add_commit(db_path, 9, "acme/widgets", "gone")
+    add_commit(db_path, 9, "acme/widgets", "kept")
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("DELETE FROM commits WHERE commit_token = 'gone'")
+    conn.close()
+
+    report = collect(RetentionPolicy(diff_max_age_days=5), db_path, NOW)
+    assert report.index_rebuilt
+    assert report.dropped_by_age == 1
+    store = open_store(db_path)
+    assert [hit.id for hit in search_commits(store, "commit")] == [2]
+    assert not collect(RetentionPolicy(), db_path, NOW).index_rebuilt
+
+
+def test_older_database_is_converted_to_incremental_vacuum(tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    create_legacy_db(db_path, [("1700000000", "first", "acme/widgets", "+a", 1)])
+    store = open_store(db_path)
+    assert store.query_one("PRAGMA auto_vacuum")[0] == 0
+
+    collect(RetentionPolicy(), db_path, NOW)
+    assert store.query_one("PRAGMA auto_vacuum")[0] == AUTO_VACUUM_INCREMENTAL
+
+
+def test_policy_from_config_and_arguments(monkeypatch):
+    monkeypatch.setenv("COAS_GC_DIFF_MAX_AGE_DAYS", "30")
+    monkeypatch.setenv("COAS_GC_KEEP_DIFFS_PER_REPO", "0")
+    monkeypatch.setenv("COAS_GC_MAX_DIFF_MB", "")
+    assert load_policy() == RetentionPolicy(30.0, 0, 0.0)
+    assert load_policy(keep_diffs_per_repo=5) == RetentionPolicy(30.0, 5, 0.0)
+    assert not RetentionPolicy().enabled
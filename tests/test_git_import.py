@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import subprocess
+
+from assistant.git_import import LOG_FORMAT, import_repos, parse_log
+from assistant.pre_commit import save_to_database
+from tests.conftest import git
+
+
+def commit(repo, name, content, message, date=None):
+    (repo / name).write_text(content)
+    git(repo, "add", name)
+    env = dict(os.environ)
+    if date:
+        env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = date
+    subprocess.check_call(
+        ["git", "-c", "commit.gpgsign=false", "commit", "-q", "--no-verify", "-m", message],
+        cwd=repo,
+        env=env,
+    )
+
+
+def commits(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT repo_name, commit_message, added_lines, removed_lines, branch_name "
+        "FROM commits ORDER BY timestamp, id"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def test_parse_log():
+    output = (
+        "\0abc\x1f1700000000\x1fTest\x1ft@example.com\x1ffeat: one\n\nbody\n\x1e\n"
+        "3\t1\ta.py\n-\t-\tlogo.png\n"
+        "\0def\x1f1700000100\x1fTest\x1ft@example.com\x1ffix: two\n\x1e\n"
+    )
+    rows = parse_log(output, "url", "acme/widgets", "main")
+    assert [(r[3], r[8], r[9], r[10]) for r in rows] == [
+        ("feat: one\n\nbody", 3, 1, "git:abc"),
+        ("fix: two", 0, 0, "git:def"),
+    ]
+    assert "%B" in LOG_FORMAT
+
+
+def test_import_is_incremental(git_repo, tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    commit(git_repo, "a.txt", "one\ntwo\n", "feat: first")
+    commit(git_repo, "a.txt", "one\n", "fix: second")
+
+    assert import_repos([str(git_repo)], db_path) == [("acme/widgets", 2)]
+    assert commits(db_path) == [
+        ("acme/widgets", "feat: first", 2, 0, "main"),
+        ("acme/widgets", "fix: second", 0, 1, "main"),
+    ]
+
+    # Nothing new: nothing read, nothing inserted
+    assert import_repos([str(git_repo / "sub" / "..")], db_path) == [("acme/widgets", 0)]
+
+    commit(git_repo, "b.txt", "three\n", "feat: third")
+    assert import_repos([str(git_repo)], db_path) == [("acme/widgets", 1)]
+    assert len(commits(db_path)) == 3
+
+
+def test_rewritten_history_is_reimported_without_duplicates(git_repo, tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    commit(git_repo, "a.txt", "one\n", "feat: first")
+    commit(git_repo, "a.txt", "two\n", "wip")
+    import_repos([str(git_repo)], db_path)
+
+    git(git_repo, "reset", "-q", "--hard", "HEAD~1")
+    commit(git_repo, "a.txt", "three\n", "feat: second")
+    assert import_repos([str(git_repo)], db_path) == [("acme/widgets", 1)]
+    assert len(commits(db_path)) == 3
+
+
+def test_commits_recorded_by_hooks_are_skipped(git_repo, tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    commit(git_repo, "a.txt", "one\n", "feat: before hooks", "2024-03-01T10:00:00")
+    commit(git_repo, "a.txt", "two\n", "feat: with hooks", "2024-03-05T10:00:00")
+    save_to_database(
+        "feat: with hooks", "Test User", "test@example.com",
+        git(git_repo, "log", "-1", "--format=%ct"), "", "acme/widgets", "main",
+        None, 1, 1, commit_token="hook", db_path=db_path,
+    )
+
+    assert import_repos([str(git_repo)], db_path) == [("acme/widgets", 1)]
+    assert [row[1] for row in commits(db_path)] == [
+        "feat: before hooks",
+        "feat: with hooks",
+    ]
+
+
+def test_repos_are_imported_in_parallel(git_repo, tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    other = tmp_path / "other"
+    other.mkdir()
+    git(other, "init", "-q", "-b", "dev")
+    git(other, "config", "user.name", "Test User")
+    git(other, "config", "user.email", "test@example.com")
+    commit(git_repo, "a.txt", "one\n", "feat: widgets")
+    commit(other, "a.txt", "one\n", "feat: other")
+
+    results = import_repos([str(git_repo), str(other)], db_path, max_workers=2)
+    assert results == [("acme/widgets", 1), ("other", 1)]
+    assert ("other", "feat: other", 1, 0, "dev") in commits(db_path)
@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pytest
+
+from assistant import llm
+from assistant.llm import (
+    DeadlineExceeded,
+    FakeClient,
+    LLMClient,
+    LLMError,
+    Scheduler,
+    TokenBucket,
+)
+from assistant.map_reduce import run_map
+
+
+def fast_backoff(delay):
+    time.sleep(delay / 50)
+
+
+def test_backend_must_implement_streaming():
+    class Incomplete(LLMClient):
+        def generate(self, prompt, model=llm.DEFAULT_MODEL):
+            return ""
+
+    with pytest.raises(TypeError, match="generate_stream"):
+        Incomplete()
+
+
+def test_concurrency_cap_keeps_within_quota():
+    backend = FakeClient(first_chunk_delay=0.05, max_concurrent=2)
+    scheduler = Scheduler(backend, requests_per_minute=6000, max_concurrency=2)
+
+    results = run_map([f"prompt {i}" for i in range(8)], scheduler, max_workers=8)
+
+    assert results == [backend.response] * 8
+    assert backend.peak_concurrency == 2
+    assert backend.rejected == 0
+
+
+def test_throttled_calls_are_retried():
+    backend = FakeClient(first_chunk_delay=0.05, max_concurrent=2)
+    scheduler = Scheduler(
+        backend,
+        requests_per_minute=6000,
+        max_concurrency=6,
+        max_retries=20,
+        sleep=fast_backoff,
+    )
+
+    results = run_map([f"prompt {i}" for i in range(6)], scheduler, max_workers=6)
+
+    assert results == [backend.response] * 6
+    assert backend.rejected > 0
+    assert scheduler.retries == backend.rejected
+
+
+def test_errors_that_retrying_cannot_fix_are_raised_at_once():
+    class BrokenClient(FakeClient):
+        def respond(self, prompt):
+            raise LLMError("API key not valid", code=400)
+
+    backend = BrokenClient()
+    scheduler = Scheduler(backend, sleep=fast_backoff)
+    with pytest.raises(LLMError, match="API key"):
+        scheduler.generate("prompt")
+    assert len(backend.prompts) == 1
+
+
+def test_deadline():
+    scheduler = Scheduler(FakeClient(first_chunk_delay=2.0), deadline=0.1)
+    start = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        scheduler.generate("prompt")
+    assert time.perf_counter() - start < 1.0
+
+
+def test_identical_prompts_in_flight_share_one_request():
+    backend = FakeClient(first_chunk_delay=0.1)
+    scheduler = Scheduler(backend)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(scheduler.generate("same")))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [backend.response] * 5
+    assert backend.prompts == ["same"]
+    # Finished requests are not reused
+    scheduler.generate("same")
+    assert len(backend.prompts) == 2
+
+
+def test_stream_is_retried_until_the_first_chunk():
+    class FlakyClient(FakeClient):
+        failures = 2
+
+        def respond(self, prompt):
+            if self.failures:
+                self.failures -= 1
+                raise LLMError("The model is overloaded", code=503)
+            return self.response
+
+    backend = FlakyClient("feat: add widgets", chunk_size=4)
+    scheduler = Scheduler(backend, sleep=fast_backoff)
+    assert "".join(scheduler.generate_stream("prompt")) == "feat: add widgets"
+    assert scheduler.retries == 2
+
+
+def test_token_bucket_rate():
+    bucket = TokenBucket(rate=50, burst=1)
+    start = time.perf_counter()
+    for _ in range(6):
+        bucket.acquire(time.monotonic() + 5)
+    assert time.perf_counter() - start >= 0.09
+
+    # The next token is ten seconds away
+    slow = TokenBucket(rate=0.1, burst=1)
+    slow.acquire(time.monotonic() + 0.1)
+    with pytest.raises(DeadlineExceeded):
+        slow.acquire(time.monotonic() + 0.1)
+
+
+def test_one_commands_fan_out_is_not_rate_limited():
+    backend = FakeClient()
+    scheduler = Scheduler(backend, requests_per_minute=60, deadline=0.5)
+    prompts = [f"chunk {i}" for i in range(40)]
+    assert run_map(prompts, scheduler, max_workers=4) == [backend.response] * 40
+    # ...but sustained use is held to the rate
+    with pytest.raises(DeadlineExceeded):
+        run_map([f"more {i}" for i in range(30)], scheduler, max_workers=4)
+
+
+def test_scheduler_settings_are_validated(monkeypatch):
+    monkeypatch.setenv("COAS_GEMINI_REQUESTS_PER_MINUTE", "0")
+    with pytest.raises(SystemExit, match="requests_per_minute must be positive"):
+        llm.scheduler_settings()
+
+
+def test_commands_share_one_scheduler():
+    backend = FakeClient()
+    llm.set_client(backend)
+    try:
+        assert llm.get_client() is llm.get_client()
+        assert llm.get_client().backend is backend
+    finally:
+        llm.set_client(None)
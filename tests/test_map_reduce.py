@@ -0,0 +1,66 @@
+import time
+
+from assistant import llm
+from assistant.diff_compact import chunk_diff, estimate_tokens
+from assistant.llm import FakeClient
+from assistant.map_reduce import run_map
+from assistant.prepare_commit_msg import build_commit_prompt
+from tests.test_diff_compact import file_diff
+
+
+class EchoClient(FakeClient):
+    """Answers with the first changed file of each prompt"""
+
+    def respond(self, prompt):
+        for line in prompt.splitlines():
+            if line.strip().startswith("diff --git"):
+                return "summary of " + line.split(" b/")[-1]
+        return "feat: reduce"
+
+
+def test_run_map_is_concurrent_and_ordered():
+    client = EchoClient(first_chunk_delay=0.2)
+    prompts = [f"diff --git a/f{i} b/f{i}" for i in range(6)]
+
+    start = time.perf_counter()
+    results = run_map(prompts, client=client, max_workers=6)
+    elapsed = time.perf_counter() - start
+
+    assert results == [f"summary of f{i}" for i in range(6)]
+    assert elapsed < 0.6
+
+
+def test_chunk_diff_groups_by_directory():
+    diff = "\n".join(
+        [
+            file_diff("api/a.py", 10),
+            file_diff("api/b.py", 10),
+            file_diff("web/c.py", 10),
+            file_diff("huge/d.py", 3000),
+            file_diff("yarn.lock", 100),
+        ]
+    )
+    chunks = chunk_diff(diff, chunk_budget=500)
+
+    assert len(chunks) == 3
+    assert "+api/a.py" in chunks[0] and "+api/b.py" in chunks[0]
+    assert "+huge/d.py" in chunks[1] and "(truncated)" in chunks[1]
+    assert "+web/c.py" in chunks[2]
+    assert all(estimate_tokens(chunk) <= 510 for chunk in chunks)
+    assert not any("+yarn.lock" in chunk for chunk in chunks)
+
+
+def test_large_commit_prompt_combines_chunk_summaries():
+    diff = "\n".join(file_diff(f"pkg{i}/mod.py", 400) for i in range(5))
+    client = EchoClient()
+    llm.set_client(client)
+    try:
+        prompt = build_commit_prompt(diff, token_budget=1000, max_workers=3)
+    finally:
+        llm.set_client(None)
+
+    assert len(client.prompts) == 5
+    for i in range(5):
+        assert f"summary of pkg{i}/mod.py" in prompt
+        assert f"pkg{i}/mod.py | +400 -0" in prompt
+    assert "+pkg0/mod.py line" not in prompt
@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+from assistant import llm, prepare_commit_msg
+from assistant.llm import FakeClient
+from assistant.message_cache import MessageCache, cache_key
+from tests.conftest import git
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = MessageCache(str(tmp_path / "cache.db"))
+    yield cache
+    cache.close()
+
+
+def test_put_and_get(cache):
+    key = cache_key("tree", "head", "model", "prompt")
+    assert cache.get(key) is None
+    cache.put(key, "feat: add widgets")
+    assert cache.get(key) == "feat: add widgets"
+    assert cache_key("tree", "other-head", "model", "prompt") != key
+
+
+def test_expired_entries_are_misses(cache):
+    cache.max_age = 60
+    cache.put("k", "msg")
+    cache.conn.execute("UPDATE messages SET created = ?", (time.time() - 120,))
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    cache.max_bytes = 10
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    time.sleep(0.01)
+    cache.get("a")
+    cache.put("c", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
+
+
+def test_repeat_commit_uses_cache(git_repo, tmp_path, monkeypatch):
+    """A second run on identical staged content makes no model call"""
+    client = FakeClient("feat: add widgets")
+    llm.set_client(client)
+    monkeypatch.setattr(
+        prepare_commit_msg,
+        "MessageCache",
+        lambda: MessageCache(str(tmp_path / "cache.db")),
+    )
+    monkeypatch.setattr("builtins.input", lambda prompt: "n")
+    (git_repo / "widget.py").write_text("print('widget')\n")
+    git(git_repo, "add", "widget.py")
+
+    try:
+        prepare_commit_msg.prepare_commit_msg()
+        prepare_commit_msg.prepare_commit_msg()
+        assert len(client.prompts) == 1
+
+        prepare_commit_msg.prepare_commit_msg(use_cache=False)
+        assert len(client.prompts) == 2
+    finally:
+        llm.set_client(None)
+
+
+def test_conflicted_merge_skips_cache(git_repo, tmp_path, monkeypatch):
+    """With unmerged entries there is no tree to key by; generate anyway"""
+    client = FakeClient("fix: resolve widget conflict")
+    llm.set_client(client)
+    monkeypatch.setattr(
+        prepare_commit_msg,
+        "MessageCache",
+        lambda: MessageCache(str(tmp_path / "cache.db")),
+    )
+    monkeypatch.setattr("builtins.input", lambda prompt: "n")
+    widget = git_repo / "widget.py"
+    widget.write_text("base\n")
+    git(git_repo, "add", "widget.py")
+    git(git_repo, "commit", "-q", "--no-verify", "-m", "base")
+    git(git_repo, "checkout", "-q", "-b", "other")
+    widget.write_text("other\n")
+    git(git_repo, "commit", "-q", "--no-verify", "-am", "other")
+    git(git_repo, "checkout", "-q", "main")
+    widget.write_text("main\n")
+    git(git_repo, "commit", "-q", "--no-verify", "-am", "main")
+    with pytest.raises(Exception):
+        git(git_repo, "merge", "-q", "other")
+
+    try:
+        assert prepare_commit_msg.get_staged_tree() is None
+        prepare_commit_msg.prepare_commit_msg()
+        prepare_commit_msg.prepare_commit_msg()
+        assert len(client.prompts) == 2
+    finally:
+        llm.set_client(None)
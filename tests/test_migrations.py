@@ -0,0 +1,92 @@
+import sqlite3
+
+import pytest
+
+from assistant.diff_codec import register_functions
+from assistant.migrations import SCHEMA_VERSION, get_version, migrate
+from assistant.store import CommitStore
+from tests.conftest import create_legacy_db
+
+
+def test_fresh_database(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "commits.db"))
+    assert migrate(conn) == 0
+    assert get_version(conn) == SCHEMA_VERSION
+    assert migrate(conn) == SCHEMA_VERSION
+
+
+def test_legacy_database_upgrades_in_place(tmp_path):
+    """TEXT timestamps become REAL, rows and ids survive, indexes exist"""
+    db_path = str(tmp_path / "commits.db")
+    create_legacy_db(
+        db_path,
+        [
+            ("1700000000.5", "first", "acme/widgets", "+a", 1),
+            ("1700003600.25", "second", "acme/gadgets", None, 2),
+        ],
+    )
+
+    conn = sqlite3.connect(db_path)
+    assert migrate(conn) == 0
+    rows = conn.execute(
+        "SELECT id, typeof(timestamp), timestamp, commit_message FROM commits"
+    ).fetchall()
+    assert rows == [(1, "real", 1700000000.5, "first"), (2, "real", 1700003600.25, "second")]
+
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM commits WHERE timestamp >= ? AND timestamp <= ?",
+        (0.0, 1.0),
+    ).fetchall()
+    assert "idx_commits_timestamp" in str(plan)
+
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM commits WHERE repo_name = ? AND timestamp >= ?",
+        ("acme/widgets", 0.0),
+    ).fetchall()
+    assert "idx_commits_repo_timestamp" in str(plan)
+
+    # New ids keep counting after the migrated rows
+    conn.execute(
+        "INSERT INTO commits (timestamp, author_name, author_email, commit_message, "
+        "repo_url, repo_name, branch_name) VALUES (1, '', '', '', '', '', '')"
+    )
+    assert conn.execute("SELECT MAX(id) FROM commits").fetchone()[0] == 3
+
+
+def test_existing_diffs_move_to_shared_blobs(tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    create_legacy_db(
+        db_path,
+        [
+            ("1700000000", "first", "acme/widgets", "+a", 1),
+            ("1700000001", "amended", "acme/widgets", "+a", 1),
+            ("1700000002", "other", "acme/widgets", "+b", 1),
+            ("1700000003", "empty", "acme/widgets", None, 0),
+        ],
+    )
+
+    conn = sqlite3.connect(db_path)
+    register_functions(conn)
+    migrate(conn)
+    assert conn.execute(
+        "SELECT refcount FROM diff_blobs ORDER BY refcount"
+    ).fetchall() == [(1,), (2,)]
+    with CommitStore(db_path) as store:
+        assert store.read_diffs("commits.id", "1 ORDER BY commits.id") == [
+            (1, "+a"), (2, "+a"), (3, "+b"), (4, None)
+        ]
+    assert conn.execute(
+        "SELECT COUNT(*) FROM commits WHERE code_diff IS NOT NULL"
+    ).fetchone() == (0,)
+    # The full-text index reads the diffs through the blobs
+    assert conn.execute(
+        "SELECT rowid FROM commits_fts WHERE commits_fts MATCH 'b' ORDER BY rowid"
+    ).fetchall() == [(3,)]
+
+
+def test_newer_schema_is_rejected(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "commits.db"))
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    with pytest.raises(RuntimeError):
+        migrate(conn)
+
@@ -0,0 +1,59 @@
+import multiprocessing
+import os
+
+from assistant.migrations import migrate
+from assistant.post_commit import insert_commit_message, read_commit_token
+from assistant.pre_commit import save_to_database
+from assistant.repo_info import commit_token_path
+from assistant.store import connect
+
+WORKERS = 8
+COMMITS_PER_WORKER = 25
+
+
+def _commit_worker(db_path, worker):
+    """Simulate the pre-commit/post-commit pair of many commits in one repo"""
+    for i in range(COMMITS_PER_WORKER):
+        token = f"{worker}-{i}-{os.getpid()}"
+        save_to_database(
+            "", "Test", "t@example.com", 1.0 + i, "", f"repo{worker}", "main",
+            f"+change {i}", i, 0, commit_token=token, db_path=db_path,
+        )
+        assert insert_commit_message(f"{worker}:{i}", token, db_path=db_path)
+
+
+def test_concurrent_commits_keep_their_messages(tmp_path):
+    """Parallel hooks never attach a message to another commit's row"""
+    db_path = str(tmp_path / "commits.db")
+    conn = connect(db_path)
+    migrate(conn)
+    conn.close()
+
+    ctx = multiprocessing.get_context("fork")
+    workers = [
+        ctx.Process(target=_commit_worker, args=(db_path, w)) for w in range(WORKERS)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    assert all(process.exitcode == 0 for process in workers)
+
+    conn = connect(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    rows = conn.execute(
+        "SELECT repo_name, added_lines, commit_message FROM commits"
+    ).fetchall()
+    conn.close()
+
+    assert len(rows) == WORKERS * COMMITS_PER_WORKER
+    for repo_name, added_lines, commit_message in rows:
+        assert commit_message == f"{repo_name[len('repo'):]}:{added_lines}"
+
+
+def test_commit_token_handoff(git_repo):
+    """post-commit consumes the token file written for it exactly once"""
+    with open(commit_token_path(), "w") as f:
+        f.write("abc123")
+    assert read_commit_token() == "abc123"
+    assert read_commit_token() is None
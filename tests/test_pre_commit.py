@@ -0,0 +1,49 @@
+import tracemalloc
+
+from assistant.pre_commit import get_code_diff
+from tests.conftest import git
+
+
+def test_get_code_diff_counts(git_repo):
+    """Counts come from numstat and binary files are skipped"""
+    (git_repo / "a.txt").write_text("one\ntwo\n")
+    git(git_repo, "add", "a.txt")
+    git(git_repo, "commit", "-qm", "init")
+
+    (git_repo / "a.txt").write_text("one\nthree\nfour\n")
+    (git_repo / "blob.bin").write_bytes(b"\x00\x01\x02")
+    git(git_repo, "add", ".")
+
+    diff, added, removed = get_code_diff()
+    assert (added, removed) == (2, 1)
+    assert diff.startswith("diff --git")
+    assert "+three" in diff
+    assert "truncated" not in diff
+
+
+def test_get_code_diff_is_bounded(git_repo):
+    """Large diffs are truncated while the counts stay exact"""
+    lines = 200_000
+    (git_repo / "big.txt").write_text(("y" * 40 + "\n") * lines)
+    (git_repo / "long.min.js").write_text("z" * 100_000 + "\n")
+    git(git_repo, "add", ".")
+
+    tracemalloc.start()
+    diff, added, removed = get_code_diff(max_lines=100)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert (added, removed) == (lines + 1, 0)
+    assert len(diff.splitlines()) <= 102
+    assert diff.endswith("(diff truncated at 100 lines)")
+    assert peak < 1024 * 1024
+
+
+def test_get_code_diff_caps_long_lines(git_repo):
+    (git_repo / "long.min.js").write_text("z" * 100_000 + "\nnext\n")
+    git(git_repo, "add", ".")
+
+    diff, added, _ = get_code_diff()
+    assert added == 2
+    assert max(len(line) for line in diff.splitlines()) <= 4096
+    assert "+next" in diff
@@ -0,0 +1,54 @@
+import io
+
+import pytest
+
+from assistant import llm
+from assistant.llm import FakeClient
+from assistant.prepare_commit_msg import (
+    build_prompt,
+    generate_commit_message,
+    stream_response,
+)
+
+
+@pytest.fixture
+def fake_client():
+    client = FakeClient(
+        "feat: add widgets\n\nAdd the widget factory.",
+        chunk_size=5,
+        first_chunk_delay=0.05,
+        chunk_delay=0.01,
+    )
+    llm.set_client(client)
+    yield client
+    llm.set_client(None)
+
+
+def test_stream_response(fake_client):
+    """Chunks are written as they arrive and latencies are reported"""
+    out = io.StringIO()
+    message, first_token, total = stream_response(build_prompt("+widget"), out=out)
+
+    assert message == fake_client.response
+    assert out.getvalue() == fake_client.response + "\n"
+    assert 0.05 <= first_token < total
+    assert "+widget" in fake_client.prompts[0]
+
+
+def test_generate_commit_message(fake_client):
+    assert generate_commit_message("+widget") == fake_client.response
+    assert generate_commit_message("") is None
+
+
+def test_stream_reports_backend_errors(capsys):
+    class FailingClient(FakeClient):
+        def respond(self, prompt):
+            raise RuntimeError("quota exceeded")
+
+    llm.set_client(FailingClient())
+    try:
+        message, _, _ = stream_response(build_prompt("+widget"), out=io.StringIO())
+    finally:
+        llm.set_client(None)
+    assert message is None
+    assert "quota exceeded" in capsys.readouterr().out
@@ -0,0 +1,80 @@
+import json
+import os
+import subprocess
+
+import pytest
+
+from assistant import repo_info
+from assistant.repo_info import find_git_dir, get_repo_info, parse_repo_name
+from tests.conftest import git
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("git@github.com:acme/widgets.git", "acme/widgets"),
+        ("https://github.com/acme/widgets.git", "acme/widgets"),
+        ("https://gitlab.com/group/sub/widgets", "sub/widgets"),
+        ("ssh://git@host:2222/acme/my.github.io.git", "acme/my.github.io"),
+        ("widgets", "widgets"),
+    ],
+)
+def test_parse_repo_name(url, expected):
+    assert parse_repo_name(url) == expected
+
+
+def test_get_repo_info(git_repo, tmp_path):
+    """Identity, remote and branch are collected"""
+    info = get_repo_info(cache_path=str(tmp_path / "cache.json"))
+    assert info.author_name == "Test User"
+    assert info.author_email == "test@example.com"
+    assert info.repo_url == "git@github.com:acme/widgets.git"
+    assert info.repo_name == "acme/widgets"
+    assert info.branch == "main"
+
+
+def test_branch_and_worktree(git_repo, tmp_path):
+    """Branches are read from HEAD, including in linked worktrees"""
+    (git_repo / "f").write_text("x")
+    git(git_repo, "add", "f")
+    git(git_repo, "commit", "-qm", "init")
+    git(git_repo, "worktree", "add", "-q", "-b", "feature/x", str(tmp_path / "wt"))
+
+    git_dir, common_dir, work_tree = find_git_dir(str(tmp_path / "wt"))
+    assert common_dir == str(git_repo / ".git")
+    assert work_tree == str(tmp_path / "wt")
+    assert repo_info.read_branch(git_dir) == "feature/x"
+
+
+def test_cache_skips_git_until_config_changes(git_repo, tmp_path, monkeypatch):
+    """A fresh cache entry needs no git process; touching the config invalidates it"""
+    cache_path = str(tmp_path / "cache.json")
+    get_repo_info(cache_path=cache_path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("git should not be spawned")
+
+    monkeypatch.setattr(subprocess, "run", fail)
+    assert get_repo_info(cache_path=cache_path).repo_name == "acme/widgets"
+
+    monkeypatch.undo()
+    monkeypatch.chdir(git_repo)
+    git(git_repo, "remote", "set-url", "origin", "https://github.com/acme/gadgets")
+    config_path = git_repo / ".git" / "config"
+    stat = os.stat(config_path)
+    os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert get_repo_info(cache_path=cache_path).repo_name == "acme/gadgets"
+
+
+def test_missing_remote_uses_directory_name(git_repo, tmp_path):
+    git(git_repo, "remote", "remove", "origin")
+    info = get_repo_info(cache_path=str(tmp_path / "cache.json"))
+    assert info.repo_url == ""
+    assert info.repo_name == "repo"
+
+
+def test_cache_drops_deleted_repositories(git_repo, tmp_path):
+    cache_path = tmp_path / "cache.json"
+    cache_path.write_text(json.dumps({str(tmp_path / "gone" / ".git"): {}}))
+    get_repo_info(cache_path=str(cache_path))
+    assert list(json.loads(cache_path.read_text())) == [str(git_repo / ".git")]
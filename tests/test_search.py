@@ -0,0 +1,140 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from assistant.cli_args import parse_args
+from assistant.pre_commit import save_to_database
+from assistant.search import HIGHLIGHT_START, search_commits
+from assistant.setup_db import compress_diffs
+from assistant.store import CommitStore
+
+MONDAY = datetime(2024, 3, 4, 10, 0).timestamp()
+TUESDAY = datetime(2024, 3, 5, 10, 0).timestamp()
+
+
+def add_commit(db_path, timestamp, repo_name, message, diff=""):
+    save_to_database(
+        message, "Test", "t@example.com", timestamp, "", repo_name, "main",
+        diff, 1, 0, commit_token=f"{repo_name}-{timestamp}-{message}", db_path=db_path,
+    )
+
+
+@pytest.fixture
+def db(tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    store = CommitStore(db_path)
+    yield db_path, store
+    store.close()
+
+
+def test_finds_messages_and_compressed_diffs(db):
+    db_path, store = db
+    add_commit(db_path, MONDAY, "acme/widgets", "fix: race in the spool flusher")
+    # Long enough to be stored compressed
+    add_commit(
+        db_path, TUESDAY, "acme/gadgets", "refactor: tidy up",
+        "+def rotate_spool():\n" + "+    pass\n" * 20,
+    )
+
+    hits = search_commits(store, "race")
+    assert [hit.repo_name for hit in hits] == ["acme/widgets"]
+    assert f"{HIGHLIGHT_START}race" in hits[0].message
+    assert hits[0].diff == ""
+
+    hits = search_commits(store, "rotate_spool")
+    assert [hit.repo_name for hit in hits] == ["acme/gadgets"]
+    assert HIGHLIGHT_START in hits[0].diff
+
+
+def test_message_matches_rank_first(db):
+    db_path, store = db
+    add_commit(db_path, MONDAY, "acme/widgets", "chore: deps", "+cache = {}\n")
+    add_commit(db_path, TUESDAY, "acme/widgets", "feat: add cache", "+x = 1\n")
+    assert [hit.message for hit in search_commits(store, "cache")][0].startswith(
+        "feat: add"
+    )
+
+
+def test_filters_by_repo_and_date(db):
+    db_path, store = db
+    add_commit(db_path, MONDAY, "acme/widgets", "fix: login")
+    add_commit(db_path, TUESDAY, "acme/gadgets", "fix: login")
+
+    assert len(search_commits(store, "login")) == 2
+    assert [h.repo_name for h in search_commits(store, "login", repos=["gadgets"])] == [
+        "acme/gadgets"
+    ]
+    assert [h.repo_name for h in search_commits(store, "login", TUESDAY)] == [
+        "acme/gadgets"
+    ]
+
+
+def test_index_follows_updates(db):
+    db_path, store = db
+    add_commit(db_path, MONDAY, "acme/widgets", "wip", "+" + "token " * 30)
+    store.update_messages([("feat: streaming", f"acme/widgets-{MONDAY}-wip")])
+    assert search_commits(store, "wip") == []
+    assert len(search_commits(store, "streaming")) == 1
+
+    # Re-encoding diffs keeps them searchable
+    with store.transaction() as conn:
+        conn.execute(
+            "UPDATE diff_blobs SET code_diff = ?, code_diff_codec = NULL",
+            ("+" + "token " * 30,),
+        )
+    compress_diffs(db_path, vacuum=False)
+    assert len(search_commits(store, "token")) == 1
+
+    # A dropped diff is no longer found, the message still is
+    store.drop_diffs([1])
+    assert search_commits(store, "token") == []
+    assert len(search_commits(store, "streaming")) == 1
+
+
+def test_other_clients_can_write_commits(db):
+    """Writing needs no function only coas registers"""
+    db_path, store = db
+    add_commit(db_path, MONDAY, "acme/widgets", "wip", "+" + "token " * 30)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE commits SET commit_message = 'feat: edited'")
+        conn.execute("UPDATE commits SET diff_hash = NULL")
+        conn.execute("DELETE FROM commits")
+    conn.close()
+    assert store.query_one("SELECT COUNT(*) FROM diff_blobs WHERE refcount > 0") == (0,)
+
+
+def test_reindex_picks_up_other_clients_changes(db):
+    db_path, store = db
+    add_commit(db_path, MONDAY, "acme/widgets", "fix: alpha")
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE commits SET commit_message = 'fix: gamma'")
+        conn.execute(
+            "INSERT INTO commits (timestamp, author_name, author_email, "
+            "commit_message, repo_url, repo_name, branch_name) "
+            f"VALUES ({TUESDAY}, 'Test', '', 'feat: delta', '', 'acme/widgets', 'main')"
+        )
+    conn.close()
+    assert store.index_drifted()
+    assert search_commits(store, "delta") == []
+
+    store.rebuild_index()
+    assert not store.index_drifted()
+    assert search_commits(store, "alpha") == []
+    assert [len(search_commits(store, word)) for word in ("gamma", "delta")] == [1, 1]
+
+
+def test_invalid_syntax_is_searched_as_words(db):
+    db_path, store = db
+    add_commit(db_path, MONDAY, "acme/widgets", "fix: handle (unbalanced input")
+    assert len(search_commits(store, "(unbalanced")) == 1
+
+
+def test_search_arguments():
+    args = parse_args(["search", "race", "condition", "--repo", "widgets"])
+    assert args.command == "search"
+    assert args.terms == ["race", "condition"]
+    assert args.repo == ["widgets"]
+    assert parse_args(["search", "--reindex"]).reindex
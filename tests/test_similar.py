@@ -0,0 +1,104 @@
+import pytest
+
+from assistant.pre_commit import save_to_database
+from assistant.prepare_commit_msg import build_prompt
+from assistant.similar import (
+    diff_features,
+    estimate_similarity,
+    few_shot_examples,
+    signature,
+    similar_commits,
+    update_index,
+)
+from assistant.store import CommitStore
+
+
+def file_diff(path, *lines):
+    body = "\n".join(lines)
+    return f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n@@ -1 +1 @@\n{body}"
+
+
+SPOOL_DIFF = file_diff(
+    "assistant/spool.py", " def flush():", "-    rotate_spool(spool_path)",
+    "+    rotate_spool(spool_path, keep_batches)",
+)
+WIDGET_DIFF = file_diff(
+    "web/widgets.js", "+export function renderWidget(widgetId) {", "+  return null",
+)
+
+
+def add_commit(db_path, repo_name, message, diff, token):
+    save_to_database(
+        message, "Test", "t@example.com", 1700000000.0, "", repo_name, "main",
+        diff, 1, 0, commit_token=token, db_path=db_path,
+    )
+
+
+@pytest.fixture
+def db(tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    store = CommitStore(db_path)
+    yield db_path, store
+    store.close()
+
+
+def test_features_are_paths_and_changed_identifiers():
+    assert diff_features(SPOOL_DIFF) == {
+        "path:assistant/spool.py",
+        "dir:assistant",
+        "ext:.py",
+        "id:rotate_spool",
+        "id:spool_path",
+        "id:keep_batches",
+    }
+
+
+def test_similarity_estimate():
+    a = signature({f"id:name{i}" for i in range(10)})
+    b = signature({f"id:name{i}" for i in range(5, 15)})
+    assert estimate_similarity(a, a) == 1.0
+    assert estimate_similarity(a, b) == pytest.approx(5 / 15)
+    assert estimate_similarity(a, signature({"id:other"})) == 0.0
+
+    # Large sets are estimated from their bottom hashes
+    big = {f"id:name{i}" for i in range(1000)}
+    half = {f"id:name{i}" for i in range(500, 1500)}
+    assert estimate_similarity(signature(big), signature(half)) == pytest.approx(
+        1 / 3, abs=0.15
+    )
+
+
+def test_similar_commits_of_the_same_repo(db):
+    db_path, store = db
+    add_commit(db_path, "acme/widgets", "fix(spool): keep batches", SPOOL_DIFF, "t1")
+    add_commit(db_path, "acme/widgets", "feat(web): render widgets", WIDGET_DIFF, "t2")
+    add_commit(db_path, "acme/gadgets", "fix: gadget spool", SPOOL_DIFF, "t3")
+    # Not committed yet (no message) or the same message again
+    add_commit(db_path, "acme/widgets", "", SPOOL_DIFF, "t4")
+    add_commit(db_path, "acme/widgets", "fix(spool): keep batches", SPOOL_DIFF, "t5")
+    assert update_index(store) == 5
+    assert update_index(store) == 0
+
+    staged = SPOOL_DIFF.replace("keep_batches", "max_batches")
+    similar = similar_commits(store, "acme/widgets", staged)
+    assert [commit.message for commit in similar] == ["fix(spool): keep batches"]
+    assert 0.5 < similar[0].similarity < 1
+
+    # Only commits stored since the last update are indexed
+    add_commit(db_path, "acme/widgets", "fix(spool): flush", SPOOL_DIFF, "t6")
+    assert update_index(store, batch_size=1) == 1
+    assert len(similar_commits(store, "acme/widgets", staged)) == 2
+
+
+def test_few_shot_examples_in_prompt(db, git_repo):
+    db_path, store = db
+    add_commit(db_path, "acme/widgets", "feat(web): render widgets", WIDGET_DIFF, "t1")
+
+    examples = few_shot_examples(WIDGET_DIFF, db_path=db_path)
+    assert examples == ["feat(web): render widgets"]
+    assert few_shot_examples(WIDGET_DIFF, limit=0, db_path=db_path) == []
+
+    prompt = build_prompt(WIDGET_DIFF, examples)
+    assert "<message>\nfeat(web): render widgets\n</message>" in prompt
+    assert prompt.index("</message>") < prompt.index("renderWidget")
+    assert "<message>" not in build_prompt(WIDGET_DIFF)
@@ -0,0 +1,62 @@
+import os
+import shutil
+
+from assistant.spool import flush, spool_commit, spool_message
+from assistant.store import connect
+
+
+def _spool_commit(spool_path, token, diff="+line\n" * 50):
+    return spool_commit(
+        "Test", "t@example.com", 1700000000.0, "", "acme/widgets", "main",
+        diff, 50, 0, token, spool_path=spool_path,
+    )
+
+
+def _rows(db_path):
+    conn = connect(db_path)
+    rows = conn.execute(
+        "SELECT commit_token, commit_message, added_lines FROM commits ORDER BY id"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def test_flush_ingests_pending_records(tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    spool_path = str(tmp_path / "spool.jsonl")
+    _spool_commit(spool_path, "t1")
+    spool_message("first", "t1", spool_path=spool_path)
+    _spool_commit(spool_path, "t2")
+
+    assert flush(db_path, spool_path) == (2, 1)
+    assert _rows(db_path) == [("t1", "first", 50), ("t2", "", 50)]
+    assert not os.path.exists(spool_path)
+
+    # A message spooled after its commit was flushed still finds the row
+    spool_message("second", "t2", spool_path=spool_path)
+    assert flush(db_path, spool_path) == (0, 1)
+    assert _rows(db_path)[1] == ("t2", "second", 50)
+    assert flush(db_path, spool_path) == (0, 0)
+
+
+def test_replay_after_crash_skips_ingested_records(tmp_path):
+    """A batch left behind by a crashed flusher is replayed without duplicates"""
+    db_path = str(tmp_path / "commits.db")
+    spool_path = str(tmp_path / "spool.jsonl")
+    _spool_commit(spool_path, "t1")
+    spool_message("first", "t1", spool_path=spool_path)
+    shutil.copy(spool_path, f"{spool_path}.1.flushing")
+
+    assert flush(db_path, spool_path) == (1, 1)
+    assert _rows(db_path) == [("t1", "first", 50)]
+    assert not any(name.endswith(".flushing") for name in os.listdir(tmp_path))
+
+
+def test_torn_line_is_skipped(tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    spool_path = str(tmp_path / "spool.jsonl")
+    _spool_commit(spool_path, "t1")
+    with open(spool_path, "a") as f:
+        f.write('{"type":"commit","commit_to')
+
+    assert flush(db_path, spool_path) == (1, 0)
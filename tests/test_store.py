@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from assistant.migrations import SCHEMA_VERSION, get_version
+from assistant.store import (
+    CACHE_SIZE_KIB,
+    INSERT_COMMIT_SQL,
+    MMAP_SIZE,
+    CommitStore,
+    close_stores,
+    open_store,
+)
+
+
+def row(token, message=""):
+    return (1.0, "Test", "t@example.com", message, "", "acme/widgets", "main",
+            None, 1, 0, token)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CommitStore(str(tmp_path / "commits.db"))
+    yield store
+    store.close()
+
+
+def test_connection_is_tuned_and_migrated(store):
+    def pragma(name):
+        return store.query_one(f"PRAGMA {name}")[0]
+
+    assert pragma("journal_mode") == "wal"
+    assert pragma("synchronous") == 1  # NORMAL
+    assert pragma("cache_size") == -CACHE_SIZE_KIB
+    assert pragma("mmap_size") == MMAP_SIZE
+    assert get_version(store.conn) == SCHEMA_VERSION
+    assert store.previous_version == 0
+
+
+def test_batched_writes_count_only_new_rows(store):
+    rows = (row(f"t{i}") for i in range(5))
+    assert store.execute_batched(INSERT_COMMIT_SQL, rows, batch_size=2) == 5
+    assert store.insert_commits([row("t0"), row("t5")]) == 1
+    assert store.update_messages([("feat: x", "t1"), ("feat: y", "missing")]) == 1
+    assert store.query(
+        "SELECT commit_token FROM commits WHERE commit_message = 'feat: x'"
+    ) == [("t1",)]
+
+
+def test_same_diff_is_stored_once(store):
+    def with_diff(token, diff):
+        return (*row(token)[:7], diff, *row(token)[8:])
+
+    diff = "diff --git a/f b/f\n" + "+line\n" * 100
+    assert store.insert_commits(
+        [with_diff("t1", diff), with_diff("t2", diff), with_diff("t3", "+other")]
+    ) == 3
+    # A replayed commit adds nothing, not even its diff
+    assert store.insert_commits([with_diff("t1", "+replayed")]) == 0
+    assert store.query(
+        "SELECT refcount, code_diff_codec FROM diff_blobs ORDER BY refcount"
+    ) == [(1, None), (2, "zlib")]
+
+    # The last commit to let go of a diff deletes it
+    with store.transaction():
+        store.conn.execute("DELETE FROM commits WHERE commit_token IN ('t1', 't3')")
+        store.conn.execute("UPDATE commits SET diff_hash = NULL")
+        assert store.delete_unreferenced_diffs() == 2
+    assert store.query_one("SELECT COUNT(*) FROM diff_blobs") == (0,)
+
+
+def test_transaction_rolls_back_on_error(store):
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.insert_commits([row("t1")])
+            raise RuntimeError("boom")
+    assert store.query_one("SELECT COUNT(*) FROM commits") == (0,)
+    assert not store.conn.in_transaction
+
+
+def test_open_store_is_shared_per_thread(tmp_path):
+    db_path = str(tmp_path / "commits.db")
+    first = open_store(db_path)
+    assert open_store(db_path) is first
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(open_store(db_path)))
+    thread.start()
+    thread.join()
+    assert other[0] is not first
+
+    close_stores()
+    assert open_store(db_path) is not first
+    close_stores()
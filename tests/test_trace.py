@@ -0,0 +1,93 @@
+from assistant import trace
+from assistant.cli import Assistant, cli
+from assistant.trace import build_report, read_records, span, traced
+
+
+def test_span_is_noop_when_not_tracing(monkeypatch, tmp_path):
+    monkeypatch.delenv("COAS_TRACE_ENABLED", raising=False)
+    trace_path = str(tmp_path / "trace.jsonl")
+    with traced("stats", trace_path):
+        with span("query"):
+            pass
+    assert not trace.tracing()
+    assert not (tmp_path / "trace.jsonl").exists()
+
+
+def test_traced_records_spans(monkeypatch, tmp_path):
+    monkeypatch.setenv("COAS_TRACE_ENABLED", "1")
+    trace_path = str(tmp_path / "trace.jsonl")
+    with traced("pre-commit", trace_path):
+        trace.set_repo("acme/widgets")
+        with span("diff"):
+            pass
+        with span("diff"):
+            pass
+        with span("db_write"):
+            pass
+    assert not trace.tracing()
+
+    (record,) = read_records(trace_path)
+    assert record["command"] == "pre-commit"
+    assert record["repo"] == "acme/widgets"
+    assert not record["failed"]
+    assert set(record["spans"]) == {"total", "startup", "diff", "db_write"}
+    assert record["spans"]["total"] >= record["spans"]["diff"]
+
+
+def test_traced_records_failures(monkeypatch, tmp_path):
+    monkeypatch.setenv("COAS_TRACE_ENABLED", "1")
+    trace_path = str(tmp_path / "trace.jsonl")
+    for code in (0, 1):
+        try:
+            with traced("post-commit", trace_path):
+                raise SystemExit(code)
+        except SystemExit:
+            pass
+    assert [record["failed"] for record in read_records(trace_path)] == [False, True]
+
+
+def test_report_percentiles():
+    records = [
+        {"command": "pre-commit", "repo": "acme/widgets", "spans": {"total": ms}}
+        for ms in range(1, 101)
+    ]
+    records.append({"command": "pre-commit", "repo": "acme/widgets", "spans": {
+        "total": 5.0, "startup": 1.0, "diff": 2.0,
+    }})
+    report = build_report(records)
+    assert [row.phase for row in report] == ["total", "startup", "diff"]
+    total = report[0]
+    assert (total.count, total.p50, total.p95, total.p99) == (101, 50, 95, 99)
+
+
+def test_torn_lines_and_rotation(monkeypatch, tmp_path):
+    trace_path = str(tmp_path / "trace.jsonl")
+    monkeypatch.setattr(trace, "MAX_TRACE_BYTES", 100)
+    for i in range(5):
+        trace.write_record({"command": "stats", "spans": {"total": i}}, trace_path)
+    with open(trace_path, "a") as f:
+        f.write('{"command": "st')
+
+    # Rotation keeps the previous file, the torn record is skipped
+    totals = [record["spans"]["total"] for record in read_records(trace_path)]
+    assert totals == list(range(len(totals)))
+    assert (tmp_path / "trace.jsonl.1").exists()
+    assert trace.clear(trace_path) == 2
+
+
+def test_cli_traces_commands(monkeypatch):
+    monkeypatch.setenv("COAS_TRACE_ENABLED", "1")
+    records = []
+    monkeypatch.setattr(
+        trace, "write_record", lambda record, path: records.append(record)
+    )
+
+    def stats(self):
+        with span("query"):
+            pass
+
+    monkeypatch.setattr(Assistant, "stats", stats)
+    cli(["stats"])
+    (record,) = records
+    assert record["command"] == "stats"
+    assert list(record["spans"]) == ["total", "startup", "query"]